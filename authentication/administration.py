@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .authentication import user_cache
+from .blacklist import blacklist_index
+from . import detail_cache
+
+
+"""
+This file contains the set based user administration used by the staff
+bulk endpoint. Users are activated, deactivated or deleted in chunks of
+BULK_ADMIN_CHUNK_SIZE with one update() or delete() per chunk, and the
+refresh tokens of every affected user are blacklisted in one insert per
+chunk. update() doesn't send post_save, so cached token users are dropped
+here instead of by the signals.
+
+"""
+
+ACTIONS = ('activate', 'deactivate', 'delete')
+
+# filters accepted in place of an id list, value parsers by lookup
+FILTERS = {
+	'is_active': bool,
+	'is_staff': bool,
+	'email__iendswith': str, # e.g. a tenant's email domain
+	'username__istartswith': str,
+	'time__lt': parse_datetime,
+	'time__gte': parse_datetime,
+}
+
+
+class BulkActionError(ValueError):
+	pass
+
+
+def parse_filters(filters):
+	"""
+	Validate the filters of a bulk action against FILTERS
+
+	"""
+	if not isinstance(filters, dict) or not filters:
+		raise BulkActionError("Filters must be a non empty object")
+
+	parsed = {}
+	for lookup, value in filters.items():
+		parser = FILTERS.get(lookup)
+		if parser is None:
+			raise BulkActionError(f"Unsupported filter {lookup}, use one of {', '.join(FILTERS)}")
+
+		if parser is bool and not isinstance(value, bool) or parser is not bool and not isinstance(value, str):
+			raise BulkActionError(f"Invalid value for filter {lookup}")
+
+		parsed[lookup] = parser(value) if parser is not bool else value
+		if parsed[lookup] is None:
+			raise BulkActionError(f"Invalid date for filter {lookup}")
+
+	return parsed
+
+
+def target_queryset(request_user):
+	"""
+	Users the request user may act on, never themselves and only admins touch admins
+
+	"""
+	users = get_user_model().objects.exclude(pk=request_user.pk)
+	if not request_user.is_superuser:
+		users = users.exclude(is_superuser=True)
+
+	return users
+
+
+def blacklist_tokens(user_ids):
+	"""
+	Blacklist the unexpired refresh tokens of the given users with one insert
+
+	"""
+	tokens = list(
+		OutstandingToken.objects.filter(user_id__in=user_ids, expires_at__gt=timezone.now(), blacklistedtoken__isnull=True)
+		.values_list('id', 'jti', 'expires_at')
+	)
+	BlacklistedToken.objects.bulk_create([BlacklistedToken(token_id=token_id) for token_id, _, _ in tokens], ignore_conflicts=True)
+
+	for _, jti, expires_at in tokens:
+		blacklist_index.add(jti, expires_at)
+
+	return len(tokens)
+
+
+def apply_bulk_action(request_user, action, ids=None, filters=None):
+	"""
+	Apply action to the users matching ids or filters.
+
+	Return (results, blacklisted tokens). With ids there is a result per
+	requested id, ids that don't exist or can't be acted on are not_found.
+	With filters there is a result per matched user.
+	"""
+	if action not in ACTIONS:
+		raise BulkActionError(f"Unsupported action {action}, use one of {', '.join(ACTIONS)}")
+
+	users = target_queryset(request_user)
+
+	if ids is not None:
+		if not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+			raise BulkActionError("Ids must be a list of integers")
+
+		ids = list(dict.fromkeys(ids)) # drop repeated ids, keep order
+		if len(ids) > settings.BULK_ADMIN_MAX_USERS:
+			raise BulkActionError(f"A bulk action can act on at most {settings.BULK_ADMIN_MAX_USERS} users")
+
+		users = users.filter(pk__in=ids)
+	else:
+		users = users.filter(**parse_filters(filters))
+
+	matched = list(users.values_list('pk', flat=True)[:settings.BULK_ADMIN_MAX_USERS + 1])
+	if len(matched) > settings.BULK_ADMIN_MAX_USERS:
+		raise BulkActionError(f"A bulk action can act on at most {settings.BULK_ADMIN_MAX_USERS} users")
+
+	done = 'deleted' if action == 'delete' else 'updated'
+	outcome = {}
+	blacklisted = 0
+	User = get_user_model()
+
+	for offset in range(0, len(matched), settings.BULK_ADMIN_CHUNK_SIZE):
+		chunk = matched[offset:offset + settings.BULK_ADMIN_CHUNK_SIZE]
+
+		with transaction.atomic():
+			if action != 'activate': # disabled or deleted users must not refresh their access tokens
+				blacklisted += blacklist_tokens(chunk)
+
+			if action == 'delete':
+				User.objects.filter(pk__in=chunk).delete() # cascades to profiles, post_delete drops cached users
+			else:
+				User.objects.filter(pk__in=chunk).update(is_active=action == 'activate', updated_at=timezone.now())
+
+		if action != 'delete':
+			user_cache.invalidate_many(chunk) # update() skips post_save
+			detail_cache.invalidate_many('user', chunk)
+
+		outcome.update(dict.fromkeys(chunk, done))
+
+	if ids is None:
+		return [{"id": pk, "status": status} for pk, status in outcome.items()], blacklisted
+
+	return [{"id": pk, "status": outcome.get(pk, 'not_found')} for pk in ids], blacklisted
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class AuthenticationConfig(AppConfig):
@@ -6,4 +7,9 @@ class AuthenticationConfig(AppConfig):
     name = 'authentication'
 
     def ready(self):
-        import authentication.signals 
\ No newline at end of file
+        import authentication.signals
+        from .metrics import install_query_wrapper
+        from django_auth.database import apply_sqlite_pragmas
+
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='django_auth_sqlite_pragmas') # WAL and busy timeout of DB_PROFILE=sqlite-wal
+        connection_created.connect(install_query_wrapper, dispatch_uid='authentication_metrics_queries') # time SQL of sampled requests
@@ -0,0 +1,639 @@
+import json
+from abc import ABC, abstractmethod
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.http import Http404, JsonResponse, QueryDict
+from django.http.multipartparser import MultiPartParserError
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+
+from .authentication import CachedJWTAuthentication
+from .availability import find_conflicts, conflict_errors, taken_cache
+from .custom_auth import CustomAuthenticationBackend
+from .hashing import HashPoolSaturated, amake_password
+from .models import UserProfile
+from .pagination import TimeCursorPagination, astream_ndjson
+from .serializers import SignUpSerializer, SignInSerializer, ProfileSerializer, ProfileReadSerializer, UserSerializer
+from .tokens import RefreshToken
+from .views import PROFILE_DETAIL_FIELDS
+from . import detail_cache, lockout, throttling, versions
+from django_auth.routers import is_sticky, mark_sticky, read_from_replica, replica_configured
+
+User = get_user_model()
+
+
+"""
+This file contains async versions of the authentication views. They are meant
+to be served by django_auth/asgi.py, password hashing is dispatched to the
+bounded hash pool and requests get a fast 503 while the pool is saturated.
+Single queries use the async ORM. Django 5.0 runs each async ORM call in
+the sync thread, so work that needs several queries (pagination, serializer
+validation and save, the detail cache rebuild) goes there in one
+sync_to_async call instead of one hop per query.
+
+"""
+
+
+class UnsupportedMediaType(ValueError):
+	"""
+	Raised by parse_body for a body that isn't json, form encoded or multipart
+
+	"""
+
+
+def parse_body(request):
+	"""
+	Return the request payload from a json, form encoded or multipart body.
+	Django only fills request.POST and request.FILES for POST, PUT and PATCH
+	bodies are parsed here
+
+	"""
+	if request.content_type == 'application/json':
+		return json.loads(request.body or b'{}')
+
+	if request.method == 'POST':
+		post, files = request.POST, request.FILES
+	elif request.content_type == 'multipart/form-data':
+		try:
+			post, files = request.parse_file_upload(request.META, request) # streams the body through the upload handlers
+		except MultiPartParserError as e:
+			raise ValueError(str(e))
+	elif request.content_type == 'application/x-www-form-urlencoded' or not request.body:
+		post, files = QueryDict(request.body, encoding=request.encoding), None
+	else:
+		raise UnsupportedMediaType(request.content_type)
+
+	if files:
+		data = post.copy()
+		for name, upload in files.items():
+			data[name] = upload
+		return data
+
+	return post
+
+
+def json_response(payload, status=status.HTTP_200_OK):
+	return JsonResponse(payload, status=status, encoder=JSONEncoder, safe=False)
+
+
+def saturated_response():
+	"""
+	Response returned when the hash pool can't take more work
+
+	"""
+	response = JsonResponse({
+		"error": "Server is busy. Please try again shortly",
+		"status": status.HTTP_503_SERVICE_UNAVAILABLE
+	}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+	response['Retry-After'] = '1'
+	return response
+
+
+def throttled_response(wait):
+	"""
+	Response returned over a rate limit, shaped like rest framework's throttled responses
+
+	"""
+	error = Throttled(wait)
+	response = JsonResponse({"detail": error.detail}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+	response['Retry-After'] = str(error.wait)
+	return response
+
+
+def invalid_body_response(error):
+	if isinstance(error, UnsupportedMediaType):
+		return JsonResponse({
+			"error": f"Unsupported media type \"{error}\" in request",
+			"status": status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+		}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+	return JsonResponse({
+		"error": "Request body could not be parsed",
+		"status": status.HTTP_400_BAD_REQUEST
+	}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSignUpRequest(View):
+
+	"""
+	Async view for user sign up
+
+	"""
+
+	async def post(self, request):
+		"""
+		Handle POST request for user sign up.
+
+		Parameters:
+			request (HttpRequest): The Http request object
+
+		Return:
+			JsonResponse: A JSON response indicating the result of the sign up request.
+
+		"""
+		wait = await throttling.acheck('signup', request, {}) # before any parsing, validation or hashing
+		if wait:
+			return throttled_response(wait)
+
+		try:
+			data = parse_body(request)
+		except ValueError as e:
+			return invalid_body_response(e)
+
+		serializer = SignUpSerializer(data=data)
+
+		if not await sync_to_async(serializer.is_valid)(): # validation checks username and email availability
+			return JsonResponse({
+				"error": "Failed to create account.",
+				"details": serializer.errors,
+				"status": status.HTTP_400_BAD_REQUEST
+			}, status=status.HTTP_400_BAD_REQUEST)
+
+		try:
+			password = await amake_password(serializer.validated_data["password"])
+		except HashPoolSaturated:
+			return saturated_response()
+
+		username = serializer.validated_data["username"]
+		email = serializer.validated_data["email"]
+
+		try:
+			await sync_to_async(User.objects.save_new_user)(User(username=username, email=email, password=password)) # user and profile in one hop
+
+		except IntegrityError: # lost a sign up race, the unique indexes rejected the insert
+			conflicts = await sync_to_async(find_conflicts)(username, email) or {'username', 'email'}
+			return JsonResponse({
+				"error": "Failed to create account.",
+				"details": conflict_errors(conflicts, username, email),
+				"status": status.HTTP_400_BAD_REQUEST
+			}, status=status.HTTP_400_BAD_REQUEST)
+
+		taken_cache.add('username', username)
+		taken_cache.add('email', email)
+
+		return JsonResponse({
+			"success": "Account created successfully",
+			"status": status.HTTP_201_CREATED
+		})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSignInRequest(View):
+
+	"""
+	Async view for user sign in
+
+	"""
+
+	async def post(self, request):
+		"""
+		Handle POST request for user sign in.
+
+		Parameters:
+			request (HttpRequest): The Http request object
+
+		Return:
+			JsonResponse: A JSON response indicating the result of the sign in request.
+
+		"""
+		try:
+			data = parse_body(request)
+		except ValueError as e:
+			return invalid_body_response(e)
+
+		wait = await throttling.acheck('signin', request, data) # per address and per account, before any hashing
+		if wait:
+			return throttled_response(wait)
+
+		serializer = SignInSerializer(data=data)
+
+		if not serializer.is_valid():
+			return JsonResponse({
+				"error": "Authentication failed. Please check your credentials",
+				"details": serializer.errors,
+				"status": status.HTTP_400_BAD_REQUEST
+			}, status=status.HTTP_400_BAD_REQUEST)
+
+		loginId = serializer.validated_data["login_id"] # get loginId from request
+		password = serializer.validated_data["password"] # get password from request
+
+		try:
+			user = await CustomAuthenticationBackend().aauthenticate(request, username=loginId, password=password)
+		except HashPoolSaturated:
+			return saturated_response()
+
+		if user is not None:
+			if user.is_active: # check if user account is active
+				refresh = await RefreshToken.afor_user(user) # generate token for user
+				await lockout.areset(user.pk) # reset login trials on successful authentication
+
+				return JsonResponse({
+					"success":"Login successful",
+					"refresh": str(refresh),
+					"access":str(refresh.access_token),
+					"status": status.HTTP_200_OK
+				})
+
+			# return error response if user account is inactive
+			return JsonResponse({
+				"error": "Account disabled. Please contact support for help",
+				"status": status.HTTP_401_UNAUTHORIZED
+			})
+
+		user = getattr(request, 'login_user', None) # user fetched by the authentication backend, if any
+
+		if user is not None and await lockout.afailed_attempts(user.pk) >= (await UserProfile.objects.afor_user(user)).max_login_trials:
+			return JsonResponse({
+				"error": "You've tried to login too many times. Please try again after 24 hours",
+				"status": status.HTTP_401_UNAUTHORIZED
+			})
+
+		if user is not None:
+			await lockout.aregister_failure(user.pk) # add 1 to the cached login trial counter
+
+		return JsonResponse({
+			"error": "Invalid username or password",
+			"status": status.HTTP_401_UNAUTHORIZED
+		})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSignOutRequest(View):
+
+	"""
+	Async view for user sign out
+
+	"""
+
+	async def post(self, request):
+		"""
+		Handle POST request for user sign out.
+
+		Parameters:
+			request (HttpRequest): The Http request object
+
+		Return:
+			JsonResponse: A JSON response indicating the result of the sign out request.
+
+		"""
+		try:
+			refresh_token = parse_body(request).get("refresh") # get refresh token from sign out request
+			if refresh_token:
+
+				token = await RefreshToken.afrom_string(refresh_token)
+				await token.ablacklist() # blacklist token
+				return JsonResponse({
+					"success": "Logout successful",
+					"status": status.HTTP_200_OK
+				})
+
+			else:
+				return JsonResponse({
+					"error": "Unable to log you out. Refresh token not provided",
+					"status": status.HTTP_400_BAD_REQUEST
+				})
+
+		except Exception as e:
+			return JsonResponse({
+				"error": "An error occured. Please try again",
+				"status": status.HTTP_500_INTERNAL_SERVER_ERROR
+			})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncTokenRefreshRequest(View):
+
+	"""
+	Async view for token refresh, answers like simplejwt's TokenRefreshView
+
+	"""
+
+	async def post(self, request):
+		"""
+		Handle POST request for token refresh, the used refresh token is blacklisted
+		and a rotated one is returned
+
+		"""
+		wait = await throttling.acheck('refresh', request, {})
+		if wait:
+			return throttled_response(wait)
+
+		try:
+			refresh_token = parse_body(request).get("refresh")
+		except ValueError as e:
+			return invalid_body_response(e)
+
+		if not refresh_token:
+			return JsonResponse({"refresh": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+		try:
+			refresh = await RefreshToken.afrom_string(refresh_token)
+			await refresh.aupdate_user_claims()
+		except TokenError as e:
+			return JsonResponse({"detail": str(e), "code": "token_not_valid"}, status=status.HTTP_401_UNAUTHORIZED)
+
+		data = {"access": str(refresh.access_token)}
+
+		await refresh.ablacklist() # ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION are on
+		refresh.set_jti()
+		refresh.set_exp()
+		refresh.set_iat()
+		data["refresh"] = str(refresh)
+
+		return JsonResponse(data)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+
+	"""
+	Base of the async views that need an authenticated user. Safe requests
+	read from the replica unless the user is sticky to the primary, like
+	ReplicaReadMixin does for the sync views
+
+	"""
+	stateless_reads = True # GET can skip the user lookup, see JWT_STATELESS_READS
+
+	async def dispatch(self, request, *args, **kwargs):
+		handler = getattr(self, request.method.lower(), None)
+		if request.method.lower() not in self.http_method_names or handler is None:
+			return await self.http_method_not_allowed(request, *args, **kwargs)
+
+		safe = request.method in SAFE_METHODS
+
+		try:
+			user = await CachedJWTAuthentication().aauthenticate(
+				request, stateless=safe and self.stateless_reads and settings.JWT_STATELESS_READS
+			)
+		except AuthenticationFailed as e:
+			detail = e.detail if isinstance(e.detail, dict) else {"detail": e.detail}
+			return json_response(detail, status=status.HTTP_401_UNAUTHORIZED)
+
+		if user is None:
+			return json_response({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+
+		request.user = user
+		replica = replica_configured()
+
+		with read_from_replica(safe and replica and not is_sticky(user.pk)):
+			try:
+				response = await handler(request, *args, **kwargs)
+			except Http404:
+				response = json_response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+		if replica and not safe:
+			mark_sticky(user.pk)
+
+		return response
+
+
+class AsyncListView(AsyncAPIView, ABC):
+
+	"""
+	Base of the async list views, paginated like the sync views or streamed with ?stream=1
+
+	"""
+	serializer_class = None
+	pagination_class = TimeCursorPagination
+	success_message = None
+
+	@abstractmethod
+	def get_queryset(self, user):
+		"""
+		Return the rows user may list
+
+		"""
+
+	async def get(self, request):
+		"""
+		Handle get request for the list
+
+		"""
+		queryset = self.get_queryset(request.user)
+
+		if request.GET.get('stream') == '1':
+			queryset = queryset.using(queryset.db)
+			return astream_ndjson(queryset.order_by(*self.pagination_class.ordering), self.serializer_class, settings.STREAM_CHUNK_SIZE)
+
+		def page():
+			drf_request = Request(request)
+			paginator = self.pagination_class()
+			rows = paginator.paginate_queryset(queryset, drf_request)
+			return self.serializer_class(rows, many=True).data, paginator.get_next_link(), paginator.get_previous_link()
+
+		data, next_link, previous_link = await sync_to_async(page)()
+		return json_response({
+			"success": self.success_message,
+			"data": data,
+			"next": next_link,
+			"previous": previous_link,
+			"status": status.HTTP_200_OK
+		})
+
+
+class AsyncProfileRequest(AsyncListView):
+
+	"""
+	Async view for user profile
+
+	"""
+	serializer_class = ProfileReadSerializer
+	success_message = "Profile fetched successfully"
+
+	def get_queryset(self, user):
+		profiles = UserProfile.objects.values(*self.serializer_class.values)
+		if user.is_staff or user.is_superuser: # staff or admin users can view all profiles
+			return profiles
+
+		return profiles.filter(user_id=user.pk) # basic users can get their profile objects only
+
+
+class AsyncUserRequest(AsyncListView):
+
+	"""
+	Async view for user object, staff or admin users see every user
+
+	"""
+	serializer_class = UserSerializer
+	success_message = "User fetched successfully"
+
+	def get_queryset(self, user):
+		if user.is_staff or user.is_superuser:
+			return User.objects.all() # staff or admin can view all users
+
+		return User.objects.filter(id=user.pk) # basic users can view their user object only
+
+
+def detail_json_response(data, version):
+	return versions.set_headers(json_response({
+		"success":"success",
+		"data":data,
+		"status":status.HTTP_200_OK
+	}), version)
+
+
+class AsyncDetailView(AsyncAPIView, ABC):
+
+	"""
+	Base of the async detail views
+
+	"""
+	kind = None # detail cache kind
+	serializer_class = None
+	updated_message = None
+
+	@abstractmethod
+	def get_object(self, pk):
+		"""
+		Return the object with pk or raise Http404
+
+		"""
+
+	def version(self, obj):
+		return obj.updated_at
+
+	def serializer_context(self, request):
+		return {}
+
+	def save_kwargs(self, request):
+		return {}
+
+	async def get(self, request, pk):
+		"""
+		Method to get the object details, served from the detail cache
+
+		"""
+		def build():
+			obj = self.get_object(pk)
+			return self.version(obj), dict(self.serializer_class(obj).data)
+
+		return await sync_to_async(detail_cache.get_detail)(request, self.kind, pk, build, respond=detail_json_response)
+
+	async def update(self, request, pk, partial):
+		try:
+			data = parse_body(request)
+		except ValueError as e:
+			return invalid_body_response(e)
+
+		def save():
+			serializer = self.serializer_class(self.get_object(pk), data=data, partial=partial, context=self.serializer_context(request))
+			if not serializer.is_valid():
+				return serializer.errors
+
+			serializer.save(**self.save_kwargs(request))
+			return None
+
+		errors = await sync_to_async(save)()
+		if errors:
+			return json_response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+		return JsonResponse({
+			"success": self.updated_message,
+			"status": status.HTTP_201_CREATED
+		})
+
+	async def put(self, request, pk):
+		"""
+		Put method for update
+
+		"""
+		return await self.update(request, pk, partial=False)
+
+	async def patch(self, request, pk):
+		"""
+		Patch method for update
+
+		"""
+		return await self.update(request, pk, partial=True)
+
+
+class AsyncProfileDetailsRequest(AsyncDetailView):
+
+	"""
+	Async profile details view
+
+	"""
+	kind = 'profile'
+	serializer_class = ProfileSerializer
+	updated_message = "Profile updated successfully"
+
+	def get_object(self, pk):
+		try:
+			return UserProfile.objects.select_related('user').only(*PROFILE_DETAIL_FIELDS).get(pk=pk)
+		except UserProfile.DoesNotExist:
+			raise Http404("User profile does not exist.")
+
+	def version(self, profile):
+		return max(profile.updated_at, profile.user.updated_at)
+
+	def save_kwargs(self, request):
+		return {"user": request.user}
+
+	async def delete(self, request, pk):
+		"""
+		Delete method for user profile
+
+		"""
+		try:
+			profile = await UserProfile.objects.aget(pk=pk)
+		except UserProfile.DoesNotExist:
+			raise Http404("User profile does not exist.")
+
+		await profile.adelete()
+		return JsonResponse({
+			"success":"Profile deleted",
+			"status": status.HTTP_204_NO_CONTENT
+		})
+
+
+class AsyncUserDetailsRequest(AsyncDetailView):
+
+	"""
+	Async user details view
+
+	"""
+	kind = 'user'
+	serializer_class = UserSerializer
+	updated_message = "User details updated successfully"
+
+	def get_object(self, pk):
+		try:
+			return User.objects.get(pk=pk)
+		except User.DoesNotExist:
+			raise Http404("User profile does not exist.")
+
+	def serializer_context(self, request):
+		return {"request": request}
+
+	async def delete(self, request, pk):
+		"""
+		Delete method for user, staff or admin users only
+
+		"""
+		if not (request.user.is_staff or request.user.is_superuser): # only staff or admin user can delete user
+			return JsonResponse({
+				"error":"You are not authorized to delete user",
+				"status": status.HTTP_401_UNAUTHORIZED
+			})
+
+		try:
+			user = await User.objects.aget(pk=pk)
+		except User.DoesNotExist:
+			raise Http404("User profile does not exist.")
+
+		await user.adelete()
+		return JsonResponse({
+			"success":"User deleted",
+			"status": status.HTTP_204_NO_CONTENT
+		})
@@ -0,0 +1,269 @@
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from django_auth.routers import read_from_replica
+
+
+"""
+This file contains the rest framework authentication classes.
+Users resolved from access tokens are kept in a small per process LRU
+for AUTH_USER_LOCAL_TTL seconds and in the shared cache AUTH_USER_CACHE
+for AUTH_USER_CACHE_TTL seconds. Entries are dropped by the CustomUser
+post_save and post_delete signals, the short local TTL bounds how long
+other processes can serve a stale user. Cache misses read the primary,
+also inside the replica reads of the read only views, and an invalidation
+bumps a generation counter so a load that raced with it isn't cached.
+StatelessReadJWTAuthentication builds the user from token claims alone
+on GET requests when JWT_STATELESS_READS is enabled.
+
+"""
+
+
+class UserCache:
+	"""
+	Two level user cache, a local LRU in front of a django cache
+
+	"""
+
+	def __init__(self):
+		self._local = OrderedDict() # user id -> (expiry, user)
+		self._lock = threading.Lock()
+
+	def key(self, user_id):
+		return f"auth_user:{user_id}"
+
+	def generation_key(self, user_id):
+		return f"auth_user_generation:{user_id}"
+
+	def generation(self, user_id):
+		"""
+		Return the invalidation counter of a user, read before loading the
+		user so set() can tell whether an invalidation happened since
+
+		"""
+		return caches[settings.AUTH_USER_CACHE].get(self.generation_key(user_id))
+
+	async def ageneration(self, user_id):
+		return await caches[settings.AUTH_USER_CACHE].aget(self.generation_key(user_id))
+
+	def get(self, user_id):
+		"""
+		Return a copy of the cached user or None
+
+		"""
+		now = time.monotonic()
+
+		with self._lock:
+			entry = self._local.get(user_id)
+			if entry is not None:
+				if entry[0] > now:
+					self._local.move_to_end(user_id)
+					return copy.copy(entry[1]) # requests never share one user instance
+				del self._local[user_id]
+
+		user = caches[settings.AUTH_USER_CACHE].get(self.key(user_id))
+		if user is not None:
+			self._remember(user_id, user, now)
+			return copy.copy(user)
+
+		return None
+
+	def cacheable(self, user):
+		"""
+		Return a copy of user without the password hash, which stays out of the
+		shared cache. The field is deferred on the copy, reading it loads it
+		from the database and save() leaves it alone
+
+		"""
+		user = copy.copy(user)
+		user.__dict__.pop('password', None)
+		user._password = None # raw password of a pending set_password()
+		return user
+
+	def set(self, user, generation):
+		"""
+		Cache a user loaded after generation was read, unless it was invalidated meanwhile
+
+		"""
+		if self.generation(user.pk) != generation: # the loaded row may predate the write
+			return
+
+		user = self.cacheable(user)
+		caches[settings.AUTH_USER_CACHE].set(self.key(user.pk), user, settings.AUTH_USER_CACHE_TTL)
+		self._remember(user.pk, user, time.monotonic())
+
+	async def aget(self, user_id):
+		"""
+		Async version of get, the shared cache is read with the async cache api
+
+		"""
+		now = time.monotonic()
+
+		with self._lock:
+			entry = self._local.get(user_id)
+			if entry is not None and entry[0] > now:
+				self._local.move_to_end(user_id)
+				return copy.copy(entry[1])
+
+		user = await caches[settings.AUTH_USER_CACHE].aget(self.key(user_id))
+		if user is not None:
+			self._remember(user_id, user, now)
+			return copy.copy(user)
+
+		return None
+
+	async def aset(self, user, generation):
+		"""
+		Async version of set
+
+		"""
+		if await self.ageneration(user.pk) != generation:
+			return
+
+		user = self.cacheable(user)
+		await caches[settings.AUTH_USER_CACHE].aset(self.key(user.pk), user, settings.AUTH_USER_CACHE_TTL)
+		self._remember(user.pk, user, time.monotonic())
+
+	def invalidate(self, user_id):
+		self.invalidate_many([user_id])
+
+	def invalidate_many(self, user_ids):
+		with self._lock:
+			for user_id in user_ids:
+				self._local.pop(user_id, None)
+
+		cache = caches[settings.AUTH_USER_CACHE]
+		cache.delete_many([self.key(user_id) for user_id in user_ids])
+
+		for user_id in user_ids: # loads in flight won't cache what they read before this
+			try:
+				cache.incr(self.generation_key(user_id))
+			except ValueError:
+				cache.add(self.generation_key(user_id), 1, settings.AUTH_USER_CACHE_TTL)
+
+	def clear(self):
+		with self._lock:
+			self._local.clear()
+
+	def _remember(self, user_id, user, now):
+		with self._lock:
+			self._local[user_id] = (now + settings.AUTH_USER_LOCAL_TTL, user)
+			self._local.move_to_end(user_id)
+			while len(self._local) > settings.AUTH_USER_LOCAL_SIZE:
+				self._local.popitem(last=False) # evict least recently used user
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+	"""
+	JWT authentication that resolves the token user from the user cache
+	before falling back to the database
+
+	"""
+
+	def get_user(self, validated_token):
+		try:
+			user_id = validated_token[api_settings.USER_ID_CLAIM]
+		except KeyError:
+			raise InvalidToken(_("Token contained no recognizable user identification"))
+
+		user = user_cache.get(user_id)
+
+		if user is None:
+			generation = user_cache.generation(user_id)
+			with read_from_replica(False): # a lagging replica would cache a user from before a deactivation or demotion
+				user = super().get_user(validated_token) # database lookup, rejects missing and inactive users
+			user_cache.set(user, generation)
+			return user
+
+		if not user.is_active:
+			raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+		return user
+
+	async def aget_user(self, validated_token):
+		"""
+		Async version of get_user for the async views
+
+		"""
+		try:
+			user_id = validated_token[api_settings.USER_ID_CLAIM]
+		except KeyError:
+			raise InvalidToken(_("Token contained no recognizable user identification"))
+
+		user = await user_cache.aget(user_id)
+
+		if user is None:
+			generation = await user_cache.ageneration(user_id)
+			try:
+				with read_from_replica(False):
+					user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+			except self.user_model.DoesNotExist:
+				raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+			if user.is_active:
+				await user_cache.aset(user, generation)
+
+		if not user.is_active:
+			raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+		return user
+
+	async def aauthenticate(self, request, stateless=False):
+		"""
+		Authenticate a django request from the async views, return the user or
+		None when no token was sent. Token checks are CPU only and run inline,
+		with stateless the user is built from the token claims
+
+		"""
+		header = self.get_header(request)
+		if header is None:
+			return None
+
+		raw_token = self.get_raw_token(header)
+		if raw_token is None:
+			return None
+
+		validated_token = self.get_validated_token(raw_token)
+
+		if stateless:
+			if api_settings.USER_ID_CLAIM not in validated_token:
+				raise InvalidToken(_("Token contained no recognizable user identification"))
+			return api_settings.TOKEN_USER_CLASS(validated_token)
+
+		return await self.aget_user(validated_token)
+
+
+class StatelessReadJWTAuthentication(CachedJWTAuthentication):
+	"""
+	JWT authentication for read only views. With JWT_STATELESS_READS enabled,
+	safe requests get a TokenUser built from the verified token claims
+	and never touch the database, other requests load the user as usual
+
+	"""
+
+	def authenticate(self, request):
+		# rest framework creates authenticators per request so this flag is request scoped
+		self.stateless = settings.JWT_STATELESS_READS and request.method in SAFE_METHODS
+		return super().authenticate(request)
+
+	def get_user(self, validated_token):
+		if not self.stateless:
+			return super().get_user(validated_token)
+
+		if api_settings.USER_ID_CLAIM not in validated_token:
+			raise InvalidToken(_("Token contained no recognizable user identification"))
+
+		return api_settings.TOKEN_USER_CLASS(validated_token)
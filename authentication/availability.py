@@ -0,0 +1,119 @@
+import time
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import BooleanField, ExpressionWrapper, Q, Value
+from django.db.models.functions import Lower
+
+
+"""
+This file contains the username and email availability check shared by
+the sign up and user serializers. Both values are checked with one query
+on the lowercase indexes. Values found taken are remembered in a per
+process cache for SIGNUP_TAKEN_CACHE_TTL seconds, so bots probing the same
+names over and over don't reach the database.
+
+"""
+
+
+class TakenCache:
+	"""
+	Local LRU of recently taken usernames and emails
+
+	"""
+
+	def __init__(self):
+		self._entries = OrderedDict() # (field, lowercase value) -> expiry
+		self._lock = threading.Lock()
+
+	def contains(self, field, value):
+		key = (field, value.lower())
+
+		with self._lock:
+			expiry = self._entries.get(key)
+			if expiry is None:
+				return False
+
+			if expiry <= time.monotonic():
+				del self._entries[key]
+				return False
+
+			self._entries.move_to_end(key)
+			return True
+
+	def add(self, field, value):
+		with self._lock:
+			self._entries[(field, value.lower())] = time.monotonic() + settings.SIGNUP_TAKEN_CACHE_TTL
+			self._entries.move_to_end((field, value.lower()))
+			while len(self._entries) > settings.SIGNUP_TAKEN_CACHE_SIZE:
+				self._entries.popitem(last=False)
+
+	def discard(self, field, value):
+		with self._lock:
+			self._entries.pop((field, value.lower()), None)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+
+taken_cache = TakenCache()
+
+
+def find_conflicts(username=None, email=None, exclude_pk=None):
+	"""
+	Return the set of fields ('username', 'email') whose value is already taken
+
+	"""
+	conflicts = set()
+	lookups = {}
+
+	for field, value in (('username', username), ('email', email)):
+		if not value:
+			continue
+
+		if exclude_pk is None and taken_cache.contains(field, value): # the cache doesn't know who owns a name
+			conflicts.add(field)
+		else:
+			lookups[field] = Q(**{f"{field}_lower": Lower(Value(value))}) # lowercased by the database like the unique indexes
+
+	if not lookups:
+		return conflicts
+
+	query = Q()
+	for lookup in lookups.values():
+		query |= lookup
+
+	users = get_user_model().objects.alias(username_lower=Lower('username'), email_lower=Lower('email')).filter(query)
+	if exclude_pk is not None:
+		users = users.exclude(pk=exclude_pk)
+
+	users = users.annotate(**{
+		f"{field}_taken": ExpressionWrapper(lookup, output_field=BooleanField()) for field, lookup in lookups.items()
+	})
+
+	for row in users.values('username', 'email', *[f"{field}_taken" for field in lookups]):
+		for field in lookups:
+			if row[f"{field}_taken"]:
+				conflicts.add(field)
+				taken_cache.add(field, row[field])
+
+	return conflicts
+
+
+def conflict_errors(conflicts, username=None, email=None):
+	"""
+	Build serializer errors for the taken fields
+
+	"""
+	errors = {}
+
+	if 'username' in conflicts:
+		errors["username"] = {"username_unavailable": f"Username {username} is not available"}
+
+	if 'email' in conflicts:
+		errors["email"] = {"email_unavailable": f"Email {email} is not available"}
+
+	return errors
@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections
+
+
+"""
+This file contains helpers shared by the benchmark management commands.
+Benchmarks run against a throwaway test database so they never touch
+the data of the configured database.
+
+"""
+
+BENCH_PASSWORD = "benchUSER12##" # password of every seeded user
+
+
+@contextmanager
+def test_database(verbosity=0, on_disk=False):
+	"""
+	Create a test database for the duration of a benchmark. SQLite test
+	databases live in memory, where concurrent writers fail at once with
+	"table is locked", on_disk puts them in a temporary file instead
+
+	"""
+	test_settings = connection.settings_dict.setdefault('TEST', {})
+	old_test_name = test_settings.get('NAME')
+	directory = None
+
+	if on_disk and connection.vendor == 'sqlite' and not old_test_name:
+		directory = tempfile.mkdtemp()
+		test_settings['NAME'] = os.path.join(directory, 'bench.sqlite3')
+
+	old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+	try:
+		yield
+	finally:
+		connection.creation.destroy_test_db(old_name, verbosity)
+		test_settings['NAME'] = old_test_name
+		if directory:
+			shutil.rmtree(directory, ignore_errors=True)
+
+
+def seed_users(count, batch_size=10000, with_profiles=False):
+	"""
+	Bulk insert users until the user table holds count rows. All users share
+	one password hash so seeding doesn't pay for hashing.
+
+	"""
+	from .models import UserProfile
+
+	User = get_user_model()
+	password = make_password(BENCH_PASSWORD)
+	start = User.objects.count()
+
+	for offset in range(start, count, batch_size):
+		users = User.objects.bulk_create([
+			User(username=f"user{i}", email=f"user{i}@example.com", password=password)
+			for i in range(offset, min(offset + batch_size, count))
+		])
+
+		if with_profiles:
+			UserProfile.objects.create_for_users(users)
+
+
+class QueryCounter:
+	"""
+	Count queries and their total duration on the default connection,
+	unlike CaptureQueriesContext it has no cap on the number of queries
+
+	"""
+
+	def __init__(self):
+		self.count = 0
+		self.seconds = 0.0
+
+	def __call__(self, execute, sql, params, many, context):
+		start = time.perf_counter()
+		try:
+			return execute(sql, params, many, context)
+		finally:
+			self.count += 1
+			self.seconds += time.perf_counter() - start
+
+
+@contextmanager
+def count_queries():
+	counter = QueryCounter()
+	with connection.execute_wrapper(counter):
+		yield counter
+
+
+def percentile(samples, point):
+	"""
+	Return the given percentile of a list of samples
+
+	"""
+	if not samples:
+		return 0.0
+
+	ordered = sorted(samples)
+	index = min(len(ordered) - 1, int(round(point / 100 * (len(ordered) - 1))))
+	return ordered[index]
+
+
+def timed(func, *args, **kwargs):
+	"""
+	Run func and return (seconds, result)
+
+	"""
+	start = time.perf_counter()
+	result = func(*args, **kwargs)
+	return time.perf_counter() - start, result
+
+
+class TestClientTransport:
+	"""
+	Send benchmark requests through django's test client, in process, with
+	queries and DB time counted per request
+
+	"""
+	counts_queries = True
+
+	def __init__(self):
+		from rest_framework.test import APIClient
+
+		self._local = threading.local() # one client per worker thread
+		self._client_class = APIClient
+
+	def send(self, method, path, data=None, token=None):
+		client = getattr(self._local, 'client', None)
+		if client is None:
+			client = self._local.client = self._client_class()
+
+		headers = {'HTTP_AUTHORIZATION': f"Bearer {token}"} if token else {}
+		response = getattr(client, method)(path, data, format='json', **headers)
+		payload = response.json() if response.get('Content-Type', '').startswith('application/json') else {}
+		return payload.get("status", response.status_code) if isinstance(payload, dict) else response.status_code
+
+	def close(self):
+		connections.close_all() # connections of the calling worker thread
+
+
+class HttpTransport:
+	"""
+	Send benchmark requests to a running server
+
+	"""
+	counts_queries = False
+
+	def __init__(self, base_url):
+		self.base_url = base_url.rstrip('/')
+
+	def send(self, method, path, data=None, token=None):
+		headers = {'Content-Type': 'application/json'}
+		if token:
+			headers['Authorization'] = f"Bearer {token}"
+
+		body = json.dumps(data).encode() if data is not None and method != 'get' else None
+		request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method.upper())
+
+		try:
+			with urllib.request.urlopen(request) as response:
+				code, content = response.status, response.read()
+		except urllib.error.HTTPError as e:
+			code, content = e.code, e.read()
+
+		try:
+			payload = json.loads(content)
+		except ValueError:
+			return code
+
+		return payload.get("status", code) if isinstance(payload, dict) else code
+
+	def close(self):
+		pass
+
+
+def run_load(transport, requests, concurrency):
+	"""
+	Send requests, a list of (method, path, data, token), from concurrency
+	threads and return their summary
+
+	"""
+	latencies = []
+	errors = []
+	queries = []
+	db_seconds = []
+	lock = threading.Lock()
+	pending = iter(requests)
+
+	def worker():
+		try:
+			while True:
+				with lock:
+					request = next(pending, None)
+				if request is None:
+					return
+
+				if transport.counts_queries:
+					with count_queries() as counter:
+						seconds, code = timed(transport.send, *request)
+				else:
+					seconds, code = timed(transport.send, *request)
+
+				with lock:
+					latencies.append(seconds * 1000)
+					errors.append(code >= 400)
+					if transport.counts_queries:
+						queries.append(counter.count)
+						db_seconds.append(counter.seconds)
+		finally:
+			transport.close()
+
+	threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+	start = time.perf_counter()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.perf_counter() - start
+
+	return summarize(latencies, errors, elapsed, queries, db_seconds)
+
+
+def summarize(latencies, errors, elapsed, queries=(), db_seconds=()):
+	"""
+	Summarize the latencies (ms) and error flags of a load run
+
+	"""
+	return {
+		"requests": len(latencies),
+		"errors": sum(errors),
+		"seconds": round(elapsed, 3),
+		"rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+		"p50_ms": round(percentile(latencies, 50), 3),
+		"p95_ms": round(percentile(latencies, 95), 3),
+		"p99_ms": round(percentile(latencies, 99), 3),
+		"queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+		"db_ms_per_request": round(sum(db_seconds) * 1000 / len(db_seconds), 3) if db_seconds else None,
+	}
+
+
+async def run_async_load(requests, concurrency):
+	"""
+	Send requests, a list of (method, path, data, token), through django's
+	ASGI handler from concurrency coroutines and return their summary
+
+	"""
+	import asyncio
+	from django.test import AsyncClient
+
+	client = AsyncClient()
+	latencies = []
+	errors = []
+	pending = iter(requests)
+
+	async def worker():
+		for method, path, data, token in pending: # coroutines share the iterator, no lock needed on one loop
+			headers = {'Authorization': f"Bearer {token}"} if token else {}
+			kwargs = {'content_type': 'application/json'} if method != 'get' else {}
+
+			start = time.perf_counter()
+			response = await getattr(client, method)(path, data, headers=headers, **kwargs)
+			latencies.append((time.perf_counter() - start) * 1000)
+
+			try:
+				payload = response.json()
+			except ValueError:
+				payload = None
+			code = payload.get("status", response.status_code) if isinstance(payload, dict) else response.status_code
+			errors.append(code >= 400)
+
+	start = time.perf_counter()
+	await asyncio.gather(*(worker() for _ in range(concurrency)))
+	return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def build_requests(url_name, users, count):
+	"""
+	Return count (method, path, data, token) tuples for the endpoint named
+	url_name, sync or async. Refresh tokens are single use, so a fresh one is
+	minted per refresh and sign out
+
+	"""
+	from django.urls import reverse
+	from .tokens import RefreshToken
+
+	path = reverse(url_name)
+	endpoint = url_name.removeprefix('async_')
+	picks = [users[i % len(users)] for i in range(count)]
+
+	if endpoint == 'signin':
+		return [('post', path, {"login_id": user.username, "password": BENCH_PASSWORD}, None) for user in picks]
+
+	if endpoint in ('token_refresh', 'signout'):
+		return [('post', path, {"refresh": str(RefreshToken.for_user(user))}, None) for user in picks]
+
+	access = {user.pk: str(RefreshToken.for_user(user).access_token) for user in set(picks)}
+	return [('get', path, None, access[user.pk]) for user in picks]
@@ -0,0 +1,135 @@
+import time
+import threading
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+
+"""
+This file contains the in process index of blacklisted refresh tokens.
+It holds the jti of every unexpired blacklisted token and catches up
+with the token_blacklist tables at most once per
+TOKEN_BLACKLIST_SYNC_INTERVAL seconds, so checking a token that isn't
+blacklisted costs a set lookup instead of a query. Tokens blacklisted by
+this process are added right away, tokens blacklisted by other processes
+are seen after the next sync.
+
+A sync reads the rows above the highest blacklist id seen so far, on the
+primary key index. Ids are taken at insert time, so a transaction that
+commits after a higher id was synced leaves a gap; ids missing below the
+highest one are looked up again on every sync for GAP_RETENTION seconds.
+
+"""
+
+GAP_RETENTION = 15 * 60 # seconds a missing id is looked for, longer than any blacklisting transaction
+
+
+class BlacklistIndex:
+	"""
+	Set of blacklisted jtis rebuilt incrementally from the database
+
+	"""
+
+	def __init__(self):
+		self._jtis = {} # jti -> expiry
+		self._lock = threading.Lock()
+		self._last_id = None # highest blacklist id loaded
+		self._gaps = {} # id below _last_id not seen yet -> monotonic time to stop looking
+		self._next_sync = 0.0
+		self._next_prune = 0.0
+
+	def sync(self):
+		"""
+		Load tokens blacklisted since the last sync and drop expired ones
+
+		"""
+		now = timezone.now()
+		last_id = self._last_id
+		if last_id is None: # first load, rows committed after the max are read by the next sync
+			last_id = self._blacklisted().aggregate(last_id=Max('id'))['last_id']
+			rows = list(self._unexpired_rows(now))
+		else:
+			rows = list(self._new_rows(last_id))
+
+		self._apply(rows, last_id, now)
+
+	async def async_sync(self):
+		"""
+		Async version of sync
+
+		"""
+		now = timezone.now()
+		last_id = self._last_id
+		if last_id is None:
+			last_id = (await self._blacklisted().aaggregate(last_id=Max('id')))['last_id']
+			rows = [row async for row in self._unexpired_rows(now)]
+		else:
+			rows = [row async for row in self._new_rows(last_id)]
+
+		self._apply(rows, last_id, now)
+
+	async def aensure_synced(self):
+		"""
+		Sync from async code when a sync is due, so the next contains() is answered
+		from the index without a query
+
+		"""
+		if time.monotonic() >= self._next_sync:
+			await self.async_sync()
+
+	def _blacklisted(self):
+		from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+		return BlacklistedToken.objects.all()
+
+	def _unexpired_rows(self, now):
+		return self._blacklisted().filter(token__expires_at__gt=now).values_list('id', 'token__jti', 'token__expires_at')
+
+	def _new_rows(self, last_id):
+		with self._lock:
+			gaps = list(self._gaps)
+
+		# expired rows are still read so their ids don't count as gaps
+		return self._blacklisted().filter(Q(id__gt=last_id) | Q(id__in=gaps)).values_list('id', 'token__jti', 'token__expires_at')
+
+	def _apply(self, rows, last_id, now):
+		with self._lock:
+			clock = time.monotonic()
+			seen = set()
+			for pk, jti, expiry in rows:
+				self._jtis[jti] = expiry
+				seen.add(pk)
+				self._gaps.pop(pk, None)
+
+			newest = max(seen, default=0)
+			if self._last_id is not None and newest > self._last_id: # ids skipped by this sync may still commit
+				self._gaps.update((pk, clock + GAP_RETENTION) for pk in range(self._last_id + 1, newest) if pk not in seen)
+
+			self._last_id = max(last_id or 0, newest)
+			self._gaps = {pk: until for pk, until in self._gaps.items() if until > clock}
+			self._next_sync = clock + settings.TOKEN_BLACKLIST_SYNC_INTERVAL
+
+			if clock >= self._next_prune: # expired tokens fail verification before the blacklist check
+				self._jtis = {jti: expiry for jti, expiry in self._jtis.items() if expiry > now}
+				self._next_prune = clock + 60
+
+	def contains(self, jti):
+		if time.monotonic() >= self._next_sync:
+			self.sync()
+
+		return jti in self._jtis
+
+	def add(self, jti, expiry):
+		with self._lock:
+			self._jtis[jti] = expiry
+
+	def clear(self):
+		with self._lock:
+			self._jtis.clear()
+			self._last_id = None
+			self._gaps.clear()
+			self._next_sync = 0.0
+
+
+blacklist_index = BlacklistIndex()
@@ -1,25 +1,80 @@
 from django.contrib.auth import get_user_model 
 from django.contrib.auth.backends import ModelBackend 
-from django.db.models import Q 
-from django.utils import timezone 
-from datetime import timedelta 
-from rest_framework.response import Response  
-from rest_framework import status  
+from django.contrib.auth.hashers import check_password
+
+from . import hashing, metrics
+from django_auth.routers import read_from_replica, replica_configured
 
 User = get_user_model()
 
 class CustomAuthenticationBackend(ModelBackend): # login with either username or email 
 	def authenticate(self, request, username=None, password=None, **kwargs):
+		if username is None:
+			username = kwargs.get(User.USERNAME_FIELD)
+
+		if username is None or password is None:
+			return None
+
 		try:
 			# try fetching user by username or email 
-			user = User.objects.get(Q(username__iexact=username) | Q(email__iexact=username))
+			with read_from_replica():
+				user = User.objects.get_by_login_id(username)
 
 		except User.DoesNotExist:
+			if not replica_configured():
+				return None
 
-			return None
+			try:
+				user = User.objects.db_manager('default').get_by_login_id(username) # the replica may not have a fresh sign up yet
+			except User.DoesNotExist:
+				return None
+
+		if request is not None:
+			request.login_user = user # let the sign in view reuse this lookup when the password is wrong
+
+		with metrics.timer(metrics.PASSWORD_CHECK_SECONDS):
+			valid = check_password(password, user.password)
+
+		if valid:
+			if hashing.must_rehash(user.password): # outdated algorithm or costs, upgrade while the raw password is at hand
+				hashing.rehash(user, password)
 
-		if user.check_password(password):
-			
 			return user 
 
-		return None
\ No newline at end of file
+		return None
+
+	async def aauthenticate(self, request, username=None, password=None, **kwargs):
+		"""
+		Async version of authenticate, the password check runs in the bounded hash pool
+		and raises HashPoolSaturated when the pool is full
+
+		"""
+		if username is None:
+			username = kwargs.get(User.USERNAME_FIELD)
+
+		if username is None or password is None:
+			return None
+
+		try:
+			with read_from_replica():
+				user = await User.objects.aget_by_login_id(username)
+
+		except User.DoesNotExist:
+			if not replica_configured():
+				return None
+
+			try:
+				user = await User.objects.db_manager('default').aget_by_login_id(username)
+			except User.DoesNotExist:
+				return None
+
+		if request is not None:
+			request.login_user = user
+
+		if await hashing.acheck_password(password, user.password):
+			if hashing.must_rehash(user.password):
+				await hashing.arehash(user, password)
+
+			return user
+
+		return None
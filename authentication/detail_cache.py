@@ -0,0 +1,140 @@
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import versions
+from django_auth.routers import read_from_replica
+
+
+"""
+This file contains the serialized response cache of the profile and user
+detail views. The serialized data of an object is cached together with
+its version, a read hits the cache when the cached entry matches the
+current version. Entries are invalidated by the post_save and post_delete
+signals, which also bump a generation counter, so a rebuild that raced
+with a write doesn't store what it read before the write.
+
+When an entry is missing only one request rebuilds it, the others wait up
+to DETAIL_REBUILD_WAIT seconds for it before building their own copy.
+Any django cache works, with the local memory cache the entries and
+invalidations are per process. Inside the replica reads of the detail
+views entries are built from the replica, except for objects written in
+the last DETAIL_RESPONSE_TTL seconds (those with a generation counter),
+which are built from the primary so the cache never stores a copy the
+replica hasn't caught up on.
+
+"""
+
+
+def cache():
+	return caches[settings.DETAIL_RESPONSE_CACHE]
+
+
+def data_key(kind, pk):
+	return f"detail:{kind}:{pk}"
+
+
+def lock_key(kind, pk):
+	return f"detail_lock:{kind}:{pk}"
+
+
+def generation_key(kind, pk):
+	return f"detail_generation:{kind}:{pk}"
+
+
+def invalidate(kind, pk):
+	"""
+	Drop the cached version and data of an object
+
+	"""
+	versions.forget(kind, pk)
+	cache().delete(data_key(kind, pk))
+
+	try:
+		cache().incr(generation_key(kind, pk))
+	except ValueError: # no rebuild in flight has read the counter yet
+		cache().add(generation_key(kind, pk), 1, settings.DETAIL_RESPONSE_TTL)
+
+
+def invalidate_many(kind, pks):
+	for pk in pks:
+		invalidate(kind, pk)
+
+
+def detail_response(data, version):
+	return versions.set_headers(Response({
+		"success":"success",
+		"data":data,
+		"status":status.HTTP_200_OK
+	}), version)
+
+
+def cached_entry(kind, pk):
+	"""
+	Return (version, data) when the cached data matches the current version
+
+	"""
+	entry = cache().get(data_key(kind, pk))
+	if entry is not None and entry[0] == versions.get(kind, pk):
+		return entry
+
+	return None
+
+
+def wait_for_entry(kind, pk):
+	"""
+	Poll for the entry another request is building
+
+	"""
+	deadline = time.monotonic() + settings.DETAIL_REBUILD_WAIT
+
+	while time.monotonic() < deadline:
+		time.sleep(0.02)
+		entry = cached_entry(kind, pk)
+		if entry is not None:
+			return entry
+
+	return None
+
+
+def get_detail(request, kind, pk, build, respond=detail_response):
+	"""
+	Return the detail response of an object from the cache, or from build,
+	which returns (version, serialized data) read from the database.
+	respond(data, version) builds the 200 response
+
+	"""
+	version = versions.get(kind, pk)
+	not_modified = versions.not_modified(request, version) # decided from the cache alone
+	if not_modified is not None:
+		return not_modified
+
+	if version is not None:
+		entry = cache().get(data_key(kind, pk))
+		if entry is not None and entry[0] == version:
+			return respond(entry[1], version)
+
+	locked = cache().add(lock_key(kind, pk), True, settings.DETAIL_REBUILD_LOCK_TIMEOUT)
+	if not locked: # someone else is rebuilding this entry
+		entry = wait_for_entry(kind, pk)
+		if entry is not None:
+			return versions.not_modified(request, entry[0]) or respond(entry[1], entry[0])
+
+	try:
+		generation = cache().get(generation_key(kind, pk))
+		# a written object may be behind on the replica, building it from the primary keeps the lag out of the cache
+		with read_from_replica(False) if generation is not None else nullcontext():
+			version, data = build()
+
+		if cache().get(generation_key(kind, pk)) == generation: # no write happened while building
+			versions.remember(kind, pk, version)
+			cache().set(data_key(kind, pk), (version, data), settings.DETAIL_RESPONSE_TTL)
+	finally:
+		if locked:
+			cache().delete(lock_key(kind, pk))
+
+	return versions.not_modified(request, version) or respond(data, version)
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (
+	Argon2PasswordHasher, BCryptSHA256PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+)
+
+
+"""
+This file contains the password hashers listed by django_auth/passwords.py.
+They keep django's algorithm names and hash formats, only their costs are
+read from the settings, so changing a cost or the algorithm never breaks
+existing hashes. Django's must_update() compares a stored hash's costs
+with these, which is what triggers the rehash on sign in.
+
+"""
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+
+	@property
+	def iterations(self):
+		return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+	maxmem = 2 ** 30 # a ceiling, not an allocation, openssl refuses work factors above 2 ** 14 with its 32MB default
+
+	@property
+	def work_factor(self):
+		return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+
+	@property
+	def time_cost(self):
+		return settings.PASSWORD_ARGON2_TIME_COST
+
+	@property
+	def memory_cost(self):
+		return settings.PASSWORD_ARGON2_MEMORY_COST
+
+	@property
+	def parallelism(self):
+		return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class TunedBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+
+	@property
+	def rounds(self):
+		return settings.PASSWORD_BCRYPT_ROUNDS
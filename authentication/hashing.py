@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+
+from . import metrics
+
+
+"""
+This file contains the bounded password hashing pool used by the async views
+and the rehash of outdated password hashes on sign in. PBKDF2, scrypt,
+argon2 and bcrypt all release the GIL, so a thread pool of
+PASSWORD_HASH_WORKERS threads hashes in parallel. At most PASSWORD_HASH_QUEUE_SIZE hashes wait behind the
+running ones, anything beyond that is refused with HashPoolSaturated.
+
+"""
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+class HashPoolSaturated(Exception):
+	"""
+	Raised when the hash pool queue is full
+
+	"""
+
+
+def get_executor():
+	"""
+	Lazily create the hashing thread pool and the semaphore bounding its queue
+
+	"""
+	global _executor, _slots
+
+	with _lock:
+		if _executor is None:
+			workers = settings.PASSWORD_HASH_WORKERS
+			_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+			_slots = threading.BoundedSemaphore(workers + settings.PASSWORD_HASH_QUEUE_SIZE)
+
+	return _executor, _slots
+
+
+def submit(func, *args):
+	"""
+	Run func in the hash pool, raise HashPoolSaturated instead of queueing without bound
+
+	"""
+	executor, slots = get_executor()
+
+	if not slots.acquire(blocking=False):
+		raise HashPoolSaturated()
+
+	future = executor.submit(contextvars.copy_context().run, func, *args) # keep the request's metrics sampling
+	future.add_done_callback(lambda f: slots.release())
+	return future
+
+
+def timed_check_password(password, encoded):
+	with metrics.timer(metrics.PASSWORD_CHECK_SECONDS):
+		return check_password(password, encoded)
+
+
+async def acheck_password(password, encoded):
+	"""
+	Check a raw password against a stored hash in the hash pool
+
+	"""
+	return await asyncio.wrap_future(submit(timed_check_password, password, encoded))
+
+
+async def amake_password(password):
+	"""
+	Hash a raw password in the hash pool
+
+	"""
+	return await asyncio.wrap_future(submit(make_password, password))
+
+
+def must_rehash(encoded):
+	"""
+	Return True when a stored hash was made by another algorithm than the
+	preferred one or with other costs, see django_auth/passwords.py
+
+	"""
+	try:
+		hasher = identify_hasher(encoded)
+	except ValueError: # unusable or unknown hash, nothing to upgrade
+		return False
+
+	preferred = get_hasher('default')
+	return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def rehash(user, password):
+	"""
+	Store the password hashed with the current policy, after a successful check
+
+	"""
+	user.set_password(password)
+	user.save(update_fields=['password']) # the router sends the write to the primary
+
+
+async def arehash(user, password):
+	"""
+	Async version of rehash, skipped while the hash pool is saturated since the
+	next sign in retries it
+
+	"""
+	try:
+		user.password = await amake_password(password)
+	except HashPoolSaturated:
+		return
+
+	await user.asave(update_fields=['password'])
@@ -0,0 +1,198 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+
+from . import metrics
+from .storage import picture_storage
+
+logger = logging.getLogger(__name__)
+
+
+"""
+This file contains the profile picture processing pipeline.
+Thumbnails are generated in a bounded process pool once the
+uploaded picture has been committed, so sign in and profile
+requests never wait for image decoding or encoding, nor for a
+free slot in the pool.
+
+Pictures are content addressed (see storage.py), so every size in
+PROFILE_THUMBNAIL_SIZES is generated once per unique image, and the
+StoredPicture reference counts tell the cleanup_pictures command which
+pictures no profile uses anymore.
+
+"""
+
+DEFAULT_PICTURE = 'default.jpeg' # default picture shipped already resized
+THUMBNAIL_DIR = 'profile_thumbnail' # directory for derived thumbnails
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+def thumbnail_name(picture_name, size=None):
+	"""
+	Return the storage name of the thumbnail of a profile picture at size
+	pixels, the largest size by default
+
+	"""
+	if not picture_name or picture_name == DEFAULT_PICTURE:
+		return picture_name # default picture is its own thumbnail
+
+	size = size or max(settings.PROFILE_THUMBNAIL_SIZES)
+	return f"{THUMBNAIL_DIR}/{size}/{os.path.basename(picture_name)}"
+
+
+def thumbnail_names(picture_name):
+	"""
+	Return {size: storage name} for every thumbnail size of a profile picture
+
+	"""
+	return {size: thumbnail_name(picture_name, size) for size in settings.PROFILE_THUMBNAIL_SIZES}
+
+
+def make_thumbnails(source, destinations):
+	"""
+	Decode the source image once and write a resized copy to each
+	(destination, size), return the seconds it took. This runs inside a
+	worker process
+
+	"""
+	start = time.perf_counter()
+	with Image.open(source) as img:
+		img.load()
+		for destination, size in destinations:
+			thumbnail = img.copy()
+			thumbnail.thumbnail(size)
+			os.makedirs(os.path.dirname(destination), exist_ok=True)
+			thumbnail.save(destination, format=img.format)
+
+	return time.perf_counter() - start
+
+
+def get_executor():
+	"""
+	Lazily create the process pool and the semaphore bounding its backlog
+
+	"""
+	global _executor, _slots
+
+	with _lock:
+		if _executor is None:
+			workers = settings.PROFILE_IMAGE_WORKERS
+			_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+			_slots = threading.BoundedSemaphore(workers * settings.PROFILE_IMAGE_QUEUE_FACTOR)
+
+	return _executor, _slots
+
+
+def _job_done(future):
+	_slots.release() # free a backlog slot for the next picture
+
+	if future.exception() is not None:
+		logger.error("Thumbnail generation failed", exc_info=future.exception())
+	elif metrics.enabled(): # runs outside any request, recorded whenever metrics are on
+		metrics.IMAGE_SECONDS.observe(future.result())
+
+
+def process_picture(picture_name, wait=False):
+	"""
+	Generate the missing thumbnails of a stored profile picture. While the
+	pool's backlog is full the picture is skipped unless wait is set, the
+	request thread running the on_commit callback never blocks on it.
+	cleanup_pictures --recount generates the skipped thumbnails
+
+	"""
+	source = picture_storage.path(picture_name)
+	destinations = [
+		(picture_storage.path(name), (size, size))
+		for size, name in thumbnail_names(picture_name).items()
+		if not picture_storage.exists(name) # thumbnails of a content addressed picture never change
+	]
+
+	if not destinations:
+		return
+
+	if not settings.PROFILE_IMAGE_WORKERS: # no pool configured, process inline
+		seconds = make_thumbnails(source, destinations)
+		if metrics.enabled():
+			metrics.IMAGE_SECONDS.observe(seconds)
+		return
+
+	executor, slots = get_executor()
+	if not slots.acquire(blocking=wait): # no free slot, don't queue without bound
+		logger.warning("Thumbnail pool is full, skipped thumbnails of %s", picture_name)
+		return
+
+	future = executor.submit(make_thumbnails, source, destinations)
+	future.add_done_callback(_job_done)
+
+
+def schedule_thumbnail(picture_name):
+	"""
+	Queue thumbnail generation once the current transaction commits
+
+	"""
+	if not picture_name or picture_name == DEFAULT_PICTURE:
+		return
+
+	transaction.on_commit(lambda: process_picture(picture_name))
+
+
+def counted(picture_name):
+	return bool(picture_name) and picture_name != DEFAULT_PICTURE # the shipped default picture is never deleted
+
+
+def retain(picture_name, content=None):
+	"""
+	Add a reference to a stored picture, generating its thumbnails when it is new.
+	content is the upload the picture was saved from, if any
+
+	"""
+	from .models import StoredPicture
+
+	if not counted(picture_name):
+		return
+
+	picture, created = StoredPicture.objects.get_or_create(name=picture_name)
+	StoredPicture.objects.filter(pk=picture.pk).update(references=F('references') + 1, updated_at=timezone.now())
+
+	if created:
+		# storage.save reuses an existing file, cleanup_pictures may have deleted it and its row since
+		if content is not None and not picture_storage.exists(picture_name):
+			picture_storage.restore(picture_name, content)
+		schedule_thumbnail(picture_name)
+
+
+def release(picture_name):
+	"""
+	Drop a reference to a stored picture, unreferenced pictures are deleted by the
+	cleanup_pictures command after a grace period
+
+	"""
+	from .models import StoredPicture
+
+	if not counted(picture_name):
+		return
+
+	StoredPicture.objects.filter(name=picture_name, references__gt=0).update(
+		references=F('references') - 1, updated_at=timezone.now()
+	)
+
+
+def delete_picture(picture_name):
+	"""
+	Delete a stored picture and its thumbnails
+
+	"""
+	for name in [picture_name, *thumbnail_names(picture_name).values()]:
+		picture_storage.delete(name)
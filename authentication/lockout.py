@@ -0,0 +1,135 @@
+import time
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+
+"""
+This file contains the login attempt lockout engine.
+Failed sign in attempts are counted in the django cache configured
+by LOGIN_ATTEMPTS_CACHE, the counter expires LOGIN_LOCKOUT_PERIOD
+seconds after the last failure. Counters can optionally be flushed
+back to UserProfile for auditing every LOGIN_ATTEMPTS_FLUSH_INTERVAL seconds.
+
+"""
+
+_dirty = {} # user id -> (login trials, last failed login) waiting to be flushed
+_dirty_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def get_cache():
+	return caches[settings.LOGIN_ATTEMPTS_CACHE]
+
+
+def attempts_key(user_id):
+	return f"login_attempts:{user_id}"
+
+
+def failed_attempts(user_id):
+	"""
+	Return the number of failed sign in attempts for a user
+
+	"""
+	return get_cache().get(attempts_key(user_id), 0)
+
+
+def register_failure(user_id):
+	"""
+	Atomically add a failed attempt and return the new count
+
+	"""
+	cache = get_cache()
+	key = attempts_key(user_id)
+	timeout = settings.LOGIN_LOCKOUT_PERIOD
+
+	cache.add(key, 0, timeout=timeout) # start the counter on first failure
+	try:
+		trials = cache.incr(key)
+	except ValueError: # counter expired between add and incr
+		cache.add(key, 1, timeout=timeout)
+		trials = 1
+
+	cache.touch(key, timeout) # lockout period runs from the last failed attempt
+	mark_dirty(user_id, trials, timezone.now())
+	return trials
+
+
+def reset(user_id):
+	"""
+	Clear the failed attempts of a user after a successful sign in
+
+	"""
+	if get_cache().delete(attempts_key(user_id)):
+		mark_dirty(user_id, 0, None)
+
+
+async def afailed_attempts(user_id):
+	return await get_cache().aget(attempts_key(user_id), 0)
+
+
+async def aregister_failure(user_id):
+	"""
+	Async version of register_failure
+
+	"""
+	cache = get_cache()
+	key = attempts_key(user_id)
+	timeout = settings.LOGIN_LOCKOUT_PERIOD
+
+	await cache.aadd(key, 0, timeout=timeout)
+	try:
+		trials = await cache.aincr(key)
+	except ValueError:
+		await cache.aadd(key, 1, timeout=timeout)
+		trials = 1
+
+	await cache.atouch(key, timeout)
+	if settings.LOGIN_ATTEMPTS_FLUSH_INTERVAL:
+		await sync_to_async(mark_dirty)(user_id, trials, timezone.now())
+	return trials
+
+
+async def areset(user_id):
+	"""
+	Async version of reset
+
+	"""
+	if await get_cache().adelete(attempts_key(user_id)) and settings.LOGIN_ATTEMPTS_FLUSH_INTERVAL:
+		await sync_to_async(mark_dirty)(user_id, 0, None)
+
+
+def mark_dirty(user_id, trials, last_failed_login):
+	"""
+	Record a counter change for the audit flush
+
+	"""
+	if not settings.LOGIN_ATTEMPTS_FLUSH_INTERVAL:
+		return
+
+	with _dirty_lock:
+		_dirty[user_id] = (trials, last_failed_login)
+
+	if time.monotonic() - _last_flush >= settings.LOGIN_ATTEMPTS_FLUSH_INTERVAL:
+		flush()
+
+
+def flush():
+	"""
+	Write pending counters back to UserProfile
+
+	"""
+	global _last_flush
+	from .models import UserProfile
+
+	with _dirty_lock:
+		pending = dict(_dirty)
+		_dirty.clear()
+		_last_flush = time.monotonic()
+
+	for user_id, (trials, last_failed_login) in pending.items():
+		# update() skips UserProfile.save() and its signals
+		UserProfile.objects.filter(user_id=user_id).update(login_trials=trials, last_failed_login=last_failed_login)
@@ -0,0 +1,63 @@
+import json
+import asyncio
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from authentication.bench import (
+	TestClientTransport, build_requests, run_async_load, run_load, seed_users, test_database
+)
+
+ENDPOINTS = ('signin', 'token_refresh', 'signout', 'profiles', 'users')
+
+
+class Command(BaseCommand):
+	"""
+	Benchmark the async views against the sync views
+
+	"""
+	help = "Compare sync views under WSGI, sync views under ASGI and async views under ASGI at high concurrency"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--users', type=int, default=200, help="users seeded before the run")
+		parser.add_argument('--requests', type=int, default=500, help="requests sent per endpoint and path")
+		parser.add_argument('--concurrency', type=int, default=64, help="concurrent clients, threads under WSGI and coroutines under ASGI")
+		parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS), help="endpoints to drive")
+		parser.add_argument('--output', help="write the results as JSON to this file")
+
+	def run(self, options):
+		seed_users(options['users'], with_profiles=True)
+		users = list(get_user_model().objects.order_by('pk')[:options['users']])
+		count, concurrency = options['requests'], options['concurrency']
+		results = {}
+
+		for endpoint in options['endpoints']:
+			results[endpoint] = {
+				# requests go through the handler in process, no server or network involved
+				"wsgi sync": run_load(TestClientTransport(), build_requests(endpoint, users, count), concurrency),
+				"asgi sync": asyncio.run(run_async_load(build_requests(endpoint, users, count), concurrency)),
+				"asgi async": asyncio.run(run_async_load(build_requests(f"async_{endpoint}", users, count), concurrency)),
+			}
+
+		return results
+
+	def handle(self, *args, **options):
+		setup_test_environment() # lets the test client's host through ALLOWED_HOSTS
+		try:
+			with test_database(on_disk=True), override_settings(RATE_LIMITS={}): # every simulated client shares one address
+				results = self.run(options)
+		finally:
+			teardown_test_environment()
+
+		self.stdout.write(f"{'endpoint':<15} {'path':<11} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+		for endpoint, paths in results.items():
+			for path, result in paths.items():
+				self.stdout.write(
+					f"{endpoint:<15} {path:<11} {result['rps']:>8} {result['p50_ms']:>9}"
+					f" {result['p95_ms']:>9} {result['p99_ms']:>9} {result['errors']:>7}"
+				)
+
+		if options['output']:
+			with open(options['output'], 'w') as handle:
+				json.dump(results, handle, indent=2)
@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from django_auth.database import PROFILES
+
+
+class Command(BaseCommand):
+	"""
+	Benchmark sign in across database profiles
+
+	"""
+	help = "Run benchmark_endpoints once per DB_PROFILE in a subprocess and compare throughput"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=['sqlite', 'sqlite-wal'], help="profiles to compare, postgres needs a reachable server")
+		parser.add_argument('--endpoints', nargs='+', default=['signin', 'token_refresh'], help="endpoints driven for each profile")
+		parser.add_argument('--users', type=int, default=200)
+		parser.add_argument('--requests', type=int, default=200, help="requests sent per endpoint")
+		parser.add_argument('--concurrency', type=int, default=8)
+		parser.add_argument('--output', help="write the results of every profile as JSON to this file")
+
+	def handle(self, *args, **options):
+		results = {}
+
+		with tempfile.TemporaryDirectory() as directory:
+			for profile in options['profiles']:
+				output = os.path.join(directory, f"{profile}.json")
+				command = [
+					sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark_endpoints',
+					'--users', str(options['users']), '--requests', str(options['requests']),
+					'--concurrency', str(options['concurrency']), '--output', output,
+					'--endpoints', *options['endpoints'],
+				]
+
+				# settings are read at startup, so each profile runs in its own process
+				run = subprocess.run(command, env={**os.environ, 'DB_PROFILE': profile}, capture_output=True, text=True)
+				if run.returncode != 0:
+					raise CommandError(f"benchmark failed for {profile}:\n{run.stderr}")
+
+				with open(output) as handle:
+					results[profile] = json.load(handle)["endpoints"]
+
+		self.stdout.write(f"{'profile':<12} {'endpoint':<15} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'db ms':>8}")
+		for profile, endpoints in results.items():
+			for endpoint, result in endpoints.items():
+				self.stdout.write(
+					f"{profile:<12} {endpoint:<15} {result['rps']:>8} {result['p50_ms']:>9} {result['p95_ms']:>9}"
+					f" {result['p99_ms']:>9} {result['errors']:>7} {str(result['db_ms_per_request']):>8}"
+				)
+
+		if options['output']:
+			with open(options['output'], 'w') as handle:
+				json.dump(results, handle, indent=2)
@@ -0,0 +1,50 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from authentication.bench import test_database, seed_users, percentile, timed
+
+
+class Command(BaseCommand):
+	"""
+	Benchmark sign in user lookup against growing user tables
+
+	"""
+	help = "Compare the indexed login lookup with the legacy username/email OR lookup"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000, 1000000], help="user table sizes to measure")
+		parser.add_argument('--lookups', type=int, default=1000, help="lookups per size")
+		parser.add_argument('--explain', action='store_true', help="print the query plan of both lookups")
+
+	def handle(self, *args, **options):
+		User = get_user_model()
+
+		with test_database():
+			self.stdout.write(f"{'users':>10} {'indexed p50 ms':>15} {'indexed p99 ms':>15} {'legacy p50 ms':>15} {'legacy p99 ms':>15}")
+
+			for size in sorted(options['sizes']):
+				seed_users(size)
+				login_ids = [
+					f"user{i}@example.com" if i % 2 else f"User{i}"
+					for i in (random.randrange(size) for _ in range(options['lookups']))
+				]
+
+				indexed = [timed(User.objects.get_by_login_id, login_id)[0] * 1000 for login_id in login_ids]
+				legacy = [
+					timed(User.objects.get, Q(username__iexact=login_id) | Q(email__iexact=login_id))[0] * 1000
+					for login_id in login_ids
+				]
+
+				self.stdout.write(
+					f"{size:>10} {percentile(indexed, 50):>15.3f} {percentile(indexed, 99):>15.3f}"
+					f" {percentile(legacy, 50):>15.3f} {percentile(legacy, 99):>15.3f}"
+				)
+
+				if options['explain']:
+					login_id = login_ids[0]
+					field = 'email' if '@' in login_id else 'username'
+					self.stdout.write(User.objects.login_lookup(field, login_id).explain())
+					self.stdout.write(User.objects.filter(Q(username__iexact=login_id) | Q(email__iexact=login_id)).explain())
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from authentication.bench import test_database, seed_users, count_queries, timed
+from authentication.models import UserProfile
+from authentication.serializers import ProfileSerializer, ProfileReadSerializer
+
+
+class Command(BaseCommand):
+	"""
+	Benchmark profile list serialization
+
+	"""
+	help = "Compare profile list serialization with and without the joined read path"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000], help="profile counts to measure")
+
+	def handle(self, *args, **options):
+		strategies = [
+			# name, function producing the serialized list
+			("model serializer, bare queryset", lambda: ProfileSerializer(UserProfile.objects.all(), many=True).data),
+			("model serializer, select_related", lambda: ProfileSerializer(
+				UserProfile.objects.select_related('user').only('id', 'profile_picture', 'display_name', 'user__username'), many=True
+			).data),
+			("read serializer, values", lambda: ProfileReadSerializer(UserProfile.objects.values(*ProfileReadSerializer.values), many=True).data),
+		]
+
+		with test_database():
+			self.stdout.write(f"{'profiles':>10} {'strategy':<36} {'seconds':>10} {'queries':>10}")
+
+			for size in sorted(options['sizes']):
+				seed_users(size, with_profiles=True)
+
+				for name, serialize in strategies:
+					with count_queries() as queries:
+						seconds, rows = timed(serialize)
+
+					self.stdout.write(f"{len(rows):>10} {name:<36} {seconds:>10.3f} {queries.count:>10}")
@@ -0,0 +1,98 @@
+import re
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from authentication import validators
+from authentication.bench import count_queries, test_database
+from authentication.serializers import SignUpSerializer
+
+
+def legacy_password_errors(password, password_again):
+	"""
+	The password checks as the serializers ran them before the validators
+	module, kept here as the baseline
+
+	"""
+	errors = {}
+
+	if not password:
+		errors["password_value"] = "Password field can't be empty"
+
+	if len(password) < 8:
+		errors["password_length"] = "Password must be at least 8 characters"
+
+	if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
+		errors["password_character"] = "Password must contain at least one special character"
+
+	if not any(v.isupper() for v in password):
+		errors["password_uppercase"] = "Password must contain at least one uppercase character"
+
+	if not any(v.islower() for v in password):
+		errors["password_lowercase"] = "Password must contain at least one lowercase character"
+
+	if not any(v.isdigit() for v in password):
+		errors["password_digit"] = "Password must contain at least one digit"
+
+	if password != password_again:
+		errors["password_match"] = "Both passwords must match"
+
+	return errors
+
+
+def legacy_username_errors(value):
+	errors = {}
+
+	if value is None or not value.strip():
+		errors["username_value"] = "Username can't be empty or filled with whitespaces only"
+
+	if len(value) < 4 or len(value) > 20:
+		errors["username_length"] = "Username length can only be between 4 to 20 characters"
+
+	if re.search(r'[!@#$%^&*()+\-={}\[\]:;"\'<>,.?/\\|`~]', value):
+		errors["username_character"] = "Username should not contain any special character except underscore '_'"
+
+	return errors
+
+
+CASES = (
+	("password valid", legacy_password_errors, validators.password_errors, ("testUSER23##", "testUSER23##")),
+	("password weak", legacy_password_errors, validators.password_errors, ("password", "password")),
+	("password long", legacy_password_errors, validators.password_errors, ("aB1#" + "x" * 1000, "aB1#" + "x" * 1000)),
+	("username valid", legacy_username_errors, validators.username_errors, ("testuser_01",)),
+	("username long", legacy_username_errors, validators.username_errors, ("u" * 1000 + "!",)),
+)
+
+
+class Command(BaseCommand):
+	"""
+	Benchmark the username, email and password validation
+
+	"""
+	help = "Compare the shared validators with the legacy serializer checks and measure sign up validation"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--number', type=int, default=100000, help="calls per validator case")
+		parser.add_argument('--signups', type=int, default=2000, help="sign up serializer validations per case")
+
+	def handle(self, *args, **options):
+		number = options['number']
+
+		self.stdout.write(f"{'case':<16} {'legacy us/call':>15} {'current us/call':>16} {'speedup':>8}")
+		for name, legacy, current, arguments in CASES:
+			legacy_us = timeit.timeit(lambda: legacy(*arguments), number=number) * 1e6 / number
+			current_us = timeit.timeit(lambda: current(*arguments), number=number) * 1e6 / number
+			self.stdout.write(f"{name:<16} {legacy_us:>15.3f} {current_us:>16.3f} {legacy_us / current_us:>7.1f}x")
+
+		signups = (
+			("signup invalid", {"username": "new!user", "email": "newuser@email.com", "password": "password", "password_again": "password"}),
+			("signup valid", {"username": "newuser", "email": "newuser@email.com", "password": "testUSER23##", "password_again": "testUSER23##"}),
+		)
+
+		with test_database():
+			self.stdout.write(f"\n{'case':<16} {'us/validation':>15} {'queries':>8}")
+			for name, data in signups:
+				with count_queries() as counter:
+					seconds = timeit.timeit(lambda: SignUpSerializer(data=data).is_valid(), number=options['signups'])
+
+				self.stdout.write(f"{name:<16} {seconds * 1e6 / options['signups']:>15.3f} {counter.count:>8}")
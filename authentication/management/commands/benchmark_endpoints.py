@@ -0,0 +1,123 @@
+import json
+import subprocess
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from authentication.bench import (
+	HttpTransport, TestClientTransport, build_requests, run_load, seed_users, test_database
+)
+
+ENDPOINTS = ('signin', 'token_refresh', 'signout', 'profiles', 'users')
+
+
+class Command(BaseCommand):
+	"""
+	Load test the authentication endpoints
+
+	"""
+	help = "Drive the authentication endpoints concurrently and report latency, throughput and queries per request"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--users', type=int, default=1000, help="users seeded before the run")
+		parser.add_argument('--requests', type=int, default=500, help="requests sent per endpoint")
+		parser.add_argument('--concurrency', type=int, default=8, help="concurrent client threads")
+		parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS), help="endpoints to drive")
+		parser.add_argument('--url', help="base url of a running server, e.g. http://127.0.0.1:8000. "
+			"Users are then seeded into the configured database, which the server must share. "
+			"By default requests go through the test client against a throwaway database")
+		parser.add_argument('--output', help="write the results as JSON to this file")
+		parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+		parser.add_argument('--max-regression', type=float, help="fail when an endpoint's p95 grows by more than this percent")
+
+	def run(self, options):
+		seed_users(options['users'], with_profiles=True)
+		users = list(get_user_model().objects.order_by('pk')[:options['users']])
+		transport = HttpTransport(options['url']) if options['url'] else TestClientTransport()
+
+		results = {}
+		for endpoint in options['endpoints']:
+			requests = build_requests(endpoint, users, options['requests'])
+			results[endpoint] = run_load(transport, requests, options['concurrency'])
+
+		return results
+
+	def handle(self, *args, **options):
+		if options['url']:
+			results = self.run(options)
+		else:
+			setup_test_environment() # lets the test client's host through ALLOWED_HOSTS
+			try:
+				with test_database(on_disk=True), override_settings(RATE_LIMITS={}): # every simulated client shares one address
+					results = self.run(options)
+			finally:
+				teardown_test_environment()
+
+		report = {
+			"meta": {
+				"commit": git_commit(),
+				"timestamp": datetime.now(timezone.utc).isoformat(),
+				"mode": "http" if options['url'] else "test_client",
+				"users": options['users'],
+				"requests": options['requests'],
+				"concurrency": options['concurrency'],
+			},
+			"endpoints": results,
+		}
+
+		self.stdout.write(f"{'endpoint':<15} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'queries':>8} {'db ms':>8}")
+		for endpoint, result in results.items():
+			self.stdout.write(
+				f"{endpoint:<15} {result['rps']:>8} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9}"
+				f" {result['errors']:>7} {str(result['queries_per_request']):>8} {str(result['db_ms_per_request']):>8}"
+			)
+
+		if options['output']:
+			with open(options['output'], 'w') as handle:
+				json.dump(report, handle, indent=2)
+
+		if options['compare']:
+			self.compare(report, options['compare'], options['max_regression'])
+
+	def compare(self, report, path, max_regression):
+		"""
+		Print p95 and throughput changes against an earlier run
+
+		"""
+		with open(path) as handle:
+			baseline = json.load(handle)
+
+		self.stdout.write(f"\ncompared with {baseline['meta'].get('commit') or path}")
+		self.stdout.write(f"{'endpoint':<15} {'p95 ms':>18} {'change':>8} {'rps':>18} {'change':>8}")
+
+		regressions = []
+		for endpoint, result in report["endpoints"].items():
+			before = baseline["endpoints"].get(endpoint)
+			if before is None:
+				continue
+
+			p95_change = change(before['p95_ms'], result['p95_ms'])
+			rps_change = change(before['rps'], result['rps'])
+			self.stdout.write(
+				f"{endpoint:<15} {before['p95_ms']:>8} -> {result['p95_ms']:<6} {p95_change:>+7.1f}%"
+				f" {before['rps']:>8} -> {result['rps']:<6} {rps_change:>+7.1f}%"
+			)
+
+			if max_regression is not None and p95_change > max_regression:
+				regressions.append(endpoint)
+
+		if regressions:
+			raise CommandError(f"p95 regressed by more than {max_regression}% on {', '.join(regressions)}")
+
+
+def change(before, after):
+	return (after - before) / before * 100 if before else 0.0
+
+
+def git_commit():
+	try:
+		return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
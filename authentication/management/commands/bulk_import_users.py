@@ -0,0 +1,72 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.provisioning import provision_batch
+
+
+class Command(BaseCommand):
+	"""
+	Import users from a CSV or JSON lines file
+
+	"""
+	help = "Stream users from a CSV or JSONL file and create them in batches"
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help="file with username, email and password or password_hash columns")
+		parser.add_argument('--format', choices=['csv', 'jsonl'], help="file format, guessed from the extension by default")
+		parser.add_argument('--batch-size', type=int, default=1000, help="users inserted per batch")
+		parser.add_argument('--report', help="write a JSON line per failed record to this file")
+
+	def read_records(self, handle, file_format):
+		if file_format == 'csv':
+			yield from csv.DictReader(handle)
+		else:
+			for line in handle:
+				if not line.strip():
+					continue
+
+				try:
+					yield json.loads(line) # provision_batch reports lines that aren't objects
+				except ValueError:
+					yield line.strip() # not JSON, reported the same way
+
+	def handle(self, *args, **options):
+		path = options['path']
+		file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+		created = failed = 0
+		start = time.perf_counter()
+
+		try:
+			handle = open(path, newline='')
+		except OSError as e:
+			raise CommandError(f"Unable to open {path}: {e}")
+
+		report = open(options['report'], 'w') if options['report'] else None
+
+		with handle:
+			records = self.read_records(handle, file_format)
+
+			while True:
+				batch = list(islice(records, options['batch_size']))
+				if not batch:
+					break
+
+				for result in provision_batch(batch):
+					if result["status"] == "created":
+						created += 1
+					else:
+						failed += 1
+						if report:
+							report.write(json.dumps(result, default=str) + "\n")
+
+				elapsed = time.perf_counter() - start
+				self.stdout.write(f"{created} created, {failed} failed, {created / elapsed:.0f} users/s")
+
+		if report:
+			report.close()
+
+		self.stdout.write(self.style.SUCCESS(f"Imported {created} users, {failed} failed"))
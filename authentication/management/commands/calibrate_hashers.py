@@ -0,0 +1,77 @@
+import math
+import os
+import statistics
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from authentication import hashers
+from authentication.bench import BENCH_PASSWORD, timed
+
+
+"""
+Each algorithm is timed with its current cost, the cost is scaled towards the
+target latency and timed again. Hashing runs on the calling thread, so the
+rates are per core.
+
+"""
+
+ALGORITHMS = {
+	# algorithm: (hasher, library, cost setting, scale the cost by a latency ratio)
+	'pbkdf2': (hashers.TunedPBKDF2PasswordHasher, None, 'PASSWORD_PBKDF2_ITERATIONS',
+		lambda cost, ratio: max(1000, int(round(cost * ratio, -3)))),
+	'scrypt': (hashers.TunedScryptPasswordHasher, None, 'PASSWORD_SCRYPT_WORK_FACTOR',
+		lambda cost, ratio: max(2 ** 10, 2 ** round(math.log2(cost * ratio)))), # memory and time grow with the work factor
+	'argon2': (hashers.TunedArgon2PasswordHasher, 'argon2', 'PASSWORD_ARGON2_TIME_COST',
+		lambda cost, ratio: max(1, round(cost * ratio))),
+	'bcrypt': (hashers.TunedBCryptSHA256PasswordHasher, 'bcrypt', 'PASSWORD_BCRYPT_ROUNDS',
+		lambda cost, ratio: min(31, max(4, cost + round(math.log2(ratio))))), # rounds are log2 of the iterations
+}
+
+
+def seconds_per_hash(hasher_class, samples):
+	hasher = hasher_class()
+	return statistics.median(timed(hasher.encode, BENCH_PASSWORD, hasher.salt())[0] for _ in range(samples))
+
+
+class Command(BaseCommand):
+	"""
+	Calibrate password hashing costs against a target latency on this host
+
+	"""
+	help = "Print hashes per second per core for each hashing algorithm and the cost meeting a target latency"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--target-ms', type=float, default=250, help="time one password check should take")
+		parser.add_argument('--samples', type=int, default=5, help="hashes timed per setting, the median is kept")
+		parser.add_argument('--algorithms', nargs='+', choices=ALGORITHMS, default=list(ALGORITHMS), help="algorithms to calibrate")
+
+	def handle(self, *args, **options):
+		target = options['target_ms'] / 1000
+		self.stdout.write(f"{os.cpu_count()} cores, PASSWORD_HASH_ALGORITHM={settings.PASSWORD_HASH_ALGORITHM}, target {options['target_ms']:g} ms\n")
+		self.stdout.write(f"{'algorithm':<10} {'setting':<28} {'cost':>10} {'ms/hash':>9} {'hashes/s/core':>14}")
+
+		suggested = []
+		for algorithm in options['algorithms']:
+			hasher_class, library, setting, scale = ALGORITHMS[algorithm]
+
+			if library and find_spec(library) is None:
+				self.stdout.write(f"{algorithm:<10} {setting:<28} {'-':>10} {library} is not installed")
+				continue
+
+			current = getattr(settings, setting)
+			seconds = seconds_per_hash(hasher_class, options['samples'])
+			self.stdout.write(f"{algorithm:<10} {setting:<28} {current:>10} {seconds * 1000:>9.1f} {1 / seconds:>14.2f}")
+
+			cost = scale(current, target / seconds)
+			if cost != current:
+				with override_settings(**{setting: cost}):
+					seconds = seconds_per_hash(hasher_class, options['samples'])
+				self.stdout.write(f"{'':<10} {setting:<28} {cost:>10} {seconds * 1000:>9.1f} {1 / seconds:>14.2f}")
+
+			suggested.append(f"{setting}={cost}")
+
+		if suggested:
+			self.stdout.write("\nsuggested environment:\n" + "\n".join(suggested))
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from authentication import images
+from authentication.models import StoredPicture, UserProfile
+from authentication.storage import picture_storage
+
+
+class Command(BaseCommand):
+	"""
+	Delete profile pictures no profile references anymore
+
+	"""
+	help = "Delete unreferenced profile pictures and their thumbnails once PROFILE_PICTURE_GRACE_PERIOD has passed"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--grace', type=int, help="seconds a picture stays unreferenced before it is deleted, "
+			"PROFILE_PICTURE_GRACE_PERIOD by default")
+		parser.add_argument('--recount', action='store_true', help="recompute the reference counts from the profiles first, "
+			"for pictures stored before reference counting or changed with queryset updates, and generate missing thumbnails")
+		parser.add_argument('--dry-run', action='store_true', help="list the pictures that would be deleted")
+
+	def recount(self):
+		"""
+		Set every reference count to the number of profiles using the picture
+
+		"""
+		now = timezone.now()
+		counts = dict(
+			UserProfile.objects.exclude(profile_picture__in=['', images.DEFAULT_PICTURE]).exclude(profile_picture__isnull=True)
+			.values('profile_picture').annotate(references=Count('id')).values_list('profile_picture', 'references')
+		)
+
+		for name, references in counts.items():
+			picture, _ = StoredPicture.objects.get_or_create(name=name)
+			if picture.references != references:
+				StoredPicture.objects.filter(pk=picture.pk).update(references=references, updated_at=now)
+
+			if picture_storage.exists(name): # thumbnails skipped while the pool was full or of pictures stored before content addressing
+				images.process_picture(name, wait=True)
+
+		unused = StoredPicture.objects.filter(references__gt=0).exclude(name__in=list(counts)).update(references=0, updated_at=now)
+		self.stdout.write(f"Recounted {len(counts)} referenced pictures, {unused} lost all references")
+
+	def handle(self, *args, **options):
+		if options['recount']:
+			self.recount()
+
+		grace = options['grace'] if options['grace'] is not None else settings.PROFILE_PICTURE_GRACE_PERIOD
+		cutoff = timezone.now() - timedelta(seconds=grace)
+		deleted = 0
+
+		for pk, name in StoredPicture.objects.filter(references=0, updated_at__lt=cutoff).values_list('pk', 'name').iterator():
+			if options['dry_run']:
+				self.stdout.write(name)
+				continue
+
+			# the count is checked again in the delete, a profile may have picked the picture up since the select
+			if StoredPicture.objects.filter(pk=pk, references=0).delete()[0]:
+				images.delete_picture(name)
+				deleted += 1
+
+		if not options['dry_run']:
+			self.stdout.write(f"Deleted {deleted} unreferenced pictures")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+	"""
+	Delete expired outstanding and blacklisted tokens in batches
+
+	"""
+	help = "Remove expired rows from the token blacklist tables in batches"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=1000, help="rows deleted per batch")
+
+	def handle(self, *args, **options):
+		now = timezone.now()
+		removed = 0
+
+		while True:
+			# small batches keep each delete transaction and its locks short
+			ids = list(OutstandingToken.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:options['batch_size']])
+			if not ids:
+				break
+
+			BlacklistedToken.objects.filter(token_id__in=ids).delete()
+			OutstandingToken.objects.filter(id__in=ids).delete()
+			removed += len(ids)
+
+		self.stdout.write(f"Removed {removed} expired tokens")
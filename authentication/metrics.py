@@ -0,0 +1,187 @@
+import time
+import random
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+"""
+This file contains the in process metrics of the authentication app.
+MetricsMiddleware samples METRICS_SAMPLE_RATE of the requests, for a
+sampled request it records the view latency, the number and duration of
+its SQL queries, and timers inside the app add password check and image
+processing time. Requests that aren't sampled pay for one context
+variable lookup per timer and per query. Metrics are per process and
+exposed in the prometheus text format by the metrics/ view, so every
+worker process has to be scraped.
+
+"""
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_current = ContextVar('metrics_request', default=None) # RequestStats of the sampled request
+
+
+class RequestStats:
+	"""
+	Query totals of one sampled request
+
+	"""
+	__slots__ = ('queries', 'db_seconds')
+
+	def __init__(self):
+		self.queries = 0
+		self.db_seconds = 0.0
+
+
+class Histogram:
+	"""
+	Prometheus histogram with a fixed set of label names
+
+	"""
+
+	def __init__(self, name, documentation, labels=(), buckets=SECONDS_BUCKETS):
+		self.name = name
+		self.documentation = documentation
+		self.labels = labels
+		self.buckets = buckets
+		self._series = {} # label values -> [bucket counts..., sum, count]
+		self._lock = threading.Lock()
+
+	def observe(self, value, *label_values):
+		with self._lock:
+			series = self._series.get(label_values)
+			if series is None:
+				series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+
+			for index, bound in enumerate(self.buckets):
+				if value <= bound:
+					series[index] += 1
+					break
+
+			series[-2] += value
+			series[-1] += 1
+
+	def render(self):
+		lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+
+		with self._lock:
+			series = {labels: list(values) for labels, values in self._series.items()}
+
+		for label_values, values in sorted(series.items()):
+			labels = [f'{name}="{escape(value)}"' for name, value in zip(self.labels, label_values)]
+			cumulative = 0
+
+			for bound, count in zip(self.buckets, values):
+				cumulative += count
+				lines.append(f"{self.name}_bucket{format_labels(labels, bound)} {cumulative}")
+
+			lines.append(f"{self.name}_bucket{format_labels(labels, '+Inf')} {values[-1]}")
+			lines.append(f"{self.name}_sum{format_labels(labels)} {values[-2]}")
+			lines.append(f"{self.name}_count{format_labels(labels)} {values[-1]}")
+
+		return "\n".join(lines)
+
+	def clear(self):
+		with self._lock:
+			self._series.clear()
+
+
+def escape(value):
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, bound=None):
+	if bound is not None:
+		labels = labels + ['le="%s"' % bound]
+
+	return "{%s}" % ",".join(labels) if labels else ""
+
+
+REQUEST_SECONDS = Histogram('auth_request_duration_seconds', "Time spent in views", labels=('view', 'method'))
+REQUEST_QUERIES = Histogram('auth_request_queries', "SQL queries per request", labels=('view', 'method'), buckets=QUERY_BUCKETS)
+REQUEST_DB_SECONDS = Histogram('auth_request_db_duration_seconds', "Time spent in SQL queries per request", labels=('view', 'method'))
+PASSWORD_CHECK_SECONDS = Histogram('auth_password_check_duration_seconds', "Time spent checking passwords")
+IMAGE_SECONDS = Histogram('auth_image_processing_duration_seconds', "Time spent generating profile thumbnails")
+
+HISTOGRAMS = (REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, PASSWORD_CHECK_SECONDS, IMAGE_SECONDS)
+
+
+def enabled():
+	return settings.METRICS_SAMPLE_RATE > 0
+
+
+def start_request():
+	"""
+	Decide whether the current request is sampled, return its stats or None
+
+	"""
+	rate = settings.METRICS_SAMPLE_RATE
+	if rate <= 0 or rate < 1 and random.random() >= rate:
+		return None, None
+
+	stats = RequestStats()
+	return stats, _current.set(stats)
+
+
+def finish_request(request, stats, token, seconds):
+	_current.reset(token)
+
+	match = getattr(request, 'resolver_match', None)
+	labels = (match.view_name if match else 'unmatched', request.method)
+	REQUEST_SECONDS.observe(seconds, *labels)
+	REQUEST_QUERIES.observe(stats.queries, *labels)
+	REQUEST_DB_SECONDS.observe(stats.db_seconds, *labels)
+
+
+class timer:
+	"""
+	Time a block into histogram when the current request is sampled
+
+	"""
+	__slots__ = ('histogram', 'start')
+
+	def __init__(self, histogram):
+		self.histogram = histogram
+		self.start = None
+
+	def __enter__(self):
+		if _current.get() is not None:
+			self.start = time.perf_counter()
+
+	def __exit__(self, *exc_info):
+		if self.start is not None:
+			self.histogram.observe(time.perf_counter() - self.start)
+
+
+def record_query(execute, sql, params, many, context):
+	"""
+	Execute wrapper installed on every connection, times queries of sampled requests
+
+	"""
+	stats = _current.get()
+	if stats is None:
+		return execute(sql, params, many, context)
+
+	start = time.perf_counter()
+	try:
+		return execute(sql, params, many, context)
+	finally:
+		stats.queries += 1
+		stats.db_seconds += time.perf_counter() - start
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+	if record_query not in connection.execute_wrappers:
+		connection.execute_wrappers.append(record_query)
+
+
+def render():
+	return "\n".join(histogram.render() for histogram in HISTOGRAMS) + "\n"
+
+
+def clear():
+	for histogram in HISTOGRAMS:
+		histogram.clear()
@@ -0,0 +1,51 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+"""
+This file contains the middleware of the authentication app
+
+"""
+
+
+class MetricsMiddleware:
+	"""
+	Record view latency and SQL totals of sampled requests, see metrics.py
+
+	"""
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		self.async_mode = iscoroutinefunction(get_response)
+		if self.async_mode:
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if self.async_mode:
+			return self.__acall__(request)
+
+		stats, token = metrics.start_request()
+		if stats is None:
+			return self.get_response(request)
+
+		start = time.perf_counter()
+		try:
+			return self.get_response(request)
+		finally:
+			metrics.finish_request(request, stats, token, time.perf_counter() - start)
+
+	async def __acall__(self, request):
+		stats, token = metrics.start_request()
+		if stats is None:
+			return await self.get_response(request)
+
+		start = time.perf_counter()
+		try:
+			return await self.get_response(request)
+		finally:
+			metrics.finish_request(request, stats, token, time.perf_counter() - start)
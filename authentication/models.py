@@ -1,7 +1,11 @@
-from django.db import models 
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser, UserManager, Group, Permission
 from django.utils import timezone
-from PIL import Image 
+
+from . import images
+from .storage import picture_storage
 
 
 class CustomUserManager(UserManager): # custom user manager  
@@ -17,8 +21,35 @@ class CustomUserManager(UserManager): # custom user manager
 		email = self.normalize_email(email)
 		user = self.model(username=username, email=email, **extra_fields)
 		user.set_password(password)
-		user.save(using=self._db)
-		return user 
+		return self.save_new_user(user)
+
+	def save_new_user(self, user): # insert a new user and its profile in one transaction
+		user._state.fields_cache['user_profile'] = None # cached as missing, the post_save fallback leaves the insert to create_for_users
+		with transaction.atomic(using=self._db):
+			user.save(using=self._db)
+			UserProfile.objects.create_for_users([user], using=self._db)
+		return user
+
+	def login_lookup(self, field, login_id): # the database lowercases both sides, so the unique_lower_* indexes match
+		return self.select_related('user_profile').alias(login_lookup=Lower(field)).filter(login_lookup=Lower(Value(login_id)))
+
+	def get_by_login_id(self, login_id): # fetch user by username or email with indexed lookups
+		field = 'email' if '@' in login_id else 'username' # emails always contain '@'
+		try:
+			return self.login_lookup(field, login_id).get()
+		except self.model.DoesNotExist:
+			if field == 'username':
+				raise
+			return self.login_lookup('username', login_id).get() # usernames made outside sign up, like createsuperuser, may contain '@'
+
+	async def aget_by_login_id(self, login_id): # async version of get_by_login_id
+		field = 'email' if '@' in login_id else 'username'
+		try:
+			return await self.login_lookup(field, login_id).aget()
+		except self.model.DoesNotExist:
+			if field == 'username':
+				raise
+			return await self.login_lookup('username', login_id).aget()
 
 	def create_superuser(self, username, email, password, **extra_fields): # create super user
 		extra_fields.setdefault('is_staff', True)
@@ -35,6 +66,7 @@ class CustomUser(AbstractUser):
 	groups = models.ManyToManyField(Group, blank=True, related_name="users")
 	user_permissions = models.ManyToManyField(Permission, blank=True, related_name="users")
 	time = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True) # version of the user details, see versions.py
 
 
 	USERNAME_FIELD = "username"
@@ -49,44 +81,112 @@ class CustomUser(AbstractUser):
 		ordering = ['-time']
 		verbose_name = 'CustomUser'
 		verbose_name_plural = 'CustomUsers'
+		indexes = [models.Index(fields=['-time', '-id'], name='customuser_time_idx')] # list pagination key
+		constraints = [
+			# case insensitive uniqueness, these indexes also serve sign in lookups
+			models.UniqueConstraint(Lower('username'), name='unique_lower_username'),
+			models.UniqueConstraint(Lower('email'), name='unique_lower_email'),
+		]
+
+
+class UserProfileManager(models.Manager):
+
+	def create_for_users(self, users, using=None): # insert default profiles without per row save() and post_save
+		profiles = [UserProfile(user=user) for user in users]
+		self.db_manager(using).bulk_create(profiles)
+		for user, profile in zip(users, profiles):
+			user.user_profile = profile # later access doesn't query the new profile
+		return profiles
+
+	def for_user(self, user): # profile of a user, created on first access for users inserted without one
+		try:
+			return user.user_profile
+		except UserProfile.DoesNotExist:
+			profile, _ = self.get_or_create(user=user)
+			return profile
+
+	async def afor_user(self, user): # async version of for_user
+		try:
+			return user.user_profile
+		except UserProfile.DoesNotExist:
+			profile, _ = await self.aget_or_create(user=user)
+			return profile
 
 
 class UserProfile(models.Model): # user profile model 
-	profile_picture = models.ImageField(upload_to="profile_picture", default='default.jpeg', blank=True, null=True)
+	profile_picture = models.ImageField(upload_to="profile_picture", storage=picture_storage, default='default.jpeg', blank=True, null=True) # stored by content hash
 	display_name = models.CharField(max_length=35, blank=True, null=True)
 	user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name="user_profile")
 	login_trials = models.IntegerField(default=0)
 	max_login_trials = models.IntegerField(default=5)
 	last_failed_login = models.DateTimeField(null=True, blank=True)
 	time = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True) # version of the profile details, see versions.py
+
+	objects = UserProfileManager()
 
 
 	def increment_login_trials(self): # function to increase login trials 
 		self.login_trials += 1
 		self.last_failed_login = timezone.now()
-		self.save()
+		self.save(update_fields=['login_trials', 'last_failed_login'])
 
 	def reset_login_trials(self): # function to reset login trials
 		self.login_trials = 0
 		self.last_failed_login = None
-		self.save()
+		self.save(update_fields=['login_trials', 'last_failed_login'])
+
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super().from_db(db, field_names, values)
+		instance._loaded_profile_picture = instance.__dict__.get('profile_picture') # remember stored picture to detect changes
+		return instance
+
+	@property
+	def profile_thumbnail(self): # storage name of the derived thumbnail
+		return images.thumbnail_name(self.profile_picture.name)
+
+	def profile_picture_changed(self, update_fields=None):
+		"""
+		Check if the profile picture differs from the stored one
+
+		"""
+		if update_fields is not None and 'profile_picture' not in update_fields:
+			return False
+
+		if 'profile_picture' not in self.__dict__: # deferred and never touched
+			return False
+
+		loaded = getattr(self, '_loaded_profile_picture', None)
+		return self.profile_picture.name != loaded
 
 	def save(self, *args, **kwargs):
-		super().save(*args, **kwargs)
+		if not self.profile_picture_changed(kwargs.get('update_fields')):
+			return super().save(*args, **kwargs)
 
-		# open profile image
-		img = Image.open(self.profile_picture.path)
+		upload = None if self.profile_picture._committed else self.profile_picture.file # like FileField.pre_save
 
-		# set default image size 
-		default_size = (200, 200)
-		img.thumbnail(default_size)
+		with transaction.atomic(using=kwargs.get('using')):
+			super().save(*args, **kwargs)
+			images.retain(self.profile_picture.name, upload) # thumbnails of a new picture are built off the request path
+			images.release(getattr(self, '_loaded_profile_picture', None))
 
-		# save the resized image 
-		img.save(self.profile_picture.path)
+		self._loaded_profile_picture = self.profile_picture.name
 
 
 	class Meta:
 		ordering = ['-time']
 		verbose_name = 'UserProfile'
 		verbose_name_plural = 'UserProfiles'
+		indexes = [models.Index(fields=['-time', '-id'], name='userprofile_time_idx')] # list pagination key
+
 
+class StoredPicture(models.Model): # reference count of a content addressed profile picture
+	name = models.CharField(max_length=100, unique=True) # storage name, see storage.py
+	references = models.PositiveIntegerField(default=0) # profiles using the picture
+	updated_at = models.DateTimeField(auto_now=True) # last reference change, starts the cleanup grace period
+
+	class Meta:
+		verbose_name = 'StoredPicture'
+		verbose_name_plural = 'StoredPictures'
+		indexes = [models.Index(fields=['references', 'updated_at'], name='storedpicture_cleanup_idx')]
@@ -0,0 +1,43 @@
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class TimeCursorPagination(CursorPagination):
+	"""
+	Keyset pagination over the (time, id) index, page cost doesn't grow with the offset
+
+	"""
+	ordering = ('-time', '-id')
+	page_size_query_param = 'page_size'
+	max_page_size = 500
+
+
+def stream_ndjson(queryset, serializer_class, chunk_size):
+	"""
+	Stream a queryset as newline delimited JSON, rows are fetched chunk_size at a time
+	so memory use stays the same whatever the table size
+
+	"""
+	encoder = JSONEncoder()
+
+	def rows():
+		for obj in queryset.iterator(chunk_size=chunk_size):
+			yield encoder.encode(serializer_class(obj).data) + "\n"
+
+	return StreamingHttpResponse(rows(), content_type='application/x-ndjson')
+
+
+def astream_ndjson(queryset, serializer_class, chunk_size):
+	"""
+	Async stream_ndjson for the async views. ASGI buffers a sync iterator
+	before sending it, the async iterator is sent as each chunk is fetched
+
+	"""
+	encoder = JSONEncoder()
+
+	async def rows():
+		async for obj in queryset.aiterator(chunk_size=chunk_size):
+			yield encoder.encode(serializer_class(obj).data) + "\n"
+
+	return StreamingHttpResponse(rows(), content_type='application/x-ndjson')
@@ -0,0 +1,197 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
+from rest_framework import serializers
+
+from .models import UserProfile
+from .availability import taken_cache
+from . import validators
+
+
+"""
+This file contains bulk user provisioning, used by the bulk_import_users
+command and the staff bulk sign up endpoint. Each batch is validated with
+one availability query, raw passwords are hashed in parallel in a process
+pool and users and profiles are inserted with bulk_create, which doesn't
+send the per row post_save signals.
+
+"""
+
+RECORD_FIELDS = ("username", "email", "password", "password_hash")
+
+_executor = None
+_email_field = serializers.EmailField() # built once, runs the same format checks as the sign up serializer
+_lock = threading.Lock()
+
+
+def _init_worker(settings_module):
+	os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+	django.setup() # hashers read PASSWORD_HASHERS from the settings
+
+
+def get_executor():
+	"""
+	Lazily create the password hashing process pool
+
+	"""
+	global _executor
+
+	with _lock:
+		if _executor is None:
+			_executor = ProcessPoolExecutor(
+				max_workers=settings.BULK_PROVISION_WORKERS,
+				mp_context=multiprocessing.get_context('spawn'),
+				initializer=_init_worker,
+				initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'django_auth.settings'),)
+			)
+
+	return _executor
+
+
+def hash_passwords(passwords):
+	"""
+	Hash raw passwords, in parallel when BULK_PROVISION_WORKERS is set
+
+	"""
+	if not passwords:
+		return []
+
+	if not settings.BULK_PROVISION_WORKERS:
+		return [make_password(password) for password in passwords]
+
+	chunksize = max(1, len(passwords) // (settings.BULK_PROVISION_WORKERS * 4))
+	return list(get_executor().map(make_password, passwords, chunksize=chunksize))
+
+
+def validate_record(record):
+	"""
+	Run the sign up field checks on one record, return its errors
+
+	"""
+	if not isinstance(record, dict):
+		return {"record": "Record must be an object with username, email and password or password_hash"}
+
+	errors = {
+		field: "Must be a string" for field in RECORD_FIELDS
+		if record.get(field) is not None and not isinstance(record[field], str)
+	}
+	if errors: # the field checks expect strings
+		return errors
+
+	username = record.get("username") or ""
+	email = record.get("email") or ""
+
+	for field, value, validate in (
+		("username", username, validators.validate_username),
+		("email", email, lambda value: validators.validate_email(_email_field.run_validation(value))),
+	):
+		try:
+			validate(value)
+		except serializers.ValidationError as e:
+			errors[field] = e.detail
+
+	if record.get("password_hash"):
+		try:
+			identify_hasher(record["password_hash"])
+		except ValueError:
+			errors["password_hash"] = "Unknown password hash format"
+
+	elif not record.get("password"):
+		errors["password"] = "Password or password_hash is required"
+
+	else:
+		password = validators.password_errors(record["password"], record["password"]) # the sign up rules, nothing to confirm against
+		if password:
+			errors["password"] = [password]
+
+	return errors
+
+
+def provision_batch(records):
+	"""
+	Create the users of one batch, return a result per record
+
+	Records are dicts with username, email and either a raw password or
+	a password_hash already in django's hash format, anything else gets an
+	error result
+	"""
+	User = get_user_model()
+	results = [None] * len(records)
+	candidates = []
+	seen = set()
+
+	for index, record in enumerate(records):
+		errors = validate_record(record)
+		if errors:
+			results[index] = {"username": record.get("username") if isinstance(record, dict) else None, "status": "error", "errors": errors}
+			continue
+
+		username = (record.get("username") or "").replace(" ", "_")
+		email = User.objects.normalize_email(record.get("email") or "")
+
+		if ('username', username.lower()) in seen or ('email', email.lower()) in seen:
+			results[index] = {"username": record.get("username"), "status": "error", "errors": {"duplicate": "Username or email is repeated in this batch"}}
+			continue
+
+		seen.update({('username', username.lower()), ('email', email.lower())})
+		candidates.append((index, username, email, record))
+
+	# one availability query for the whole batch
+	if candidates:
+		taken = set()
+		rows = User.objects.alias(username_lower=Lower('username'), email_lower=Lower('email')).filter(
+			Q(username_lower__in=[Lower(Value(username)) for _, username, _, _ in candidates]) | # lowercased like the unique indexes
+			Q(email_lower__in=[Lower(Value(email)) for _, _, email, _ in candidates])
+		).values_list('username', 'email')
+
+		for taken_username, taken_email in rows:
+			taken.update({('username', taken_username.lower()), ('email', taken_email.lower())})
+
+		available = []
+		for index, username, email, record in candidates:
+			if ('username', username.lower()) in taken or ('email', email.lower()) in taken:
+				results[index] = {"username": username, "status": "error", "errors": {"unavailable": "Username or email is not available"}}
+			else:
+				available.append((index, username, email, record))
+
+		candidates = available
+
+	raw = [record["password"] for _, _, _, record in candidates if not record.get("password_hash")]
+	hashed = iter(hash_passwords(raw))
+
+	users = [
+		User(username=username, email=email, password=record.get("password_hash") or next(hashed))
+		for _, username, email, record in candidates
+	]
+
+	try:
+		with transaction.atomic():
+			users = User.objects.bulk_create(users)
+
+			if users and users[0].pk is None: # backends that can't return ids from a bulk insert
+				ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'id'))
+				for user in users:
+					user.pk = ids[user.username]
+
+			UserProfile.objects.create_for_users(users)
+
+	except IntegrityError: # a concurrent sign up took one of the names, nothing in the batch was created
+		for index, username, _, _ in candidates:
+			results[index] = {"username": username, "status": "error", "errors": {"unavailable": "Username or email was taken during import, please retry"}}
+		return results
+
+	for (index, username, email, _), user in zip(candidates, users):
+		taken_cache.add('username', username)
+		taken_cache.add('email', email)
+		results[index] = {"username": username, "status": "created", "id": user.pk}
+
+	return results
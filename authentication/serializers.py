@@ -1,8 +1,14 @@
-import re 
 from rest_framework import serializers 
+from rest_framework_simplejwt import serializers as jwt_serializers
 from django.contrib.auth import get_user_model 
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
 
 from .models import UserProfile
+from .tokens import RefreshToken
+from .images import thumbnail_name, thumbnail_names
+from . import validators
+from .availability import find_conflicts, conflict_errors, taken_cache
 
 User = get_user_model()
 
@@ -22,61 +28,20 @@ class SignUpSerializer(serializers.ModelSerializer):
 		fields = ('username', 'email', 'password', 'password_again')
 
 
-	def validate_username(self, value): 
+	def validate_username(self, value):
 		"""
-		Validate username 
+		Validate username
 
 		"""
-
-		errors = {}
-
-		if value is None or not value.strip(): # make certain username is not none or filled with white space
-			errors["username_value"] = "Username can't be empty or filled with whitespaces only"
-
-		if len(value) < 4 or len(value) > 20:
-			errors["username_length"] = "Username length can only be between 4 to 20 characters"
-
-		check_username = User.objects.filter(username__iexact=value) # filter database to check if th username already exists
-
-		if check_username.exists(): # check if username already exists
-			errors["username_unavailable"] = f"Username {value} is not available"
-
-		pattern = r'[!@#$%^&*()+\-={}\[\]:;"\'<>,.?/\\|`~]' # pattern containing unallowed chracters 
-
-		if re.search(pattern, value): # check if the username contains any of this character
-			errors["username_character"] = "Username should not contain any special character except underscore '_'"
-
-		value = value.replace(" ", "_") # replace whitespace between username with underscore 
-
-		if errors:
-			raise serializers.ValidationError(errors)
-
-		return value 
+		return validators.validate_username(value)
 
 
 	def validate_email(self, value):
 		"""
-		Validate email 
+		Validate email
 
 		"""
-
-		errors = {}
-
-		if value is None or not value.strip(): # make certain email is not none or filled with whitespace
-			errors["email_value"] = "Email can't be empty or filled with whitespaces only"
-
-		if len(value) < 6 or len(value) > 40:
-			errors["email_length"] = "Email must be between 6 to 40 characters"
-
-		check_email = User.objects.filter(email__iexact=value) # filter database if email already exists
-
-		if check_email.exists(): # check if email already exists
-			errors["email_unavailable"] = f"Email {value} is not available"
-
-		if errors:
-			raise serializers.ValidationError(errors)
-
-		return value 
+		return validators.validate_email(value)
 
 
 	def validate(self, data):
@@ -84,34 +49,12 @@ class SignUpSerializer(serializers.ModelSerializer):
 		Validate passwords for additional security 
 
 		"""
-		errors = {}
-		password = data.get("password")
-		password_again = data.get("password_again")
+		validators.validate_password(data.get("password"), data.get("password_again")) # syntax first, the availability query only sees valid input
 
-		if not password:
-			errors["password_value"] = "Password field can't be empty"
-
-		if len(password) < 8:
-			errors["password_length"] = "Password must be at least 8 characters"
-
-		if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
-			errors["password_character"] = "Password must contain at least one special character"
-
-		if not any(v.isupper() for v in password):
-			errors["password_uppercase"] = "Password must contain at least one uppercase character"
-
-		if not any(v.islower() for v in password):
-			errors["password_lowercase"] = "Password must contain at least one lowercase character"
-
-		if not any(v.isdigit() for v in password):
-			errors["password_digit"] = "Password must contain at least one digit"
-
-		if password != password_again:
-			errors["password_match"] = "Both passwords must match"
-
-		if errors:
-			password_error = {"password": [errors]}
-			raise serializers.ValidationError(password_error)
+		# check username and email availability together in one query
+		conflicts = find_conflicts(data.get("username"), data.get("email"))
+		if conflicts:
+			raise serializers.ValidationError(conflict_errors(conflicts, data.get("username"), data.get("email")))
 
 		return data
 
@@ -125,9 +68,18 @@ class SignUpSerializer(serializers.ModelSerializer):
 		email = validated_data["email"]
 		password = validated_data["password"]
 
-		user = User.objects.create(username=username, email=email)
+		user = User(username=username, email=email)
 		user.set_password(password)
-		user.save()
+
+		try:
+			User.objects.save_new_user(user) # user and profile in one transaction, the database unique indexes settle sign up races
+
+		except IntegrityError:
+			conflicts = find_conflicts(username, email) or {'username', 'email'}
+			raise serializers.ValidationError(conflict_errors(conflicts, username, email))
+
+		taken_cache.add('username', username)
+		taken_cache.add('email', email)
 
 		return user
 
@@ -138,6 +90,24 @@ class SignInSerializer(serializers.Serializer): # login serializer
 	password = serializers.CharField(required=True)
 
 
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer): # token refresh using the project token classes
+	token_class = RefreshToken
+
+	def validate(self, attrs):
+		refresh = self.token_class(attrs["refresh"])
+		refresh.update_user_claims() # staff flags as they are now, inactive users get no new tokens
+
+		data = {"access": str(refresh.access_token)}
+
+		refresh.blacklist() # ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION are on
+		refresh.set_jti()
+		refresh.set_exp()
+		refresh.set_iat()
+		data["refresh"] = str(refresh)
+
+		return data
+
+
 class ProfileSerializer(serializers.ModelSerializer):
 	"""
 	user profile serializer
@@ -146,10 +116,69 @@ class ProfileSerializer(serializers.ModelSerializer):
 			Post - update user profile (profile picture and display name only) 
 	"""
 	user = serializers.CharField(required=False) # return user as a char and not an object
+	profile_thumbnail = serializers.SerializerMethodField() # largest resized copy of the profile picture
+	profile_thumbnails = serializers.SerializerMethodField() # every resized copy, by size in pixels
 
 	class Meta:
 		model = UserProfile
-		fields = ('id', 'profile_picture', 'display_name', 'user')
+		fields = ('id', 'profile_picture', 'profile_thumbnail', 'profile_thumbnails', 'display_name', 'user')
+
+	def media_url(self, name):
+		"""
+		Return a media url the same way the profile picture url is returned
+
+		"""
+		if not name:
+			return None
+
+		url = default_storage.url(name)
+		request = self.context.get('request')
+		return request.build_absolute_uri(url) if request else url
+
+	def get_profile_thumbnail(self, obj):
+		return self.media_url(obj.profile_thumbnail)
+
+	def get_profile_thumbnails(self, obj):
+		return {str(size): self.media_url(name) for size, name in thumbnail_names(obj.profile_picture.name).items()}
+
+
+class ProfileReadSerializer:
+	"""
+	read only profile serializer for lists
+
+	Builds the same fields as ProfileSerializer from plain .values() rows,
+	skipping the rest framework field machinery for every row
+	"""
+	values = ('id', 'profile_picture', 'display_name', 'user__username', 'time') # time is the pagination key
+
+	def __init__(self, instance=None, many=False, context=None):
+		self.instance = instance
+		self.many = many
+		self.request = (context or {}).get('request')
+
+	def media_url(self, name):
+		if not name:
+			return None
+
+		url = default_storage.url(name)
+		return self.request.build_absolute_uri(url) if self.request else url
+
+	def to_representation(self, row):
+		return {
+			"id": row["id"],
+			"profile_picture": self.media_url(row["profile_picture"]),
+			"profile_thumbnail": self.media_url(thumbnail_name(row["profile_picture"])),
+			"profile_thumbnails": {str(size): self.media_url(name) for size, name in thumbnail_names(row["profile_picture"]).items()},
+			"display_name": row["display_name"],
+			"user": row["user__username"],
+		}
+
+	@property
+	def data(self):
+		if self.many:
+			return [self.to_representation(row) for row in self.instance]
+
+		return self.to_representation(self.instance)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -168,62 +197,55 @@ class UserSerializer(serializers.ModelSerializer):
 		fields = ('id', 'username', 'email')
 
 	
-	def validate_username(self, value): 
+	def validate_username(self, value):
 		"""
-		Validate username 
+		Validate username
 
 		"""
+		return validators.validate_username(value)
 
-		errors = {}
-
-		if value is None or not value.strip(): # make certain username is not none or filled with white space
-			errors["username_value"] = "Username can't be empty or filled with whitespaces only"
-
-		if len(value) < 4 or len(value) > 20:
-			errors["username_length"] = "Username length can only be between 4 to 20 characters"
 
-		user = self.context["request"].user
-		current_username = user.username # get the current username of the user 
-		check_username = User.objects.filter(username__iexact=value) # filter database to check if th username already exists
+	def validate_email(self, value):
+		"""
+		Validate email
 
-		if check_username.exists() and value != current_username: # check if the new username is not the current username and also if the new username already exists
-			errors["username_unavailable"] = f"Username {value} is not available"
+		"""
+		return validators.validate_email(value)
 
-		pattern = r'[!@#$%^&*()+\-={}\[\]:;"\'<>,.?/\\|`~]' # pattern containing unallowed chracters 
 
-		if re.search(pattern, value): # check if the username contains any of this character
-			errors["username_character"] = "Username should not contain any special character except underscore '_'"
+	def validate(self, data):
+		"""
+		Check username and email availability in one query, ignoring the user being updated
 
-		value = value.replace(" ", "_") # replace whitespace between username with underscore 
+		"""
+		exclude_pk = self.instance.pk if self.instance is not None else None
+		conflicts = find_conflicts(data.get("username"), data.get("email"), exclude_pk=exclude_pk)
 
-		if errors:
-			raise serializers.ValidationError(errors)
+		if conflicts:
+			raise serializers.ValidationError(conflict_errors(conflicts, data.get("username"), data.get("email")))
 
-		return value 
+		return data
 
 
-	def validate_email(self, value):
+	def update(self, instance, validated_data):
 		"""
-		Validate email 
+		Update user, mapping unique index violations from concurrent updates to validation errors
 
 		"""
+		previous = {'username': instance.username, 'email': instance.email}
 
-		errors = {}
+		try:
+			with transaction.atomic():
+				user = super().update(instance, validated_data)
 
-		if value is None or not value.strip(): # make certain email is not none or filled with whitespace
-			errors["email_value"] = "Email can't be empty or filled with whitespaces only"
+		except IntegrityError:
+			username, email = validated_data.get("username"), validated_data.get("email")
+			conflicts = find_conflicts(username, email, exclude_pk=instance.pk) or {'username', 'email'}
+			raise serializers.ValidationError(conflict_errors(conflicts, username, email))
 
-		if len(value) < 6 or len(value) > 40:
-			errors["email_length"] = "Email must be between 6 to 40 characters"
+		for field, value in previous.items():
+			if value.lower() != getattr(user, field).lower(): # a renamed user frees the old name for sign up right away
+				taken_cache.discard(field, value)
+				taken_cache.add(field, getattr(user, field))
 
-		user = self.context["request"].user # get current user object 
-		current_email = user.email # get the current email of the user 
-		check_email = User.objects.filter(email__iexact=value) # filter database if email already exists
-
-		if check_email.exists() and value != current_email: # check if email already exists and if email isn't the current email
-			errors["email_unavailable"] = f"Email {value} is not available"
-
-		if errors:
-			raise serializers.ValidationError(errors)
-
-		return value 
+		return user
@@ -1,10 +1,60 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
 from .models import UserProfile
+from .authentication import user_cache
+from .availability import taken_cache
+from . import detail_cache, images
+
 
 @receiver(post_save, sender=get_user_model())
-def create_user_profile(sender, instance, created, **kwargs):
+def create_user_profile(sender, instance, created, raw=False, using=None, **kwargs):
+    # profiles are inserted with their user by CustomUserManager.save_new_user, this covers
+    # users saved any other way, like the admin add form or User.objects.create()
+    if created and not raw and 'user_profile' not in instance._state.fields_cache:
+        UserProfile.objects.create_for_users([instance], using=using)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, created=False, **kwargs):
+    if created: # nothing is cached for a new user yet
+        return
+
+    user_cache.invalidate(instance.pk) # drop cached token user, covers is_active changes
+
+
+@receiver(post_delete, sender=get_user_model())
+def release_taken_names(sender, instance, **kwargs):
+    taken_cache.discard('username', instance.username) # deleted names can be signed up again right away
+    taken_cache.discard('email', instance.email)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user_details(sender, instance, created=False, update_fields=None, **kwargs):
     if created:
-        UserProfile.objects.create(user=instance)
\ No newline at end of file
+        return
+
+    detail_cache.invalidate('user', instance.pk) # next GET reads the new updated_at
+
+    if kwargs['signal'] is post_delete or update_fields is not None and 'username' not in update_fields:
+        return
+
+    profile = instance._state.fields_cache.get('user_profile') # the username is part of the profile representation
+    if profile is not None:
+        detail_cache.invalidate('profile', profile.pk)
+    else:
+        detail_cache.invalidate_many('profile', UserProfile.objects.filter(user_id=instance.pk).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_details(sender, instance, **kwargs):
+    detail_cache.invalidate('profile', instance.pk)
+
+
+@receiver(post_delete, sender=UserProfile)
+def release_profile_picture(sender, instance, **kwargs):
+    images.release(instance.profile_picture.name) # the file goes once cleanup_pictures finds it unreferenced
@@ -0,0 +1,58 @@
+import os
+import hashlib
+
+from django.core.files.storage import FileSystemStorage
+
+
+"""
+This file contains the content addressed storage of profile pictures.
+An uploaded picture is stored under the sha256 of its bytes, so users
+uploading the same image share one file, and a stored file never changes
+once written. Sharing is reference counted by StoredPicture, see
+images.retain and images.release.
+
+"""
+
+
+def content_digest(content):
+	"""
+	Return the sha256 hex digest of an uploaded file
+
+	"""
+	digest = hashlib.sha256()
+	for chunk in content.chunks(): # chunks() starts from the beginning of the file
+		digest.update(chunk)
+
+	content.seek(0)
+	return digest.hexdigest()
+
+
+def addressed_name(directory, digest, extension):
+	return os.path.join(directory, digest[:2], digest + extension.lower()) # two level fan out keeps directories small
+
+
+class ContentAddressedStorage(FileSystemStorage):
+	"""
+	File system storage that names files after their content
+
+	"""
+
+	def save(self, name, content, max_length=None):
+		directory, filename = os.path.split(name)
+		name = addressed_name(directory, content_digest(content), os.path.splitext(filename)[1])
+
+		if self.exists(name): # same bytes already stored, nothing to write
+			return name
+
+		return super().save(name, content, max_length=max_length)
+
+	def restore(self, name, content):
+		"""
+		Write content back under its addressed name, for a file cleanup_pictures
+		deleted after save() reused it
+
+		"""
+		return super().save(name, content)
+
+
+picture_storage = ContentAddressedStorage()
@@ -1,14 +1,61 @@
+import io
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from PIL import Image
+from asgiref.sync import sync_to_async
 from django.urls import reverse 
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError
+from django.db.utils import ConnectionHandler
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import UserProfile
+from .models import StoredPicture, UserProfile
+from .authentication import CachedJWTAuthentication, user_cache
+from .availability import find_conflicts, taken_cache
+from .blacklist import blacklist_index
+from .hashing import HashPoolSaturated
+from .tokens import RefreshToken as ProjectRefreshToken
+from . import detail_cache, hashing, images, lockout, metrics, throttling, validators
+from django_auth.database import database_settings, replica_settings
+from django_auth.passwords import password_hashers
+from django_auth.routers import ReplicaRouter, read_from_replica, replica_configured
 
 User = get_user_model()
 
 
+def clear_caches():
+	"""
+	clear the django cache and the in process caches, test database rollbacks don't reach them
+
+	"""
+	cache.clear()
+	user_cache.clear()
+	taken_cache.clear()
+	blacklist_index.clear()
+	throttling.local_store.clear()
+
+
 class AuthenticationTests(APITestCase):
 	"""
 	Authentication TestCase
@@ -20,6 +67,7 @@ class AuthenticationTests(APITestCase):
 		test case set up, this runs before each test
 
 		"""
+		clear_caches() # login attempt counters and taken usernames live outside the database
 
 		self.signup_url = reverse('signup')
 		self.signin_url = reverse('signin')
@@ -80,6 +128,45 @@ class AuthenticationTests(APITestCase):
 		self.assertIn('access', response.data) # confirm access token is included in response data
 
 
+	def test_signin_case_insensitive(self):
+		"""
+		test user signin with differently cased username and email
+
+		"""
+		self.client.post(self.signup_url, self.user_signup_data, format='json') # firstly, register the user
+		for login_id in ("TestUser", "TESTUSER@Email.com"):
+			response = self.client.post(self.signin_url, {"login_id":login_id, "password":"testUSER23##"}, format='json')
+			self.assertIn('access', response.data)
+
+
+	def test_signin_non_ascii_and_at_sign_usernames(self):
+		"""
+		test users with non ascii usernames, and usernames containing '@' made outside sign up, can sign in
+
+		"""
+		User.objects.create_user(username="Émile_x", email="emile@email.com", password="testUSER23##")
+		User.objects.create_superuser(username="admin@site", email="admin@email.com", password="testUSER23##")
+
+		for login_id in ("Émile_x", "EMILE@email.com", "admin@site", "ADMIN@site"):
+			response = self.client.post(self.signin_url, {"login_id":login_id, "password":"testUSER23##"}, format='json')
+			self.assertIn('access', response.data, login_id)
+
+		response = self.client.post(reverse('async_signin'), {"login_id":"admin@site", "password":"testUSER23##"}, format='json')
+		self.assertIn('access', response.json())
+
+
+	def test_token_refresh(self):
+		"""
+		test refresh token rotation keeps the user claims
+
+		"""
+		self.client.post(self.signup_url, self.user_signup_data, format='json') # firstly, register the user
+		user_signin = self.client.post(self.signin_url, self.user_signin_data_1, format='json') # secondly, signin the user
+		response = self.client.post(self.token_refresh_url, {"refresh":user_signin.data['refresh']}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(ProjectRefreshToken(response.data['refresh'])['username'], 'testuser')
+
+
 	def test_signout(self):
 		"""
 		test user signout
@@ -237,10 +324,1688 @@ class ProfileViewTest(APITestCase):
 		self.assertIn('success', response.data)
 
 
+MEDIA_TEST_ROOT = tempfile.mkdtemp() # keep uploaded test pictures out of the project media folder
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TEST_ROOT, PROFILE_IMAGE_WORKERS=0)
+class ProfilePictureTest(APITestCase):
+	"""
+	test profile picture thumbnail pipeline
+
+	"""
+
+	@classmethod
+	def tearDownClass(cls):
+		super().tearDownClass()
+		shutil.rmtree(MEDIA_TEST_ROOT, ignore_errors=True)
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		self.user_profile = self.new_user.user_profile
+
+		refresh = RefreshToken.for_user(self.new_user)
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(refresh.access_token))
+		self.profile_url = reverse("profile_details", kwargs={'pk':self.user_profile.pk})
+
+	def test_upload_creates_thumbnail(self):
+		"""
+		test uploaded picture gets a separate resized thumbnail
+
+		"""
+		buffer = io.BytesIO()
+		Image.new('RGB', (800, 600), 'blue').save(buffer, format='JPEG')
+		picture = SimpleUploadedFile('avatar.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+		with self.captureOnCommitCallbacks(execute=True):
+			response = self.client.patch(self.profile_url, {"profile_picture": picture}, format='multipart')
+
+		self.assertEqual(response.data['status'], status.HTTP_201_CREATED)
+		self.user_profile.refresh_from_db()
+		thumbnail_path = os.path.join(MEDIA_TEST_ROOT, self.user_profile.profile_thumbnail)
+
+		with Image.open(thumbnail_path) as thumbnail:
+			self.assertLessEqual(max(thumbnail.size), 200)
+
+		with Image.open(self.user_profile.profile_picture.path) as original:
+			self.assertEqual(original.size, (800, 600)) # original upload is left untouched
+
+	def upload_picture(self, user, color='blue'):
+		"""
+		upload an 800x600 picture as the profile picture of user
+
+		"""
+		buffer = io.BytesIO()
+		Image.new('RGB', (800, 600), color).save(buffer, format='JPEG')
+		picture = SimpleUploadedFile('avatar.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(user).access_token))
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.patch(reverse("profile_details", kwargs={'pk':user.user_profile.pk}), {"profile_picture": picture}, format='multipart')
+
+		return UserProfile.objects.get(user=user)
+
+	def test_same_picture_stored_once(self):
+		"""
+		test identical uploads share one content addressed file and one set of thumbnails
+
+		"""
+		other_user = User.objects.create_user(username="otheruser", email="otheruser@email.com", password="otherUSER12##")
+
+		with mock.patch('authentication.images.make_thumbnails', wraps=images.make_thumbnails) as make_thumbnails:
+			first = self.upload_picture(self.new_user)
+			second = self.upload_picture(other_user)
+
+		make_thumbnails.assert_called_once()
+		self.assertEqual(first.profile_picture.name, second.profile_picture.name)
+		self.assertRegex(first.profile_picture.name, r'^profile_picture/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+		self.assertEqual(StoredPicture.objects.get(name=first.profile_picture.name).references, 2)
+
+		for size, name in images.thumbnail_names(first.profile_picture.name).items():
+			with Image.open(os.path.join(MEDIA_TEST_ROOT, name)) as thumbnail:
+				self.assertLessEqual(max(thumbnail.size), size)
+
+		response = self.client.get(reverse("profile_details", kwargs={'pk':second.pk}))
+		self.assertEqual(set(response.data['data']['profile_thumbnails']), {'48', '96', '200'})
+
+	def test_cleanup_deletes_unreferenced_pictures(self):
+		"""
+		test a picture is deleted with its thumbnails once no profile uses it
+
+		"""
+		profile = self.upload_picture(self.new_user, color='red')
+		name = profile.profile_picture.name
+		paths = [os.path.join(MEDIA_TEST_ROOT, name) for name in [name, *images.thumbnail_names(name).values()]]
+
+		call_command('cleanup_pictures', grace=0, stdout=io.StringIO())
+		self.assertTrue(all(os.path.exists(path) for path in paths)) # still referenced
+
+		self.upload_picture(self.new_user, color='green') # replaces the red picture
+		self.assertEqual(StoredPicture.objects.get(name=name).references, 0)
+
+		call_command('cleanup_pictures', grace=3600, stdout=io.StringIO())
+		self.assertTrue(os.path.exists(paths[0])) # inside the grace period
+
+		call_command('cleanup_pictures', grace=0, stdout=io.StringIO())
+		self.assertFalse(any(os.path.exists(path) for path in paths))
+		self.assertFalse(StoredPicture.objects.filter(name=name).exists())
+
+	def test_reused_picture_deleted_by_cleanup_is_restored(self):
+		"""
+		test an upload reusing a stored file writes it back when cleanup deletes it before the reference is taken
+
+		"""
+		name = self.upload_picture(self.new_user, color='purple').profile_picture.name
+		self.upload_picture(self.new_user, color='orange') # the purple picture is now unreferenced
+		other_user = User.objects.create_user(username="otheruser", email="otheruser@email.com", password="otherUSER12##")
+		retain = images.retain
+
+		def cleanup_then_retain(picture_name, content=None):
+			call_command('cleanup_pictures', grace=0, stdout=io.StringIO()) # runs between storage.save and retain
+			retain(picture_name, content)
+
+		with mock.patch('authentication.images.retain', side_effect=cleanup_then_retain):
+			profile = self.upload_picture(other_user, color='purple')
+
+		self.assertEqual(profile.profile_picture.name, name)
+		self.assertEqual(StoredPicture.objects.get(name=name).references, 1)
+		with Image.open(os.path.join(MEDIA_TEST_ROOT, name)) as picture:
+			self.assertEqual(picture.size, (800, 600))
+		self.assertTrue(os.path.exists(os.path.join(MEDIA_TEST_ROOT, images.thumbnail_name(name))))
+
+	def test_full_pool_skips_thumbnails(self):
+		"""
+		test a full thumbnail pool skips the picture instead of blocking, and recount generates it later
+
+		"""
+		name = self.upload_picture(self.new_user, color='white').profile_picture.name
+		paths = [os.path.join(MEDIA_TEST_ROOT, thumbnail) for thumbnail in images.thumbnail_names(name).values()]
+		for path in paths:
+			os.remove(path)
+
+		executor = mock.Mock()
+		with override_settings(PROFILE_IMAGE_WORKERS=1), \
+				mock.patch('authentication.images.get_executor', return_value=(executor, threading.BoundedSemaphore(1))) as get_executor, \
+				self.assertLogs('authentication.images', 'WARNING'):
+			get_executor.return_value[1].acquire() # the only slot is taken
+			images.process_picture(name)
+
+		executor.submit.assert_not_called()
+		self.assertFalse(any(os.path.exists(path) for path in paths))
+
+		call_command('cleanup_pictures', recount=True, grace=3600, stdout=io.StringIO())
+		self.assertTrue(all(os.path.exists(path) for path in paths))
+
+	def test_deleting_user_releases_picture(self):
+		"""
+		test deleting a user drops the reference of their profile picture
+
+		"""
+		name = self.upload_picture(self.new_user, color='yellow').profile_picture.name
+
+		self.new_user.delete()
+
+		self.assertEqual(StoredPicture.objects.get(name=name).references, 0)
+
+	def test_login_trials_skip_image_processing(self):
+		"""
+		test saving login trials doesn't touch the picture
+
+		"""
+		with mock.patch('authentication.images.process_picture') as process_picture:
+			with self.captureOnCommitCallbacks(execute=True):
+				self.user_profile.increment_login_trials()
+				self.user_profile.reset_login_trials()
+
+		process_picture.assert_not_called()
+
+
+class LoginLockoutTest(APITestCase):
+	"""
+	test cache backed login attempt lockout
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		cache.clear()
+		self.signin_url = reverse('signin')
+		self.new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		self.wrong_signin_data = {
+			"login_id":"newuser",
+			"password":"wrongPASS12##"
+		}
+
+	def test_lockout_after_max_trials(self):
+		"""
+		test user is locked out after too many failed attempts without profile writes
+
+		"""
+		for _ in range(5):
+			response = self.client.post(self.signin_url, self.wrong_signin_data, format='json')
+			self.assertEqual(response.data['error'], "Invalid username or password")
+
+		response = self.client.post(self.signin_url, self.wrong_signin_data, format='json')
+		self.assertIn("too many times", response.data['error'])
+		self.assertEqual(lockout.failed_attempts(self.new_user.pk), 5)
+		self.assertEqual(UserProfile.objects.get(user=self.new_user).login_trials, 0) # counter lives in the cache only
+
+	def test_successful_signin_resets_trials(self):
+		"""
+		test successful signin clears the failed attempts counter
+
+		"""
+		self.client.post(self.signin_url, self.wrong_signin_data, format='json')
+		self.client.post(self.signin_url, {"login_id":"newuser", "password":"newUSER12##"}, format='json')
+		self.assertEqual(lockout.failed_attempts(self.new_user.pk), 0)
+
+	@override_settings(LOGIN_ATTEMPTS_FLUSH_INTERVAL=1)
+	def test_flush_to_profile(self):
+		"""
+		test pending counters are written back to the profile for auditing
+
+		"""
+		lockout.register_failure(self.new_user.pk)
+		lockout.flush()
+		profile = UserProfile.objects.get(user=self.new_user)
+		self.assertEqual(profile.login_trials, 1)
+		self.assertIsNotNone(profile.last_failed_login)
+
+
+class SignInQueryCountTest(APITestCase):
+	"""
+	pin the number of queries per sign in path
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		cache.clear()
+		self.signin_url = reverse('signin')
+		self.new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+
+	def test_successful_signin_queries(self):
+		"""
+		user and profile fetch plus the outstanding token insert
+
+		"""
+		with self.assertNumQueries(2):
+			response = self.client.post(self.signin_url, {"login_id":"newuser", "password":"newUSER12##"}, format='json')
+		self.assertIn('access', response.data)
+
+	def test_failed_signin_queries(self):
+		"""
+		a wrong password reuses the backend lookup
+
+		"""
+		with self.assertNumQueries(1):
+			response = self.client.post(self.signin_url, {"login_id":"newuser", "password":"wrongPASS12##"}, format='json')
+		self.assertEqual(response.data['error'], "Invalid username or password")
+
+	def test_unknown_user_signin_queries(self):
+		"""
+		an unknown login id costs one lookup
+
+		"""
+		with self.assertNumQueries(1):
+			response = self.client.post(self.signin_url, {"login_id":"nobody", "password":"wrongPASS12##"}, format='json')
+		self.assertEqual(response.data['error'], "Invalid username or password")
+
+
+class AsyncAuthenticationTests(APITestCase):
+	"""
+	test async sign up and sign in views
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		clear_caches()
+		self.signup_url = reverse('async_signup')
+		self.signin_url = reverse('async_signin')
+		self.user_signup_data = {
+			"username":"testuser",
+			"email":"testuser@email.com",
+			"password":"testUSER23##",
+			"password_again":"testUSER23##"
+		}
+
+	def test_async_signup_and_signin(self):
+		"""
+		test user can sign up and sign in through the async views
+
+		"""
+		response = self.client.post(self.signup_url, self.user_signup_data, format='json')
+		self.assertEqual(response.json()['status'], status.HTTP_201_CREATED)
+		self.assertTrue(User.objects.get(username="testuser").check_password("testUSER23##"))
+
+		response = self.client.post(self.signin_url, {"login_id":"testuser", "password":"testUSER23##"}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertIn('access', response.json())
+
+	def test_saturated_hash_pool(self):
+		"""
+		test sign in returns a 503 when the hash pool is full
+
+		"""
+		User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+
+		with mock.patch('authentication.hashing.submit', side_effect=HashPoolSaturated):
+			response = self.client.post(self.signin_url, {"login_id":"newuser", "password":"newUSER12##"}, format='json')
+
+		self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+		self.assertIn('Retry-After', response)
+
+	def test_async_refresh_and_signout(self):
+		"""
+		test refresh rotates and blacklists the token and sign out blacklists it
+
+		"""
+		new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		refresh = str(ProjectRefreshToken.for_user(new_user))
+
+		response = self.client.post(reverse('async_token_refresh'), {"refresh": refresh}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		rotated = response.json()['refresh']
+
+		response = self.client.post(reverse('async_token_refresh'), {"refresh": refresh}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+		response = self.client.post(reverse('async_signout'), {"refresh": rotated}, format='json')
+		self.assertEqual(response.json()['status'], status.HTTP_200_OK)
+		self.assertEqual(BlacklistedToken.objects.count(), 2)
+
+	def test_async_profile_and_user_views(self):
+		"""
+		test the async list and detail views read and update like the sync ones
+
+		"""
+		new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		profile = UserProfile.objects.get(user=new_user)
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(ProjectRefreshToken.for_user(new_user).access_token))
+
+		response = self.client.get(reverse('async_profiles'))
+		self.assertEqual([row['user'] for row in response.json()['data']], ["newuser"])
+
+		details_url = reverse('async_profile_details', kwargs={'pk': profile.pk})
+		response = self.client.patch(details_url, {"display_name": "async name"}, format='json')
+		self.assertEqual(response.json()['status'], status.HTTP_201_CREATED)
+		response = self.client.get(details_url)
+		self.assertEqual(response.json()['data']['display_name'], "async name")
+		self.assertEqual(self.client.get(details_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, status.HTTP_304_NOT_MODIFIED)
+
+		response = self.client.get(reverse('async_users'))
+		self.assertEqual(response.json()['data'], [{"id": new_user.pk, "username": "newuser", "email": "newuser@email.com"}])
+
+		response = self.client.patch(reverse('async_user_details', kwargs={'pk': new_user.pk}), {"email": "bad"}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(self.client.get(reverse('async_user_details', kwargs={'pk': 99999})).status_code, status.HTTP_404_NOT_FOUND)
+
+	def test_async_update_form_bodies(self):
+		"""
+		test the async detail views read multipart and form encoded PATCH bodies and reject other media types
+
+		"""
+		new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		details_url = reverse('async_profile_details', kwargs={'pk': new_user.user_profile.pk})
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(ProjectRefreshToken.for_user(new_user).access_token))
+
+		response = self.client.patch(details_url, {"display_name": "multipart name"}, format='multipart')
+		self.assertEqual(response.json()['status'], status.HTTP_201_CREATED)
+		self.assertEqual(UserProfile.objects.get(user=new_user).display_name, "multipart name")
+
+		response = self.client.patch(details_url, "display_name=form+name", content_type='application/x-www-form-urlencoded')
+		self.assertEqual(response.json()['status'], status.HTTP_201_CREATED)
+		self.assertEqual(UserProfile.objects.get(user=new_user).display_name, "form name")
+
+		response = self.client.patch(details_url, "display_name: text", content_type='text/plain')
+		self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+	async def test_async_stream_users(self):
+		"""
+		test ?stream=1 on the async views streams from an async iterator
+
+		"""
+		new_user = await sync_to_async(User.objects.create_user)(username="newuser", email="newuser@email.com", password="newUSER12##")
+		refresh = await sync_to_async(ProjectRefreshToken.for_user)(new_user)
+		access = str(refresh.access_token)
+
+		response = await self.async_client.get(reverse('async_users'), {"stream": 1}, headers={"Authorization": 'Bearer ' + access})
+		self.assertTrue(response.is_async)
+		rows = [json.loads(line) async for line in response.streaming_content]
+		self.assertEqual(rows, [{"id": new_user.pk, "username": "newuser", "email": "newuser@email.com"}])
+
+	def test_async_views_require_token(self):
+		"""
+		test the async user views reject requests without a valid token
+
+		"""
+		self.assertEqual(self.client.get(reverse('async_users')).status_code, status.HTTP_401_UNAUTHORIZED)
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+		self.assertEqual(self.client.get(reverse('async_users')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CachedJWTAuthenticationTest(APITestCase):
+	"""
+	test token users are served from the user cache
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		cache.clear()
+		user_cache.clear()
+		self.new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		self.authentication = CachedJWTAuthentication()
+		self.token = self.authentication.get_validated_token(str(RefreshToken.for_user(self.new_user).access_token))
+
+	def test_cached_user_skips_database(self):
+		"""
+		test second lookup of the same token user doesn't query the database
+
+		"""
+		with self.assertNumQueries(1):
+			self.authentication.get_user(self.token)
+
+		with self.assertNumQueries(0):
+			user = self.authentication.get_user(self.token)
+
+		self.assertEqual(user.pk, self.new_user.pk)
+
+	def test_cached_user_has_no_password_hash(self):
+		"""
+		test the password hash isn't cached and a cached user still saves without losing it
+
+		"""
+		self.authentication.get_user(self.token)
+
+		cached = caches[settings.AUTH_USER_CACHE].get(user_cache.key(self.new_user.pk))
+		self.assertNotIn('password', cached.__dict__)
+		self.assertNotIn(self.new_user.password, pickle.dumps(cached).decode('latin-1'))
+
+		user = self.authentication.get_user(self.token)
+		user.first_name = "cached"
+		user.save()
+		self.assertTrue(User.objects.get(pk=self.new_user.pk).check_password("newUSER12##"))
+		self.assertTrue(user.check_password("newUSER12##")) # the hash is loaded on first use
+
+	def test_cache_miss_reads_primary(self):
+		"""
+		test a token user missing from the cache is read from the primary inside replica reads
+
+		"""
+		with mock.patch('django_auth.routers.replica_configured', return_value=True), read_from_replica():
+			self.assertEqual(ReplicaRouter().db_for_read(User), 'replica')
+			user = self.authentication.get_user(self.token) # there is no replica connection here, a replica read would raise
+
+		self.assertEqual(user.pk, self.new_user.pk)
+
+	def test_invalidation_during_load_is_not_cached(self):
+		"""
+		test a user read before a concurrent invalidation isn't stored in either cache level
+
+		"""
+		load = JWTAuthentication.get_user
+
+		def load_then_write(authentication, token):
+			user = load(authentication, token)
+			User.objects.filter(pk=user.pk).update(is_active=False) # a deactivation lands after the read
+			user_cache.invalidate(user.pk)
+			return user
+
+		with mock.patch.object(JWTAuthentication, 'get_user', autospec=True, side_effect=load_then_write):
+			self.authentication.get_user(self.token)
+
+		self.assertIsNone(user_cache.get(self.new_user.pk))
+		with self.assertRaises(AuthenticationFailed):
+			self.authentication.get_user(self.token)
 
+		generation = user_cache.generation(self.new_user.pk)
+		user_cache.invalidate(self.new_user.pk)
+		user_cache.set(self.new_user, generation)
+		self.assertIsNone(user_cache.get(self.new_user.pk))
 
+	def test_deactivated_user_is_invalidated(self):
+		"""
+		test saving the user drops the cached entry
+
+		"""
+		self.authentication.get_user(self.token)
+		self.new_user.is_active = False
+		self.new_user.save()
+
+		with self.assertRaises(AuthenticationFailed):
+			self.authentication.get_user(self.token)
 
 
+class StatelessReadTest(APITestCase):
+	"""
+	test token claims and stateless read authentication
+
+	"""
 
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		user_cache.clear()
+		self.new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		self.refresh = ProjectRefreshToken.for_user(self.new_user)
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(self.refresh.access_token))
+		self.profiles_url = reverse('profiles')
+
+	def test_token_carries_user_claims(self):
+		"""
+		test issued tokens include username and staff claims
+
+		"""
+		access = self.refresh.access_token
+		self.assertEqual(access['username'], "newuser")
+		self.assertFalse(access['is_staff'])
+
+	@override_settings(JWT_STATELESS_READS=True)
+	def test_stateless_read_skips_user_lookup(self):
+		"""
+		test GET on a read only view only queries the profile table
+
+		"""
+		with self.assertNumQueries(1):
+			response = self.client.get(self.profiles_url)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(len(response.data['data']), 1)
+
+	@override_settings(JWT_STATELESS_READS=True)
+	def test_refresh_reissues_claims(self):
+		"""
+		test a demoted user loses stateless staff reads on refresh, and a deactivated user can't refresh
+
+		"""
+		User.objects.create_user(username="otheruser", email="otheruser@email.com", password="otherUSER12##")
+		self.new_user.is_staff = True
+		self.new_user.save()
+		refresh = str(ProjectRefreshToken.for_user(self.new_user))
+
+		self.new_user.is_staff = False
+		self.new_user.save()
+
+		for url in (reverse('token_refresh'), reverse('async_token_refresh')):
+			response = self.client.post(url, {"refresh": refresh}, format='json')
+			refresh = response.json()['refresh']
+			access = response.json()['access']
+			self.assertFalse(ProjectRefreshToken(refresh)['is_staff'])
+
+			self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+			response = self.client.get(reverse('users'))
+			self.assertEqual([row['username'] for row in response.data['data']], ["newuser"]) # no longer sees every user
+
+		self.new_user.is_active = False
+		self.new_user.save()
+		for url in (reverse('token_refresh'), reverse('async_token_refresh')):
+			response = self.client.post(url, {"refresh": refresh}, format='json')
+			self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TokenBlacklistTest(APITestCase):
+	"""
+	test refresh token blacklist index and compaction
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		blacklist_index.clear()
+		self.new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		self.refresh = ProjectRefreshToken.for_user(self.new_user)
+
+	def test_signed_out_token_is_rejected(self):
+		"""
+		test refresh token can't be used after sign out
+
+		"""
+		self.client.post(reverse('signout'), {"refresh":str(self.refresh)}, format='json')
+		response = self.client.post(reverse('token_refresh'), {"refresh":str(self.refresh)}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+	def test_negative_lookup_skips_database(self):
+		"""
+		test checking a token that isn't blacklisted doesn't query the database
+
+		"""
+		blacklist_index.sync()
+		with self.assertNumQueries(0):
+			ProjectRefreshToken(str(self.refresh))
+
+	def test_late_commit_is_synced(self):
+		"""
+		test a blacklist row committed below an already synced id is still picked up,
+		whatever its blacklisted_at
+
+		"""
+		tokens = [OutstandingToken.objects.get(jti=self.refresh['jti'])]
+		for i in range(2):
+			refresh = ProjectRefreshToken.for_user(self.new_user)
+			tokens.append(OutstandingToken.objects.get(jti=refresh['jti']))
+
+		BlacklistedToken.objects.create(id=10, token=tokens[0])
+		blacklist_index.sync()
+		BlacklistedToken.objects.create(id=12, token=tokens[2])
+		blacklist_index.sync()
+		late = BlacklistedToken.objects.create(id=11, token=tokens[1])
+		BlacklistedToken.objects.filter(pk=late.pk).update(blacklisted_at=timezone.now() - timedelta(hours=1))
+		blacklist_index.sync()
+		self.assertTrue(all(blacklist_index.contains(token.jti) for token in tokens))
+
+	def test_compact_expired_tokens(self):
+		"""
+		test expired outstanding and blacklisted tokens are removed
+
+		"""
+		self.refresh.blacklist()
+		OutstandingToken.objects.update(expires_at=timezone.now())
+		call_command('compact_token_blacklist', batch_size=1, stdout=io.StringIO())
+		self.assertEqual(OutstandingToken.objects.count(), 0)
+		self.assertEqual(BlacklistedToken.objects.count(), 0)
+
+
+class ListPaginationTest(APITestCase):
+	"""
+	test cursor pagination and streaming on profile and user lists
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		user_cache.clear()
+		self.staff_user = User.objects.create_user(username="staffuser", email="staffuser@email.com", password="staffUSER12##", is_staff=True)
+		for i in range(2):
+			User.objects.create_user(username=f"newuser{i}", email=f"newuser{i}@email.com", password="newUSER12##")
+
+		refresh = ProjectRefreshToken.for_user(self.staff_user)
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(refresh.access_token))
+
+	def test_cursor_pagination(self):
+		"""
+		test staff user pages through all users
+
+		"""
+		response = self.client.get(reverse('users'), {"page_size": 2})
+		self.assertEqual(len(response.data['data']), 2)
+		self.assertIsNotNone(response.data['next'])
+
+		response = self.client.get(response.data['next'])
+		self.assertEqual(len(response.data['data']), 1)
+		self.assertIsNone(response.data['next'])
+
+	def test_stream_profiles(self):
+		"""
+		test profiles are streamed as ndjson
+
+		"""
+		response = self.client.get(reverse('profiles'), {"stream": 1})
+		self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+		rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+		self.assertEqual(len(rows), 3)
+		self.assertIn('display_name', rows[0])
+
+
+class ProfileListQueryTest(APITestCase):
+	"""
+	test profile list doesn't query users per profile
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		clear_caches() # new users no longer invalidate entries left by rolled back tests that reused their ids
+		self.staff_user = User.objects.create_user(username="staffuser", email="staffuser@email.com", password="staffUSER12##", is_staff=True)
+		for i in range(5):
+			User.objects.create_user(username=f"newuser{i}", email=f"newuser{i}@email.com", password="newUSER12##")
+
+		refresh = ProjectRefreshToken.for_user(self.staff_user)
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(refresh.access_token))
+
+	def test_profile_list_queries(self):
+		"""
+		test listing profiles costs the user lookup and one profile query
+
+		"""
+		with self.assertNumQueries(2):
+			response = self.client.get(reverse('profiles'))
+
+		self.assertEqual(len(response.data['data']), 6)
+		self.assertEqual({row['user'] for row in response.data['data']}, {"staffuser"} | {f"newuser{i}" for i in range(5)})
+
+	def test_profile_detail_queries(self):
+		"""
+		test profile details are fetched in one query
+
+		"""
+		profile = self.staff_user.user_profile
+		self.client.get(reverse('profile_details', kwargs={'pk':profile.pk})) # warm the token user cache
+		detail_cache.invalidate('profile', profile.pk) # measure the rebuild, not the cached response
+
+		with self.assertNumQueries(1):
+			response = self.client.get(reverse('profile_details', kwargs={'pk':profile.pk}))
+
+		self.assertEqual(response.data['data']['user'], "staffuser")
+
+
+class SignUpAvailabilityTest(APITestCase):
+	"""
+	test username and email availability checks on sign up
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		taken_cache.clear()
+		self.signup_url = reverse('signup')
+		User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		self.duplicate_signup_data = {
+			"username":"NewUser",
+			"email":"NEWUSER@email.com",
+			"password":"testUSER23##",
+			"password_again":"testUSER23##"
+		}
+
+	def test_both_conflicts_in_one_query(self):
+		"""
+		test taken username and email are reported together from a single query
+
+		"""
+		with self.assertNumQueries(1):
+			response = self.client.post(self.signup_url, self.duplicate_signup_data, format='json')
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn('username', response.data)
+		self.assertIn('email', response.data)
+
+	def test_non_ascii_name_conflicts(self):
+		"""
+		test a taken non ascii username is reported as taken, not left to the unique index
+
+		"""
+		User.objects.create_user(username="Émile_x", email="emile@email.com", password="newUSER12##")
+		taken_cache.clear()
+
+		self.assertEqual(find_conflicts(username="Émile_x"), {'username'})
+		self.assertEqual(find_conflicts(username="Émile_x", email="EMILE@email.com"), {'username', 'email'})
+		self.assertEqual(find_conflicts(username="Émile_y"), set())
+
+		taken_cache.clear()
+		response = self.client.post(self.signup_url, dict(self.duplicate_signup_data, username="Émile_x", email="other@email.com"), format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn('username_unavailable', response.data['username'])
+
+	def test_repeated_probe_skips_database(self):
+		"""
+		test probing the same taken names again is answered from the taken cache
+
+		"""
+		self.client.post(self.signup_url, self.duplicate_signup_data, format='json')
+
+		with self.assertNumQueries(0):
+			response = self.client.post(self.signup_url, self.duplicate_signup_data, format='json')
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+	def test_insert_race_maps_to_validation_error(self):
+		"""
+		test a unique index violation on insert is returned as a validation error
+
+		"""
+		with mock.patch('authentication.serializers.find_conflicts', side_effect=[set(), {'username', 'email'}]):
+			response = self.client.post(self.signup_url, self.duplicate_signup_data, format='json')
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn('username_unavailable', response.data['username'])
+
+
+	def test_update_keeps_own_cached_names(self):
+		"""
+		test a user can send back their own username and email after they were cached as taken
+
+		"""
+		user = User.objects.get(username="newuser")
+		self.client.post(self.signup_url, self.duplicate_signup_data, format='json') # caches both names as taken
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(ProjectRefreshToken.for_user(user).access_token))
+		url = reverse('user_details', kwargs={'pk': user.pk})
+
+		response = self.client.put(url, {"username": "newuser", "email": "newuser@email.com"}, format='json')
+		self.assertEqual(response.data['status'], status.HTTP_201_CREATED)
+
+		response = self.client.patch(url, {"email": "newuser@email.com"}, format='json')
+		self.assertEqual(response.data['status'], status.HTTP_201_CREATED)
+
+	def test_rename_releases_old_name(self):
+		"""
+		test the old username of a renamed user can be signed up right away
+
+		"""
+		user = User.objects.get(username="newuser")
+		self.client.post(self.signup_url, self.duplicate_signup_data, format='json')
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(ProjectRefreshToken.for_user(user).access_token))
+		self.client.patch(reverse('user_details', kwargs={'pk': user.pk}), {"username": "renameduser"}, format='json')
+		self.client.credentials()
+
+		self.assertFalse(taken_cache.contains('username', 'newuser'))
+		self.assertTrue(taken_cache.contains('username', 'renameduser'))
+
+		data = dict(self.duplicate_signup_data, email="another@email.com")
+		response = self.client.post(self.signup_url, data, format='json')
+		self.assertEqual(response.data['status'], status.HTTP_201_CREATED)
+
+	def test_invalid_password_skips_database(self):
+		"""
+		test a password failing the checks is rejected before the availability query
+
+		"""
+		data = dict(self.duplicate_signup_data, password="password", password_again="password")
+
+		with self.assertNumQueries(0):
+			response = self.client.post(self.signup_url, data, format='json')
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		errors = response.data['password'][0]
+		self.assertEqual(set(errors), {'password_character', 'password_uppercase', 'password_digit'})
+
+
+class ValidatorsTest(SimpleTestCase):
+	"""
+	test the shared username, email and password validators
+
+	"""
+
+	def test_password_classes_in_one_pass(self):
+		"""
+		test every missing character class is reported
+
+		"""
+		self.assertEqual(validators.classify_password("testUSER23##"), validators.ALL_CLASSES)
+		self.assertEqual(validators.classify_password("abc"), validators.LOWERCASE)
+		self.assertEqual(validators.password_errors("testUSER23##", "testUSER23##"), {})
+		self.assertEqual(set(validators.password_errors("ABC", "abc")), {
+			'password_length', 'password_character', 'password_lowercase', 'password_digit', 'password_match'
+		})
+		self.assertEqual(set(validators.password_errors("", "")), {'password_value'})
+
+	def test_username_stops_at_first_failed_rule(self):
+		"""
+		test overlong usernames are rejected on length without the character scan
+
+		"""
+		self.assertEqual(validators.username_errors("new_user"), {})
+		self.assertEqual(set(validators.username_errors("u" * 1000 + "!")), {'username_length'})
+		self.assertEqual(set(validators.username_errors("new!user")), {'username_character'})
+		self.assertEqual(set(validators.username_errors("   ")), {'username_value'})
+		self.assertEqual(validators.validate_username("new user"), "new_user")
+
+
+@override_settings(BULK_PROVISION_WORKERS=0)
+class BulkProvisioningTest(APITestCase):
+	"""
+	test bulk sign up endpoint and import command
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		clear_caches()
+		self.bulk_url = reverse('users_bulk')
+		self.staff_user = User.objects.create_user(username="staffuser", email="staffuser@email.com", password="staffUSER12##", is_staff=True)
+		refresh = ProjectRefreshToken.for_user(self.staff_user)
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(refresh.access_token))
+
+	def test_bulk_signup(self):
+		"""
+		test valid records are created with profiles and invalid ones reported
+
+		"""
+		response = self.client.post(self.bulk_url, {"users": [
+			{"username": "bulkuser1", "email": "bulkuser1@email.com", "password": "bulkUSER12##"},
+			{"username": "staffuser", "email": "other@email.com", "password": "bulkUSER12##"},
+			{"username": "bad!", "email": "bulkuser3@email.com", "password": "bulkUSER12##"},
+			{"username": "bulkuser4", "email": "bulkuser4@email.com", "password": "weak"},
+		]}, format='json')
+
+		self.assertEqual(response.data['created'], 1)
+		self.assertEqual([result['status'] for result in response.data['results']], ["created", "error", "error", "error"])
+		self.assertIn('password_length', response.data['results'][3]['errors']['password'][0])
+		self.assertFalse(User.objects.filter(username="bulkuser4").exists())
+		user = User.objects.get(username="bulkuser1")
+		self.assertTrue(user.check_password("bulkUSER12##"))
+		self.assertTrue(UserProfile.objects.filter(user=user).exists())
+
+	def test_bulk_signup_rejects_malformed_records(self):
+		"""
+		test records that aren't objects or hold non string fields get an error result instead of a 500
+
+		"""
+		User.objects.create_user(username="Émile_x", email="emile@email.com", password="bulkUSER12##")
+		taken_cache.clear()
+
+		response = self.client.post(self.bulk_url, {"users": [
+			{"username": 12345, "email": "bulkuser1@email.com", "password": "bulkUSER12##"},
+			{"username": "bulkuser2", "email": "bulkuser2@email.com", "password": 12345678},
+			{"username": "bulkuser3", "email": ["bulkuser3@email.com"], "password": "bulkUSER12##"},
+			"bulkuser4",
+			["bulkuser5"],
+			{"username": "Émile_x", "email": "bulkuser6@email.com", "password": "bulkUSER12##"},
+			{"username": "bulkuser7", "email": "bulkuser7@email.com", "password": "bulkUSER12##"},
+		]}, format='json')
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data['created'], 1)
+		results = response.data['results']
+		self.assertEqual([result['status'] for result in results], ["error"] * 6 + ["created"])
+		self.assertEqual(results[0]['errors'], {"username": "Must be a string"})
+		self.assertEqual(results[1]['errors'], {"password": "Must be a string"})
+		self.assertEqual(results[2]['errors'], {"email": "Must be a string"})
+		self.assertIn('record', results[3]['errors'])
+		self.assertIn('record', results[4]['errors'])
+		self.assertIn('unavailable', results[5]['errors'])
+
+	def test_import_command_reports_malformed_lines(self):
+		"""
+		test JSON lines that aren't objects or hold non string fields are reported without aborting the batch
+
+		"""
+		with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as handle:
+			handle.write('["jsonuser1", "jsonuser1@email.com"]\n')
+			handle.write('{"username": "jsonuser4",\n')
+			handle.write('{"username": 7, "email": "jsonuser2@email.com", "password": "jsonUSER12##"}\n')
+			handle.write('{"username": "jsonuser3", "email": "jsonuser3@email.com", "password": "jsonUSER12##"}\n')
+
+		stdout = io.StringIO()
+		call_command('bulk_import_users', handle.name, stdout=stdout)
+		os.unlink(handle.name)
+
+		self.assertIn("Imported 1 users, 3 failed", stdout.getvalue())
+		self.assertTrue(User.objects.filter(username="jsonuser3").exists())
+
+	def test_bulk_signup_requires_staff(self):
+		"""
+		test basic users can't create users in bulk
+
+		"""
+		basic_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(ProjectRefreshToken.for_user(basic_user).access_token))
+		response = self.client.post(self.bulk_url, {"users": [{"username": "bulkuser1", "email": "bulkuser1@email.com", "password": "bulkUSER12##"}]}, format='json')
+		self.assertEqual(response.data['status'], status.HTTP_401_UNAUTHORIZED)
+
+	def test_import_command(self):
+		"""
+		test users are imported from a CSV file, with raw and pre hashed passwords
+
+		"""
+		password_hash = User.objects.get(username="staffuser").password
+		with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+			handle.write("username,email,password,password_hash\n")
+			handle.write("csvuser1,csvuser1@email.com,csvUSER12##,\n")
+			handle.write(f"csvuser2,csvuser2@email.com,,{password_hash}\n")
+
+		call_command('bulk_import_users', handle.name, batch_size=1, stdout=io.StringIO())
+		os.unlink(handle.name)
+		self.assertTrue(User.objects.get(username="csvuser1").check_password("csvUSER12##"))
+		self.assertTrue(User.objects.get(username="csvuser2").check_password("staffUSER12##"))
+		self.assertEqual(UserProfile.objects.filter(user__username__startswith="csvuser").count(), 2)
+
+
+class BulkUserAdminTest(APITestCase):
+	"""
+	test bulk user administration endpoint
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		clear_caches()
+		self.bulk_admin_url = reverse('users_bulk_admin')
+		self.staff_user = User.objects.create_user(username="staffuser", email="staffuser@email.com", password="staffUSER12##", is_staff=True)
+		self.users = [
+			User.objects.create_user(username=f"tenantuser{i}", email=f"tenantuser{i}@tenant.com", password="tenantUSER12##")
+			for i in range(3)
+		]
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(ProjectRefreshToken.for_user(self.staff_user).access_token))
+
+	def test_deactivate_by_ids(self):
+		"""
+		test users are deactivated, their refresh tokens blacklisted and unknown ids reported
+
+		"""
+		refresh = ProjectRefreshToken.for_user(self.users[0])
+		ids = [self.users[0].pk, self.users[1].pk, 99999]
+		response = self.client.post(self.bulk_admin_url, {"action": "deactivate", "ids": ids}, format='json')
+
+		self.assertEqual([result['status'] for result in response.data['results']], ["updated", "updated", "not_found"])
+		self.assertEqual(response.data['blacklisted_tokens'], 1)
+		self.assertEqual(User.objects.filter(is_active=False).count(), 2)
+		response = self.client.post(reverse('token_refresh'), {"refresh": str(refresh)}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+	def test_delete_by_filter(self):
+		"""
+		test filtered users and their profiles are deleted, the request user is never matched
+
+		"""
+		response = self.client.post(self.bulk_admin_url, {"action": "delete", "filters": {"email__iendswith": "@tenant.com"}}, format='json')
+
+		self.assertEqual(response.data['affected'], 3)
+		self.assertFalse(User.objects.filter(email__endswith="@tenant.com").exists())
+		self.assertEqual(UserProfile.objects.count(), 1)
+
+		response = self.client.post(self.bulk_admin_url, {"action": "delete", "ids": [self.staff_user.pk]}, format='json')
+		self.assertEqual(response.data['results'], [{"id": self.staff_user.pk, "status": "not_found"}])
+
+	def test_rejects_unknown_filter(self):
+		"""
+		test filters outside the whitelist are rejected
+
+		"""
+		response = self.client.post(self.bulk_admin_url, {"action": "delete", "filters": {"password__startswith": "pbkdf2"}}, format='json')
+		self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(User.objects.count(), 4)
+
+	def test_requires_staff(self):
+		"""
+		test basic users can't administer users in bulk
+
+		"""
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(ProjectRefreshToken.for_user(self.users[0]).access_token))
+		response = self.client.post(self.bulk_admin_url, {"action": "deactivate", "ids": [self.users[1].pk]}, format='json')
+		self.assertEqual(response.data['status'], status.HTTP_401_UNAUTHORIZED)
+		self.assertTrue(User.objects.get(pk=self.users[1].pk).is_active)
+
+
+class MetricsTest(APITestCase):
+	"""
+	test request sampling and the prometheus metrics view
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		clear_caches()
+		metrics.clear()
+		User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+
+	@override_settings(METRICS_SAMPLE_RATE=1)
+	def test_sampled_request_is_recorded(self):
+		"""
+		test view latency, queries and password check time are exposed
+
+		"""
+		self.client.post(reverse('signin'), {"login_id": "newuser", "password": "newUSER12##"}, format='json')
+		response = self.client.get(reverse('metrics'))
+		body = response.content.decode()
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertIn('auth_request_duration_seconds_count{view="signin",method="POST"} 1', body)
+		self.assertIn('auth_request_queries_bucket{view="signin",method="POST",le="2"} 1', body)
+		self.assertIn('auth_password_check_duration_seconds_count 1', body)
+
+	@override_settings(METRICS_SAMPLE_RATE=0)
+	def test_sampling_disabled(self):
+		"""
+		test nothing is recorded when sampling is off
+
+		"""
+		self.client.post(reverse('signin'), {"login_id": "newuser", "password": "newUSER12##"}, format='json')
+		body = self.client.get(reverse('metrics')).content.decode()
+		self.assertNotIn('_count', body)
+
+	@override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+	def test_metrics_restricted_by_address(self):
+		"""
+		test metrics can't be read from other addresses
+
+		"""
+		response = self.client.get(reverse('metrics'))
+		self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class DatabaseProfileTest(SimpleTestCase):
+	"""
+	test the DB_PROFILE database settings
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def test_sqlite_wal_pragmas(self):
+		"""
+		test sqlite-wal connections are opened in WAL mode with a busy timeout
+
+		"""
+		with mock.patch.dict(os.environ, {'DB_NAME': os.path.join(self.directory, 'wal.sqlite3'), 'DB_BUSY_TIMEOUT': '2500'}):
+			database = database_settings('sqlite-wal', self.directory)
+
+		connection = ConnectionHandler({'default': database})['default']
+		try:
+			with connection.cursor() as cursor:
+				cursor.execute("PRAGMA journal_mode")
+				self.assertEqual(cursor.fetchone()[0], 'wal')
+				cursor.execute("PRAGMA busy_timeout")
+				self.assertEqual(cursor.fetchone()[0], 2500)
+		finally:
+			connection.close()
+
+		self.assertTrue(database['CONN_HEALTH_CHECKS'])
+		self.assertGreater(database['CONN_MAX_AGE'], 0)
+
+	def test_pgbouncer_profile(self):
+		"""
+		test the pooled postgres profile disables server side cursors
+
+		"""
+		with mock.patch.dict(os.environ, {'DB_POOLER': 'pgbouncer'}):
+			database = database_settings('postgres', self.directory)
+
+		self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+		self.assertEqual(database['PORT'], '6432')
+
+	def test_replica_settings(self):
+		"""
+		test the replica copies the primary settings with its own name
+
+		"""
+		primary = database_settings('sqlite-wal', Path(self.directory))
+		self.assertIsNone(replica_settings(primary))
+
+		with mock.patch.dict(os.environ, {'DB_REPLICA_NAME': 'replica.sqlite3'}):
+			replica = replica_settings(primary)
+
+		self.assertEqual(replica['NAME'], 'replica.sqlite3')
+		self.assertEqual(replica['SQLITE_PRAGMAS'], primary['SQLITE_PRAGMAS'])
+
+	def test_unknown_profile(self):
+		"""
+		test unknown profiles are rejected
+
+		"""
+		with self.assertRaises(ImproperlyConfigured):
+			database_settings('mysql', self.directory)
+
+
+@skipUnless(replica_configured(), "set DB_REPLICA_NAME to run the replica routing tests")
+class ReplicaRoutingTest(APITestCase):
+	"""
+	test read only views read from the replica. Run on their own with DB_REPLICA_NAME set,
+	so the primary and the replica are two separate SQLite databases:
+	DB_REPLICA_NAME=replica.sqlite3 python manage.py test authentication.tests.ReplicaRoutingTest
+
+	"""
+	databases = {'default', 'replica'} if replica_configured() else {'default'} # the runner reads this even when skipped
+
+	def setUp(self):
+		"""
+		setup test, the user is copied to the replica by hand since nothing replicates
+
+		"""
+		clear_caches()
+		self.new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		self.profile = UserProfile.objects.get(user=self.new_user)
+		User.objects.using('replica').bulk_create([User(pk=self.new_user.pk, username="newuser", email="newuser@email.com", password=self.new_user.password)])
+		UserProfile.objects.using('replica').bulk_create([UserProfile(pk=self.profile.pk, user_id=self.new_user.pk, display_name="replica copy")])
+
+		self.details_url = reverse('profile_details', kwargs={'pk': self.profile.pk})
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(ProjectRefreshToken.for_user(self.new_user).access_token))
+
+	def test_get_reads_replica(self):
+		"""
+		test profile details are read from the replica
+
+		"""
+		response = self.client.get(self.details_url)
+		self.assertEqual(response.data['data']['display_name'], "replica copy")
+
+	def test_token_user_read_from_primary(self):
+		"""
+		test a user deactivated on the primary isn't authenticated from the replica's older copy
+
+		"""
+		User.objects.filter(pk=self.new_user.pk).update(is_active=False) # the replica still has the active row
+		response = self.client.get(self.details_url)
+		self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+	def test_written_details_are_not_cached_from_replica(self):
+		"""
+		test a detail entry rebuilt after a write the replica doesn't have yet comes from the primary
+
+		"""
+		self.client.get(self.details_url) # cached from the replica
+		self.profile.display_name = "primary copy"
+		self.profile.save() # not through the views, the user isn't sticky
+
+		response = self.client.get(self.details_url)
+		self.assertEqual(response.data['data']['display_name'], "primary copy")
+
+	def test_reads_stick_to_primary_after_write(self):
+		"""
+		test a user reads their own write right after a PATCH
+
+		"""
+		self.client.patch(self.details_url, {"display_name": "primary copy"}, format='json')
+		response = self.client.get(self.details_url)
+		self.assertEqual(response.data['data']['display_name'], "primary copy")
+
+	def test_signin_falls_back_to_primary(self):
+		"""
+		test a user missing from the replica can still sign in
+
+		"""
+		User.objects.using('replica').filter(pk=self.new_user.pk).delete()
+		response = self.client.post(reverse('signin'), {"login_id": "newuser", "password": "newUSER12##"}, format='json')
+		self.assertIn('access', response.data)
+
+	def test_router_without_block_uses_primary(self):
+		"""
+		test reads outside read_from_replica stay on the primary
+
+		"""
+		router = ReplicaRouter()
+		self.assertEqual(router.db_for_read(User), 'default')
+		with read_from_replica():
+			self.assertEqual(router.db_for_read(User), 'replica')
+		self.assertEqual(router.db_for_write(User), 'default')
+
+
+class ConditionalGetTest(APITestCase):
+	"""
+	test ETag and Last-Modified on the profile and user detail views
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		clear_caches()
+		self.new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		self.profile = UserProfile.objects.get(user=self.new_user)
+		self.profile_url = reverse('profile_details', kwargs={'pk': self.profile.pk})
+		self.user_url = reverse('user_details', kwargs={'pk': self.new_user.pk})
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(ProjectRefreshToken.for_user(self.new_user).access_token))
+
+	def test_not_modified_from_cache(self):
+		"""
+		test a current ETag gets a 304 without queries
+
+		"""
+		etag = self.client.get(self.profile_url)['ETag']
+
+		with self.assertNumQueries(0): # token user and version both come from the cache
+			response = self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+		self.assertEqual(response['ETag'], etag)
+
+	def test_update_changes_etag(self):
+		"""
+		test updating the profile or the username invalidates the profile ETag
+
+		"""
+		etag = self.client.get(self.profile_url)['ETag']
+		self.client.patch(self.profile_url, {"display_name": "new name"}, format='json')
+		response = self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data['data']['display_name'], "new name")
+
+		etag = response['ETag']
+		self.client.patch(self.user_url, {"username": "renameduser"}, format='json')
+		response = self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data['data']['user'], "renameduser")
+
+	def test_if_modified_since(self):
+		"""
+		test Last-Modified is honoured on the user detail view
+
+		"""
+		last_modified = self.client.get(self.user_url)['Last-Modified']
+		response = self.client.get(self.user_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+		self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+
+class DetailCacheTest(APITestCase):
+	"""
+	test the serialized response cache of the detail views
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		clear_caches()
+		self.new_user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		self.user_url = reverse('user_details', kwargs={'pk': self.new_user.pk})
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(ProjectRefreshToken.for_user(self.new_user).access_token))
+
+	def test_cached_response(self):
+		"""
+		test a repeated GET is served without queries and an update is seen right away
+
+		"""
+		self.client.get(self.user_url)
+		with self.assertNumQueries(0):
+			response = self.client.get(self.user_url)
+		self.assertEqual(response.data['data']['username'], "newuser")
+
+		self.client.patch(self.user_url, {"username": "renameduser"}, format='json')
+		response = self.client.get(self.user_url)
+		self.assertEqual(response.data['data']['username'], "renameduser")
+
+	def test_written_objects_rebuild_from_primary(self):
+		"""
+		test entries are built from the replica, except after a write when the replica may lag
+
+		"""
+		request = RequestFactory().get(self.user_url)
+		databases = []
+
+		def build():
+			databases.append(ReplicaRouter().db_for_read(User))
+			return self.new_user.updated_at, {"id": self.new_user.pk}
+
+		with mock.patch('django_auth.routers.replica_configured', return_value=True), read_from_replica():
+			detail_cache.get_detail(request, 'user', self.new_user.pk, build)
+			detail_cache.invalidate('user', self.new_user.pk) # a write
+			detail_cache.get_detail(request, 'user', self.new_user.pk, build)
+
+		self.assertEqual(databases, ['replica', 'default'])
+
+	def test_rebuild_racing_a_write_is_not_stored(self):
+		"""
+		test data read before a concurrent write isn't cached
+
+		"""
+		request = RequestFactory().get(self.user_url)
+
+		def build():
+			data = (self.new_user.updated_at, {"id": self.new_user.pk, "username": "newuser"})
+			detail_cache.invalidate('user', self.new_user.pk) # a write lands while building
+			return data
+
+		detail_cache.get_detail(request, 'user', self.new_user.pk, build)
+		self.assertIsNone(detail_cache.cached_entry('user', self.new_user.pk))
+
+	@override_settings(DETAIL_REBUILD_WAIT=0.05)
+	def test_waits_for_rebuilding_request(self):
+		"""
+		test a request that finds the rebuild lock taken waits, then builds by itself
+
+		"""
+		cache.add(detail_cache.lock_key('user', self.new_user.pk), True)
+		build = mock.Mock(return_value=(self.new_user.updated_at, {"id": self.new_user.pk}))
+
+		with mock.patch.object(detail_cache, 'wait_for_entry', wraps=detail_cache.wait_for_entry) as wait:
+			response = detail_cache.get_detail(RequestFactory().get(self.user_url), 'user', self.new_user.pk, build)
+
+		wait.assert_called_once()
+		build.assert_called_once()
+		self.assertEqual(response.data['data'], {"id": self.new_user.pk})
+		self.assertTrue(cache.get(detail_cache.lock_key('user', self.new_user.pk))) # the other request's lock is left alone
+
+
+class RateLimitTest(APITestCase):
+	"""
+	test the sliding window rate limits of sign in, sign up and token refresh
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		clear_caches()
+		self.signin_url = reverse('signin')
+		self.signup_url = reverse('signup')
+		self.refresh_url = reverse('token_refresh')
+		self.user = User.objects.create_user(username="newuser", email="newuser@email.com", password="newUSER12##")
+		UserProfile.objects.get_or_create(user=self.user)
+
+	@override_settings(RATE_LIMITS={'signin_account': '2/min'})
+	def test_signin_account_limit_rejects_before_database(self):
+		"""
+		test sign ins over the account limit get a 429 without a query or a password check
+
+		"""
+		data = {"login_id": "NewUser", "password": "wrongPASS12##"}
+		for _ in range(2):
+			self.client.post(self.signin_url, data, format='json')
+
+		with self.assertNumQueries(0), mock.patch('authentication.custom_auth.CustomAuthenticationBackend.authenticate') as authenticate:
+			response = self.client.post(self.signin_url, {"login_id": "newuser", "password": "newUSER12##"}, format='json')
+
+		authenticate.assert_not_called()
+		self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+		self.assertIn('Retry-After', response)
+
+		response = self.client.post(self.signin_url, {"login_id": "otheruser", "password": "newUSER12##"}, format='json')
+		self.assertEqual(response.data['status'], status.HTTP_401_UNAUTHORIZED) # other accounts are not limited
+
+	@override_settings(RATE_LIMITS={'signin_ip': '3/min'})
+	def test_signin_address_limit_spans_accounts(self):
+		"""
+		test spraying many accounts from one address hits the address limit
+
+		"""
+		codes = [
+			self.client.post(self.signin_url, {"login_id": f"user{i}", "password": "wrongPASS12##"}, format='json').status_code
+			for i in range(4)
+		]
+
+		self.assertEqual(codes[-1], status.HTTP_429_TOO_MANY_REQUESTS)
+		self.assertNotIn(status.HTTP_429_TOO_MANY_REQUESTS, codes[:-1])
+
+	@override_settings(RATE_LIMITS={'signin_ip': '2/min'})
+	def test_spoofed_forwarded_for_is_ignored(self):
+		"""
+		test a client sending a new X-Forwarded-For on every request stays in its address window
+
+		"""
+		codes = [
+			self.client.post(self.signin_url, {"login_id": f"user{i}", "password": "wrongPASS12##"}, format='json',
+				HTTP_X_FORWARDED_FOR=f"10.0.0.{i}").status_code
+			for i in range(3)
+		]
+		self.assertEqual(codes[-1], status.HTTP_429_TOO_MANY_REQUESTS)
+
+		request = RequestFactory().post(self.signin_url, HTTP_X_FORWARDED_FOR="10.0.0.1, 10.0.0.2", REMOTE_ADDR="10.0.0.3")
+		self.assertEqual(throttling.client_address(request), "10.0.0.3")
+		with override_settings(RATE_LIMIT_NUM_PROXIES=1):
+			self.assertEqual(throttling.client_address(request), "10.0.0.2") # the address the trusted proxy saw
+
+	@override_settings(RATE_LIMITS={'signup_ip': '1/hour'})
+	def test_signup_limit_on_sync_and_async_views(self):
+		"""
+		test the sign up limit is shared by the sync and async views
+
+		"""
+		data = {"username": "bulkbot", "email": "bulkbot@email.com", "password": "testUSER23##", "password_again": "testUSER23##"}
+		self.assertEqual(self.client.post(self.signup_url, data, format='json').data['status'], status.HTTP_201_CREATED)
+
+		response = self.client.post(reverse('async_signup'), dict(data, username="bulkbot2", email="bulkbot2@email.com"), format='json')
+		self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+		self.assertIn('detail', response.json())
+		self.assertFalse(User.objects.filter(username="bulkbot2").exists())
+
+	@override_settings(RATE_LIMIT_CACHE='default', RATE_LIMITS={'refresh_ip': '1/min'})
+	def test_refresh_limit_in_shared_cache(self):
+		"""
+		test the token refresh limit counted in the django cache
+
+		"""
+		refresh = str(ProjectRefreshToken.for_user(self.user))
+		self.assertEqual(self.client.post(self.refresh_url, {"refresh": refresh}, format='json').status_code, status.HTTP_200_OK)
+
+		response = self.client.post(self.refresh_url, {"refresh": refresh}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+		self.assertFalse(throttling.local_store._counters) # nothing was counted in process
+
+	@override_settings(RATE_LIMITS={'signin_ip': '10/min'})
+	def test_previous_window_is_weighted(self):
+		"""
+		test requests of the previous window count by how much they overlap the sliding window
+
+		"""
+		store = throttling.LocalStore()
+		key = ('signin_ip', '127.0.0.1')
+
+		for _ in range(10):
+			self.assertEqual(store.hit(key, 10, 60, 0.0), 0)
+		self.assertGreater(store.hit(key, 10, 60, 30.0), 0)
+
+		# half way into the next window the previous ten count as five
+		for _ in range(5):
+			self.assertEqual(store.hit(key, 10, 60, 90.0), 0)
+		self.assertAlmostEqual(store.hit(key, 10, 60, 90.0), 6.0) # at 96s the previous window weighs 4
+
+		self.assertEqual(store.hit(key, 10, 60, 180.0), 0) # both windows are stale
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=2000, PASSWORD_SCRYPT_WORK_FACTOR=2 ** 10)
+class PasswordHashingPolicyTest(APITestCase):
+	"""
+	test the hashing policy and the rehash of outdated hashes on sign in
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		clear_caches()
+		self.user = User.objects.create_user(username="newuser", email="newuser@email.com", password=None)
+		self.user.password = PBKDF2PasswordHasher().encode("newUSER12##", PBKDF2PasswordHasher().salt(), iterations=1000)
+		self.user.save()
+		UserProfile.objects.get_or_create(user=self.user)
+		self.signin_data = {"login_id": "newuser", "password": "newUSER12##"}
+
+	def test_signin_upgrades_outdated_costs(self):
+		"""
+		test a hash made with fewer iterations is rehashed with the current ones on sign in
+
+		"""
+		response = self.client.post(reverse('signin'), self.signin_data, format='json')
+
+		self.assertEqual(response.data['status'], status.HTTP_200_OK)
+		self.user.refresh_from_db()
+		self.assertTrue(self.user.password.startswith("pbkdf2_sha256$2000$"))
+		self.assertTrue(self.user.check_password("newUSER12##"))
+
+	def test_wrong_password_keeps_hash(self):
+		"""
+		test a failed sign in leaves the stored hash alone
+
+		"""
+		password = self.user.password
+		self.client.post(reverse('signin'), dict(self.signin_data, password="wrongPASS12##"), format='json')
+
+		self.user.refresh_from_db()
+		self.assertEqual(self.user.password, password)
+
+	def test_async_signin_switches_algorithm(self):
+		"""
+		test the async sign in rehashes with a newly preferred algorithm
+
+		"""
+		with override_settings(PASSWORD_HASHERS=password_hashers('scrypt')):
+			response = self.client.post(reverse('async_signin'), self.signin_data, format='json')
+
+			self.assertEqual(response.status_code, status.HTTP_200_OK)
+			self.user.refresh_from_db()
+			self.assertTrue(self.user.password.startswith("scrypt$"))
+			self.assertFalse(hashing.must_rehash(self.user.password))
+
+		self.assertTrue(self.user.check_password("newUSER12##")) # still verifies once pbkdf2 is preferred again
+
+	def test_policy_lists_preferred_hasher_first(self):
+		"""
+		test PASSWORD_HASHERS keeps every algorithm so existing hashes verify
+
+		"""
+		hashers = password_hashers('scrypt')
+		self.assertEqual(hashers[0], 'authentication.hashers.TunedScryptPasswordHasher')
+		self.assertIn('authentication.hashers.TunedPBKDF2PasswordHasher', hashers)
+
+		with self.assertRaises(ImproperlyConfigured):
+			password_hashers('md5')
+
+
+class ProfileCreationTest(APITestCase):
+	"""
+	test profiles are inserted with their user, and created lazily for users without one
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		clear_caches()
+		self.signup_data = {
+			"username":"testuser",
+			"email":"testuser@email.com",
+			"password":"testUSER23##",
+			"password_again":"testUSER23##"
+		}
+
+	def test_signup_inserts_profile_without_signals(self):
+		"""
+		test sign up inserts the user and the default profile without cache invalidations or image work
+
+		"""
+		with mock.patch.object(detail_cache, 'invalidate') as invalidate, \
+				mock.patch('authentication.images.schedule_thumbnail') as schedule:
+			response = self.client.post(reverse('signup'), self.signup_data, format='json')
+
+		self.assertEqual(response.data['status'], status.HTTP_201_CREATED)
+		invalidate.assert_not_called()
+		schedule.assert_not_called()
+		profile = UserProfile.objects.get(user__username="testuser")
+		self.assertEqual(profile.profile_picture.name, 'default.jpeg')
+
+	def test_async_signup_inserts_profile(self):
+		"""
+		test the async sign up inserts the profile in the same transaction
+
+		"""
+		response = self.client.post(reverse('async_signup'), self.signup_data, format='json')
+
+		self.assertEqual(response.json()['status'], status.HTTP_201_CREATED)
+		self.assertEqual(UserProfile.objects.filter(user__username="testuser").count(), 1)
+
+	def test_failed_profile_insert_rolls_back_user(self):
+		"""
+		test a user is never left without a profile when the profile insert fails
+
+		"""
+		with mock.patch.object(UserProfile.objects, 'create_for_users', side_effect=IntegrityError), \
+				self.assertRaises(IntegrityError):
+			User.objects.create_user(username="testuser", email="testuser@email.com", password="testUSER23##")
+
+		self.assertFalse(User.objects.filter(username="testuser").exists())
+
+	def test_admin_add_user_creates_profile(self):
+		"""
+		test users added through the admin and with objects.create() still get their profile
+
+		"""
+		admin_user = User.objects.create_superuser(username="adminuser", email="adminuser@email.com", password="adminUSER12##")
+		self.client.force_login(admin_user)
+
+		response = self.client.post(reverse('admin:authentication_customuser_add'), {
+			"username": "testuser", "password1": "adminADDED45##", "password2": "adminADDED45##"
+		})
+
+		self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+		self.assertEqual(UserProfile.objects.filter(user__username="testuser").count(), 1)
+
+		User.objects.create(username="createduser", email="createduser@email.com")
+		self.assertEqual(UserProfile.objects.filter(user__username="createduser").count(), 1)
+		self.assertEqual(UserProfile.objects.filter(user=admin_user).count(), 1)
+
+	def test_profile_created_on_first_access(self):
+		"""
+		test a user inserted without a profile gets one when sign in needs it
+
+		"""
+		User.objects.bulk_create([User(username="legacyuser", email="legacyuser@email.com", password=make_password("legacyUSER12##"))])
 
+		response = self.client.post(reverse('signin'), {"login_id": "legacyuser", "password": "wrongPASS12##"}, format='json')
 
+		self.assertEqual(response.data['status'], status.HTTP_401_UNAUTHORIZED)
+		self.assertEqual(UserProfile.objects.filter(user__username="legacyuser").count(), 1)
@@ -0,0 +1,263 @@
+import time
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+
+"""
+This file contains the sliding window rate limits of the sign in, sign up
+and token refresh routes. Each limit counts requests in the current and the
+previous fixed window and weighs the previous count by how much of it still
+overlaps the sliding window, so a limit costs two counters per key instead
+of a timestamp per request. Counters live in this process by default, set
+RATE_LIMIT_CACHE to a cache alias to share them between processes. Limits
+are checked before the request body reaches a serializer, the database or
+the password hasher. Clients are keyed on REMOTE_ADDR, X-Forwarded-For is
+only read behind RATE_LIMIT_NUM_PROXIES trusted proxies, anyone can send it.
+
+"""
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+PRUNE_INTERVAL = 60 # seconds between sweeps of stale in process counters
+
+
+
+def parse_rate(rate):
+	"""
+	Return (requests, window seconds) for a "count/period" rate such as "10/min",
+	None when the rate is empty
+
+	"""
+	if not rate:
+		return None
+
+	count, period = rate.split('/')
+	return int(count), PERIODS[period[0]]
+
+
+def retry_after(previous, current, limit, elapsed, window):
+	"""
+	Return the seconds until one more request fits in the sliding window
+
+	"""
+	if current + 1 > limit or not previous: # only the next window frees room
+		return window - elapsed
+
+	# the previous window's weight has to drop until previous * weight + current + 1 <= limit
+	return max(0.0, window * (1 - (limit - current - 1) / previous) - elapsed)
+
+
+def estimate(previous, current, elapsed, window):
+	return previous * (1 - elapsed / window) + current
+
+
+class LocalStore:
+	"""
+	Per process sliding window counters
+
+	"""
+
+	def __init__(self):
+		self._counters = {} # key -> [window index, current count, previous count]
+		self._lock = threading.Lock()
+		self._next_prune = 0.0
+
+	def hit(self, key, limit, window, now):
+		"""
+		Count a request and return 0, or the seconds to wait when the limit is reached
+
+		"""
+		index, elapsed = divmod(now, window)
+
+		with self._lock:
+			if now >= self._next_prune:
+				self._prune(now)
+
+			counter = self._counters.get(key)
+			if counter is None or counter[0] < index - 1:
+				counter = self._counters[key] = [index, 0, 0]
+			elif counter[0] < index: # slide into the next window
+				counter[:] = [index, 0, counter[1]]
+
+			if estimate(counter[2], counter[1], elapsed, window) + 1 > limit:
+				return retry_after(counter[2], counter[1], limit, elapsed, window)
+
+			counter[1] += 1
+			return 0
+
+	async def ahit(self, key, limit, window, now):
+		return self.hit(key, limit, window, now) # no I/O, the lock is only held for a few operations
+
+	def _prune(self, now):
+		windows = {}
+		for key, counter in list(self._counters.items()):
+			window = windows.setdefault(key[0], parse_rate(settings.RATE_LIMITS.get(key[0])))
+			if window is None or counter[0] < now // window[1] - 1:
+				del self._counters[key]
+
+		self._next_prune = now + PRUNE_INTERVAL
+
+	def clear(self):
+		with self._lock:
+			self._counters.clear()
+
+
+class CacheStore:
+	"""
+	Sliding window counters in a django cache shared by all processes
+
+	"""
+
+	def __init__(self, alias):
+		self.cache = caches[alias]
+
+	def keys(self, key, index):
+		scope, ident = key
+		return f"rate:{scope}:{ident}:{index}", f"rate:{scope}:{ident}:{index - 1}"
+
+	def hit(self, key, limit, window, now):
+		index, elapsed = divmod(now, window)
+		current_key, previous_key = self.keys(key, int(index))
+		counts = self.cache.get_many([current_key, previous_key])
+		previous, current = counts.get(previous_key, 0), counts.get(current_key, 0)
+
+		if estimate(previous, current, elapsed, window) + 1 > limit:
+			return retry_after(previous, current, limit, elapsed, window)
+
+		self.cache.add(current_key, 0, timeout=2 * window) # kept while it is the previous window
+		try:
+			self.cache.incr(current_key)
+		except ValueError: # evicted between add and incr
+			self.cache.add(current_key, 1, timeout=2 * window)
+		return 0
+
+	async def ahit(self, key, limit, window, now):
+		"""
+		Async version of hit
+
+		"""
+		index, elapsed = divmod(now, window)
+		current_key, previous_key = self.keys(key, int(index))
+		counts = await self.cache.aget_many([current_key, previous_key])
+		previous, current = counts.get(previous_key, 0), counts.get(current_key, 0)
+
+		if estimate(previous, current, elapsed, window) + 1 > limit:
+			return retry_after(previous, current, limit, elapsed, window)
+
+		await self.cache.aadd(current_key, 0, timeout=2 * window)
+		try:
+			await self.cache.aincr(current_key)
+		except ValueError:
+			await self.cache.aadd(current_key, 1, timeout=2 * window)
+		return 0
+
+	def clear(self):
+		pass # entries expire on their own
+
+
+local_store = LocalStore()
+
+
+def get_store():
+	if settings.RATE_LIMIT_CACHE:
+		return CacheStore(settings.RATE_LIMIT_CACHE)
+
+	return local_store
+
+
+def client_address(request):
+	"""
+	Return the address a client is limited by, the one the last of
+	RATE_LIMIT_NUM_PROXIES trusted proxies saw when there are any
+
+	"""
+	num_proxies = settings.RATE_LIMIT_NUM_PROXIES
+	forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+	if num_proxies and forwarded:
+		addresses = [address.strip() for address in forwarded.split(',')]
+		return addresses[-min(num_proxies, len(addresses))] # entries left of it were sent by the client
+
+	return request.META.get('REMOTE_ADDR')
+
+
+def route_keys(route, request, data):
+	"""
+	Yield the (scope, identity) pairs limited on a route: the client address
+	on every route and, on sign in, the account being tried
+
+	"""
+	yield f"{route}_ip", client_address(request)
+
+	if route == 'signin':
+		login_id = data.get("login_id") if hasattr(data, 'get') else None
+		if isinstance(login_id, str) and login_id.strip():
+			yield 'signin_account', login_id.strip().lower()[:254]
+
+
+def limited_keys(route, request, data):
+	for scope, ident in route_keys(route, request, data):
+		rate = parse_rate(settings.RATE_LIMITS.get(scope))
+		if rate is not None:
+			yield (scope, ident), rate
+
+
+def check(route, request, data):
+	"""
+	Count a request on route and return 0, or the seconds to wait when any of
+	its limits is reached
+
+	"""
+	store = get_store()
+	now = time.time()
+
+	for key, (limit, window) in limited_keys(route, request, data):
+		wait = store.hit(key, limit, window, now)
+		if wait:
+			return wait
+
+	return 0
+
+
+async def acheck(route, request, data):
+	"""
+	Async version of check
+
+	"""
+	store = get_store()
+	now = time.time()
+
+	for key, (limit, window) in limited_keys(route, request, data):
+		wait = await store.ahit(key, limit, window, now)
+		if wait:
+			return wait
+
+	return 0
+
+
+class RouteThrottle(BaseThrottle):
+	"""
+	Rest framework throttle applying the sliding window limits of a route
+
+	"""
+	route = None
+
+	def allow_request(self, request, view):
+		self.wait_seconds = check(self.route, request, request.data if self.route == 'signin' else {})
+		return not self.wait_seconds
+
+	def wait(self):
+		return self.wait_seconds
+
+
+class SignInThrottle(RouteThrottle):
+	route = 'signin'
+
+
+class SignUpThrottle(RouteThrottle):
+	route = 'signup'
+
+
+class TokenRefreshThrottle(RouteThrottle):
+	route = 'refresh'
@@ -0,0 +1,165 @@
+import jwt
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .blacklist import blacklist_index
+from .utils import add_user_claims
+
+
+"""
+This file contains the token classes issued and accepted by the project.
+They share one token backend whose keys are parsed when this module is
+imported instead of on every encode and decode. Refresh tokens check
+the blacklist through the in process index in blacklist.py. The user
+claims are read from the database again on every refresh, so a demoted
+or deactivated user's claims last one access token at most.
+
+"""
+
+
+class PreparedTokenBackend(TokenBackend):
+	"""
+	Token backend holding keys already converted by the jwt algorithm,
+	pyjwt hands prepared keys straight to the signature check
+
+	"""
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		algorithm = jwt.PyJWS().get_algorithm_by_name(self.algorithm)
+
+		if self.signing_key:
+			self.signing_key = algorithm.prepare_key(self.signing_key)
+
+		if self.verifying_key:
+			self.verifying_key = algorithm.prepare_key(self.verifying_key)
+
+
+token_backend = PreparedTokenBackend(
+	api_settings.ALGORITHM,
+	api_settings.SIGNING_KEY,
+	api_settings.VERIFYING_KEY,
+	api_settings.AUDIENCE,
+	api_settings.ISSUER,
+	api_settings.JWK_URL,
+	api_settings.LEEWAY,
+	api_settings.JSON_ENCODER,
+)
+
+
+class AccessToken(tokens.AccessToken):
+	_token_backend = token_backend
+
+
+class RefreshToken(tokens.RefreshToken):
+	_token_backend = token_backend
+	access_token_class = AccessToken
+
+	@classmethod
+	def for_user(cls, user):
+		"""
+		Issue a refresh token carrying the user claims, access tokens copy them
+
+		"""
+		token = super().for_user(user)
+		return add_user_claims(token, user)
+
+	def user_queryset(self):
+		"""
+		Return the active user of the token as a queryset on the primary
+
+		"""
+		if api_settings.USER_ID_CLAIM not in self:
+			raise TokenError(_("Token contained no recognizable user identification"))
+
+		return get_user_model().objects.db_manager('default').only('username', 'is_staff', 'is_superuser').filter(
+			**{api_settings.USER_ID_FIELD: self[api_settings.USER_ID_CLAIM], 'is_active': True}
+		)
+
+	def update_user_claims(self):
+		"""
+		Copy the current user claims into the token before it is rotated
+
+		"""
+		user = self.user_queryset().first()
+		if user is None:
+			raise TokenError(_("Token user is not active"))
+
+		return add_user_claims(self, user)
+
+	async def aupdate_user_claims(self):
+		"""
+		Async version of update_user_claims
+
+		"""
+		user = await self.user_queryset().afirst()
+		if user is None:
+			raise TokenError(_("Token user is not active"))
+
+		return add_user_claims(self, user)
+
+	def check_blacklist(self):
+		"""
+		Check the blacklist index instead of querying the blacklist table
+
+		"""
+		if blacklist_index.contains(self.payload[api_settings.JTI_CLAIM]):
+			raise TokenError(_("Token is blacklisted"))
+
+	def blacklist(self):
+		"""
+		Blacklist the token and add it to the local index
+
+		"""
+		result = super().blacklist()
+		blacklist_index.add(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload["exp"]))
+		return result
+
+	@classmethod
+	async def afor_user(cls, user):
+		"""
+		Async version of for_user, the outstanding token is inserted with the async ORM
+
+		"""
+		token = add_user_claims(tokens.Token.for_user.__func__(cls, user), user) # skips the sync outstanding token insert
+		await OutstandingToken.objects.acreate(
+			user=user,
+			jti=token[api_settings.JTI_CLAIM],
+			token=str(token),
+			created_at=token.current_time,
+			expires_at=datetime_from_epoch(token["exp"]),
+		)
+		return token
+
+	@classmethod
+	async def afrom_string(cls, raw_token):
+		"""
+		Verify a refresh token from async code. The index is synced first so
+		the blacklist check in verify() doesn't query the database
+
+		"""
+		await blacklist_index.aensure_synced()
+		return cls(raw_token)
+
+	async def ablacklist(self):
+		"""
+		Async version of blacklist
+
+		"""
+		jti = self.payload[api_settings.JTI_CLAIM]
+		token, _ = await OutstandingToken.objects.aget_or_create(
+			jti=jti,
+			defaults={
+				"token": str(self),
+				"expires_at": datetime_from_epoch(self.payload["exp"]),
+			},
+		)
+		result = await BlacklistedToken.objects.aget_or_create(token=token)
+		blacklist_index.add(jti, token.expires_at)
+		return result
@@ -5,20 +5,40 @@ from django.conf.urls.static import static
 from .views import(
     SignUpRequest, SignInRequest, SignOutRequest,
     ProfileRequest, ProfileDetailsRequest,
-    UserRequest, UserDetailsRequest
+    UserRequest, UserDetailsRequest, BulkUserRequest, BulkUserAdminRequest,
+    MetricsRequest
+)
+from .async_views import (
+    AsyncSignUpRequest, AsyncSignInRequest, AsyncSignOutRequest, AsyncTokenRefreshRequest,
+    AsyncProfileRequest, AsyncProfileDetailsRequest, AsyncUserRequest, AsyncUserDetailsRequest
 )
 from rest_framework_simplejwt.views import TokenRefreshView 
+from .throttling import TokenRefreshThrottle
 
 
 urlpatterns = [
 	path('signup/', SignUpRequest.as_view(), name='signup'), # user sign up url
 	path('signin/', SignInRequest.as_view(), name='signin'), # user sign in view url
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'), # Token refresh url
+    path('token/refresh/', TokenRefreshView.as_view(throttle_classes=[TokenRefreshThrottle]), name='token_refresh'), # Token refresh url
 	path('signout/', SignOutRequest.as_view(), name='signout'), # user sign out url
     path('profile/', ProfileRequest.as_view(), name='profiles'), # user profile url path
     path('profile_details/<int:pk>/', ProfileDetailsRequest.as_view(), name='profile_details'),  # profile details url path
     path('users/', UserRequest.as_view(), name='users'), # user info url path
     path('user_details/<int:pk>/', UserDetailsRequest.as_view(), name='user_details'), # user details url path
+    path('users/bulk/', BulkUserRequest.as_view(), name='users_bulk'), # staff bulk sign up url path
+    path('users/bulk/admin/', BulkUserAdminRequest.as_view(), name='users_bulk_admin'), # staff bulk activate, deactivate and delete url path
+
+    path('metrics/', MetricsRequest.as_view(), name='metrics'), # prometheus metrics url path
+
+    # async views, served natively under asgi
+	path('async/signup/', AsyncSignUpRequest.as_view(), name='async_signup'), # async user sign up url
+	path('async/signin/', AsyncSignInRequest.as_view(), name='async_signin'), # async user sign in url
+    path('async/token/refresh/', AsyncTokenRefreshRequest.as_view(), name='async_token_refresh'), # async token refresh url
+	path('async/signout/', AsyncSignOutRequest.as_view(), name='async_signout'), # async user sign out url
+    path('async/profile/', AsyncProfileRequest.as_view(), name='async_profiles'), # async user profile url path
+    path('async/profile_details/<int:pk>/', AsyncProfileDetailsRequest.as_view(), name='async_profile_details'), # async profile details url path
+    path('async/users/', AsyncUserRequest.as_view(), name='async_users'), # async user info url path
+    path('async/user_details/<int:pk>/', AsyncUserDetailsRequest.as_view(), name='async_user_details'), # async user details url path
     
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
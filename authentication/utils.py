@@ -1,9 +1,7 @@
-from rest_framework_simplejwt.utils import jwt_payload_handler  
+# function to add user claims to jwt payload, used when tokens are issued
+def add_user_claims(token, user):
+	token['username'] = user.username  # add username to payload 
+	token['is_staff'] = user.is_staff  # staff and superuser flags let read only views skip the user lookup
+	token['is_superuser'] = user.is_superuser
 
-# function to add username to jwt payload 
-def custom_jwt_payload_handler(user):
-	payload = jwt_payload_handler(user)
-
-	payload['username'] = user.username  # add username to payload 
-
-	return payload 
\ No newline at end of file
+	return token 
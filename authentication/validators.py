@@ -0,0 +1,153 @@
+import re
+
+from rest_framework import serializers
+
+
+"""
+This file contains the username, email and password checks shared by the
+sign up, user and bulk provisioning code. Patterns are compiled once at
+import, the password is classified in a single pass over its characters
+and the cheap checks run first, so long or empty values are rejected
+before the pattern scans and the availability query only ever sees
+syntactically valid input.
+
+"""
+
+USERNAME_MIN_LENGTH = 4
+USERNAME_MAX_LENGTH = 20
+EMAIL_MIN_LENGTH = 6
+EMAIL_MAX_LENGTH = 40
+PASSWORD_MIN_LENGTH = 8
+
+USERNAME_FORBIDDEN = re.compile(r'[!@#$%^&*()+\-={}\[\]:;"\'<>,.?/\\|`~]') # characters not allowed in usernames
+PASSWORD_SPECIAL = frozenset('!@#$%^&*(),.?":{}|<>') # at least one of these is required in passwords
+
+# password character classes
+UPPERCASE = 1
+LOWERCASE = 2
+DIGIT = 4
+SPECIAL = 8
+ALL_CLASSES = UPPERCASE | LOWERCASE | DIGIT | SPECIAL
+
+PASSWORD_CLASS_ERRORS = (
+	(SPECIAL, "password_character", "Password must contain at least one special character"),
+	(UPPERCASE, "password_uppercase", "Password must contain at least one uppercase character"),
+	(LOWERCASE, "password_lowercase", "Password must contain at least one lowercase character"),
+	(DIGIT, "password_digit", "Password must contain at least one digit"),
+)
+
+
+def username_errors(value):
+	"""
+	Return the errors of a username, the character scan only runs on values of a valid length
+
+	"""
+	if value is None or not value.strip(): # make certain username is not none or filled with white space
+		return {"username_value": "Username can't be empty or filled with whitespaces only"}
+
+	if not USERNAME_MIN_LENGTH <= len(value) <= USERNAME_MAX_LENGTH:
+		return {"username_length": "Username length can only be between 4 to 20 characters"}
+
+	if USERNAME_FORBIDDEN.search(value):
+		return {"username_character": "Username should not contain any special character except underscore '_'"}
+
+	return {}
+
+
+def email_errors(value):
+	"""
+	Return the errors of an email, the format itself is checked by the serializer EmailField
+
+	"""
+	if value is None or not value.strip(): # make certain email is not none or filled with whitespace
+		return {"email_value": "Email can't be empty or filled with whitespaces only"}
+
+	if not EMAIL_MIN_LENGTH <= len(value) <= EMAIL_MAX_LENGTH:
+		return {"email_length": "Email must be between 6 to 40 characters"}
+
+	return {}
+
+
+def classify_password(password):
+	"""
+	Return the character classes found in password as a bit mask, in one pass
+	that stops as soon as every class has been seen
+
+	"""
+	found = 0
+
+	for char in password:
+		if char in PASSWORD_SPECIAL:
+			found |= SPECIAL
+		elif char.isdigit():
+			found |= DIGIT
+		elif char.isupper():
+			found |= UPPERCASE
+		elif char.islower():
+			found |= LOWERCASE
+		else:
+			continue
+
+		if found == ALL_CLASSES:
+			break
+
+	return found
+
+
+def password_errors(password, password_again):
+	"""
+	Return the errors of a password and its confirmation
+
+	"""
+	if not password:
+		return {"password_value": "Password field can't be empty"}
+
+	errors = {}
+
+	if len(password) < PASSWORD_MIN_LENGTH:
+		errors["password_length"] = "Password must be at least 8 characters"
+
+	found = classify_password(password)
+	if found != ALL_CLASSES:
+		for flag, key, message in PASSWORD_CLASS_ERRORS:
+			if not found & flag:
+				errors[key] = message
+
+	if password != password_again:
+		errors["password_match"] = "Both passwords must match"
+
+	return errors
+
+
+def validate_username(value):
+	"""
+	Raise the username errors, return the username with whitespace replaced by underscores
+
+	"""
+	errors = username_errors(value)
+	if errors:
+		raise serializers.ValidationError(errors)
+
+	return value.replace(" ", "_") # replace whitespace between username with underscore
+
+
+def validate_email(value):
+	"""
+	Raise the email errors, return the email unchanged
+
+	"""
+	errors = email_errors(value)
+	if errors:
+		raise serializers.ValidationError(errors)
+
+	return value
+
+
+def validate_password(password, password_again):
+	"""
+	Raise the password errors in the shape the sign up endpoint has always returned
+
+	"""
+	errors = password_errors(password, password_again)
+	if errors:
+		raise serializers.ValidationError({"password": [errors]})
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+"""
+This file contains the object versions behind the ETag and Last-Modified
+headers of the profile and user detail views. The version of an object is
+its updated_at time, the version of a profile also covers its user since
+the username is part of the profile representation. Versions are kept in
+the OBJECT_VERSION_CACHE cache: detail_cache.get_detail remembers the
+version read from updated_at when it builds a detail entry, and the
+post_save and post_delete signals forget it through detail_cache.invalidate,
+so the next GET reads the new updated_at. A conditional GET with a current
+validator is answered with a 304 from the cache without touching the user
+or profile tables.
+
+"""
+
+
+def cache_key(kind, pk):
+	return f"version:{kind}:{pk}"
+
+
+def get(kind, pk):
+	return caches[settings.OBJECT_VERSION_CACHE].get(cache_key(kind, pk))
+
+
+def remember(kind, pk, version):
+	caches[settings.OBJECT_VERSION_CACHE].set(cache_key(kind, pk), version, settings.OBJECT_VERSION_TTL)
+	return version
+
+
+def forget(kind, pk):
+	caches[settings.OBJECT_VERSION_CACHE].delete(cache_key(kind, pk))
+
+
+def forget_many(kind, pks):
+	caches[settings.OBJECT_VERSION_CACHE].delete_many([cache_key(kind, pk) for pk in pks])
+
+
+def etag(version):
+	return f'"{int(version.timestamp() * 1000000):x}"'
+
+
+def set_headers(response, version):
+	"""
+	Add the validators of version to a response
+
+	"""
+	response['ETag'] = etag(version)
+	response['Last-Modified'] = http_date(version.timestamp())
+	return response
+
+
+def not_modified(request, version):
+	"""
+	Return a 304 response when the request's validators match version, else None
+
+	"""
+	if version is None:
+		return None
+
+	response = get_conditional_response(request, etag=etag(version), last_modified=int(version.timestamp()))
+	if response is None:
+		return None
+
+	return set_headers(response, version)
@@ -1,18 +1,25 @@
-from django.utils import timezone
-from datetime import timedelta
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model 
-from django.db.models import Q
-from django.http import Http404
+from django.http import Http404, HttpResponse
 from rest_framework.views import APIView 
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from rest_framework_simplejwt.tokens import RefreshToken
 
-from .serializers import SignUpSerializer, SignInSerializer, ProfileSerializer, UserSerializer
+from .serializers import SignUpSerializer, SignInSerializer, ProfileSerializer, ProfileReadSerializer, UserSerializer
 from .models import UserProfile 
+from .authentication import StatelessReadJWTAuthentication
+from django_auth.routers import ReplicaReadMixin
+from .tokens import RefreshToken
+from .pagination import TimeCursorPagination, stream_ndjson
+from .provisioning import provision_batch
+from .administration import BulkActionError, apply_bulk_action
+from .throttling import SignInThrottle, SignUpThrottle
+from . import lockout, metrics, detail_cache
 
 User = get_user_model()
 
+PROFILE_DETAIL_FIELDS = ('id', 'profile_picture', 'display_name', 'updated_at', 'user__username', 'user__updated_at')
+
 
 class SignUpRequest(APIView):
 
@@ -20,6 +27,7 @@ class SignUpRequest(APIView):
 	View for user sign up
 
 	"""
+	throttle_classes = [SignUpThrottle, ] # sign up rate limit per client address, checked before validation
 
 	def post(self, request):
 		""" 	
@@ -58,6 +66,7 @@ class SignInRequest(APIView):
 	View for user sign in 
 
 	"""
+	throttle_classes = [SignInThrottle, ] # sign in rate limits per client address and per account, checked before hashing
 
 	def post(self, request):
 		""" 	
@@ -81,8 +90,7 @@ class SignInRequest(APIView):
 			if user is not None:
 				if user.is_active: # check if user account is active
 					refresh = RefreshToken.for_user(user) # generate token for user
-					user_profile = UserProfile.objects.get(user=user)
-					user_profile.reset_login_trials() # reset login trials on successful authentication
+					lockout.reset(user.pk) # reset login trials on successful authentication
 
 					return Response({
 						"success":"Login successful",
@@ -99,34 +107,28 @@ class SignInRequest(APIView):
 					})
 
 			else:
-				try:
-					user = User.objects.get(Q(username__iexact=loginId) | Q(email__iexact=loginId)) # search database for user with the provided 
-					user_profile = user.user_profile # get user profile
-			    		if user_profile.last_failed_login:
-						time_since_last_failed_login = timezone.now() - user_profile.last_failed_login
-						if time_since_last_failed_login > timedelta(hours=24):
-							user_profile.reset_login_trails()
-
-					if user_profile.login_trials < 5: # if user hasn't exceeded login trials 
-						user_profile.increment_login_trials() # add 1 to the current login trial counter
-						return Response({
-							"error": "Invalid username or password",
-							"status": status.HTTP_401_UNAUTHORIZED
-							})
-
-					else:
-						return Response({
-							"error": "You've tried to login too many times. Please try again after 24 hours",
-							"status": status.HTTP_401_UNAUTHORIZED
-						})
+				user = getattr(request, 'login_user', None) # user fetched by the authentication backend, if any
 
-				except:
+				if user is None:
 					# return error response if there's no user with the loginId provide 
 					return Response({
 						"error": "Invalid username or password",
 						"status": status.HTTP_401_UNAUTHORIZED
 					})
 
+				if lockout.failed_attempts(user.pk) < UserProfile.objects.for_user(user).max_login_trials: # if user hasn't exceeded login trials 
+					lockout.register_failure(user.pk) # add 1 to the cached login trial counter
+					return Response({
+						"error": "Invalid username or password",
+						"status": status.HTTP_401_UNAUTHORIZED
+						})
+
+				else:
+					return Response({
+						"error": "You've tried to login too many times. Please try again after 24 hours",
+						"status": status.HTTP_401_UNAUTHORIZED
+					})
+
 		else:
 			return Response({ 
 				#  return error response if serializer is not valid
@@ -177,12 +179,14 @@ class SignOutRequest(APIView):
 			})
 
 
-class ProfileRequest(APIView):
+class ProfileRequest(ReplicaReadMixin, APIView):
 	"""
 	view for user profile 
 	"""
+	authentication_classes = [StatelessReadJWTAuthentication, ] # GET can skip the user lookup, see JWT_STATELESS_READS
 	permission_classes = [permissions.IsAuthenticated, ]
-	serializer_class = ProfileSerializer
+	serializer_class = ProfileReadSerializer # builds plain dicts from one joined .values() query
+	pagination_class = TimeCursorPagination
 
 	def get_queryset(self):
 		"""
@@ -190,11 +194,12 @@ class ProfileRequest(APIView):
 
 		"""
 		user = self.request.user
+		profiles = UserProfile.objects.values(*self.serializer_class.values) # user__username is joined, not queried per profile
 		try: 
 			if user.is_staff or user.is_superuser: # staff or admin users can view all profiles
-				return UserProfile.objects.all()			
+				return profiles			
 			else:
-				return UserProfile.objects.get(user=user) # basic users can get their profile objects only
+				return profiles.filter(user_id=user.pk) # basic users can get their profile objects only
 
 		except UserProfile.DoesNotExist:
 			return Http404("User profile does not exist")
@@ -210,21 +215,31 @@ class ProfileRequest(APIView):
 		Handle get request for user profile 
 
 		"""
-		profile = self.get_queryset() # get profile based on queryset permission 
-		serializer = self.serializer_class(profile, many=True)
+		profiles = self.get_queryset() # get profile based on queryset permission 
+
+		if request.query_params.get('stream') == '1': # stream every profile as ndjson
+			profiles = profiles.using(profiles.db) # pin the database, the stream is read after the view returns
+			return stream_ndjson(profiles.order_by(*self.pagination_class.ordering), self.serializer_class, settings.STREAM_CHUNK_SIZE)
+
+		paginator = self.pagination_class()
+		page = paginator.paginate_queryset(profiles, request, view=self)
+		serializer = self.serializer_class(page, many=True)
 		return Response({
 			"success": "Profile fetched successfully",
 			"data": serializer.data,
+			"next": paginator.get_next_link(),
+			"previous": paginator.get_previous_link(),
 			"status": status.HTTP_200_OK
 		})
 
 
 		
-class ProfileDetailsRequest(APIView):
+class ProfileDetailsRequest(ReplicaReadMixin, APIView):
 
 	"""
 	profile details view 
 	"""
+	authentication_classes = [StatelessReadJWTAuthentication, ] # GET can skip the user lookup, see JWT_STATELESS_READS
 	permission_classes = [permissions.IsAuthenticated, ]
 	serializer_class = ProfileSerializer
 	
@@ -234,7 +249,8 @@ class ProfileDetailsRequest(APIView):
 
 		"""
 		try:
-			return UserProfile.objects.get(pk=pk) # get user profile by pk
+			# get user profile by pk, with the username joined in and only the serialized columns loaded
+			return UserProfile.objects.select_related('user').only(*PROFILE_DETAIL_FIELDS).get(pk=pk)
 		 
 		except UserProfile.DoesNotExist:
 			raise Http404("User profile does not exist.")
@@ -248,16 +264,15 @@ class ProfileDetailsRequest(APIView):
 
 	def get(self, request, pk, format=None):
 		"""
-		Method to get user profile details 
+		Method to get user profile details, served from the detail cache and
+		answered with a 304 when the client's ETag or Last-Modified is current
 		
 		"""
-		profile = self.get_object(pk)
-		serializer = self.serializer_class(profile)
-		return Response({
-			"success":"success",
-			"data":serializer.data,
-			"status":status.HTTP_200_OK
-		})
+		def build():
+			profile = self.get_object(pk)
+			return max(profile.updated_at, profile.user.updated_at), dict(self.serializer_class(profile).data)
+
+		return detail_cache.get_detail(request, 'profile', pk, build)
 	
 	def put(self, request, pk, format=None):
 		"""
@@ -314,13 +329,15 @@ class ProfileDetailsRequest(APIView):
 		})
 
 
-class UserRequest(APIView):
+class UserRequest(ReplicaReadMixin, APIView):
 	"""
 	view for user object. This view is used to get all users,
 	it should be used by staff or admin users only. 
 	"""
+	authentication_classes = [StatelessReadJWTAuthentication, ] # GET can skip the user lookup, see JWT_STATELESS_READS
 	permission_classes = [permissions.IsAuthenticated, ]
 	serializer_class = UserSerializer
+	pagination_class = TimeCursorPagination
 
 	def get_queryset(self):
 		""" 
@@ -333,7 +350,7 @@ class UserRequest(APIView):
 				return User.objects.all() # staff or admin can view all users
 
 			else:
-				return User.objects.get(id=self.request.user.id) # basic users can view their user object only
+				return User.objects.filter(id=self.request.user.id) # basic users can view their user object only
 
 		except User.DoesNotExist:
 			raise Http404("User does not exist")
@@ -350,21 +367,31 @@ class UserRequest(APIView):
 		Handle get request for user object 
 
 		"""
-		user = self.get_queryset() # get all users 
-		serializer = self.serializer_class(user, many=True)
+		users = self.get_queryset() # get all users 
+
+		if request.query_params.get('stream') == '1': # stream every user as ndjson
+			users = users.using(users.db) # pin the database, the stream is read after the view returns
+			return stream_ndjson(users.order_by(*self.pagination_class.ordering), self.serializer_class, settings.STREAM_CHUNK_SIZE)
+
+		paginator = self.pagination_class()
+		page = paginator.paginate_queryset(users, request, view=self)
+		serializer = self.serializer_class(page, many=True)
 		return Response({
 			"success": "User fetched successfully",
 			"data": serializer.data,
+			"next": paginator.get_next_link(),
+			"previous": paginator.get_previous_link(),
 			"status": status.HTTP_200_OK
 		})
 		
 
-class UserDetailsRequest(APIView):
+class UserDetailsRequest(ReplicaReadMixin, APIView):
 
 	"""
 	user details view. This should be used by staff or admin users only
 
 	"""
+	authentication_classes = [StatelessReadJWTAuthentication, ] # GET can skip the user lookup, see JWT_STATELESS_READS
 	permission_classes = [permissions.IsAuthenticated, ]
 	serializer_class = UserSerializer
 	
@@ -388,16 +415,15 @@ class UserDetailsRequest(APIView):
 
 	def get(self, request, pk, format=None):
 		"""
-		Method to get user details 
+		Method to get user details, served from the detail cache and
+		answered with a 304 when the client's ETag or Last-Modified is current
 		
 		"""
-		user = self.get_object(pk)
-		serializer = self.serializer_class(user)
-		return Response({
-			"success":"success",
-			"data":serializer.data,
-			"status":status.HTTP_200_OK
-		})
+		def build():
+			user = self.get_object(pk)
+			return user.updated_at, dict(self.serializer_class(user).data)
+
+		return detail_cache.get_detail(request, 'user', pk, build)
 	
 	def put(self, request, pk, format=None):
 		"""
@@ -463,3 +489,110 @@ class UserDetailsRequest(APIView):
 			})
 
 
+class BulkUserRequest(APIView):
+
+	"""
+	bulk sign up view. This should be used by staff or admin users only
+
+	"""
+	permission_classes = [permissions.IsAuthenticated, ]
+
+	def post(self, request, format=None):
+		"""
+		Create many users at once, the body is {"users": [{"username", "email", "password" or "password_hash"}, ...]}
+
+		"""
+		request_user = self.request.user
+
+		if not (request_user.is_staff or request_user.is_superuser): # only staff or admin user can create users in bulk
+			return Response({
+				"error":"You are not authorized to create users in bulk",
+				"status": status.HTTP_401_UNAUTHORIZED
+			})
+
+		records = request.data.get("users")
+
+		if not isinstance(records, list) or not records or len(records) > settings.BULK_PROVISION_MAX_RECORDS:
+			return Response({
+				"error": f"Provide a list of 1 to {settings.BULK_PROVISION_MAX_RECORDS} users",
+				"status": status.HTTP_400_BAD_REQUEST
+			})
+
+		results = provision_batch(records) # records that aren't objects get an error result
+		return Response({
+			"success": "Bulk sign up processed",
+			"created": sum(result["status"] == "created" for result in results),
+			"results": results,
+			"status": status.HTTP_201_CREATED
+		})
+
+
+class BulkUserAdminRequest(APIView):
+
+	"""
+	bulk user administration view. This should be used by staff or admin users only
+
+	"""
+	permission_classes = [permissions.IsAuthenticated, ]
+
+	def post(self, request, format=None):
+		"""
+		Activate, deactivate or delete many users at once, the body is
+		{"action": "activate" | "deactivate" | "delete", "ids": [...]} or {"action": ..., "filters": {...}}
+
+		"""
+		request_user = self.request.user
+
+		if not (request_user.is_staff or request_user.is_superuser): # only staff or admin user can administer users in bulk
+			return Response({
+				"error":"You are not authorized to administer users in bulk",
+				"status": status.HTTP_401_UNAUTHORIZED
+			})
+
+		if ("ids" in request.data) == ("filters" in request.data):
+			return Response({
+				"error": "Provide either ids or filters",
+				"status": status.HTTP_400_BAD_REQUEST
+			})
+
+		try:
+			results, blacklisted = apply_bulk_action(
+				request_user, request.data.get("action"),
+				ids=request.data.get("ids"), filters=request.data.get("filters")
+			)
+
+		except BulkActionError as e:
+			return Response({
+				"error": str(e),
+				"status": status.HTTP_400_BAD_REQUEST
+			})
+
+		return Response({
+			"success": "Bulk action applied",
+			"affected": sum(result["status"] != "not_found" for result in results),
+			"blacklisted_tokens": blacklisted,
+			"results": results,
+			"status": status.HTTP_200_OK
+		})
+
+
+class MetricsRequest(APIView):
+
+	"""
+	prometheus metrics view, readable from METRICS_ALLOWED_IPS only
+
+	"""
+	authentication_classes = [] # scrapers don't carry tokens
+
+	def get(self, request, format=None):
+		"""
+		Return the metrics of this process in the prometheus text format
+
+		"""
+		if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+			return Response({
+				"error": "You are not authorized to read metrics",
+				"status": status.HTTP_403_FORBIDDEN
+			}, status=status.HTTP_403_FORBIDDEN)
+
+		return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
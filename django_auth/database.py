@@ -0,0 +1,104 @@
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+"""
+This file builds the default database settings from the DB_PROFILE
+environment variable.
+
+sqlite       the project database file, as in development
+sqlite-wal   the same file in WAL mode with a busy timeout, readers don't
+             block the writer and concurrent sign in writes wait for the
+             file lock instead of failing, for single node deployments
+postgres     PostgreSQL, set DB_POOLER=pgbouncer when connecting through a
+             local pgbouncer in transaction pooling mode (needs psycopg)
+
+Every profile keeps connections open for DB_CONN_MAX_AGE seconds and
+checks them before reuse, instead of connecting on every request.
+
+A read replica is added as the 'replica' database when DB_REPLICA_NAME
+or DB_REPLICA_HOST is set, see routers.py.
+
+"""
+
+PROFILES = ('sqlite', 'sqlite-wal', 'postgres')
+
+
+def database_settings(profile, base_dir):
+	"""
+	Return the settings of the default database for a profile
+
+	"""
+	if profile not in PROFILES:
+		raise ImproperlyConfigured(f"Unknown DB_PROFILE {profile}, use one of {', '.join(PROFILES)}")
+
+	persistent = {
+		'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)), # set 0 when serving with asgi, connections are per thread
+		'CONN_HEALTH_CHECKS': True, # reconnect instead of failing a request on a dropped connection
+	}
+
+	if profile == 'postgres':
+		pooled = os.getenv('DB_POOLER') == 'pgbouncer'
+		return {
+			'ENGINE': 'django.db.backends.postgresql',
+			'NAME': os.getenv('DB_NAME', 'django_auth'),
+			'USER': os.getenv('DB_USER', 'django_auth'),
+			'PASSWORD': os.getenv('DB_PASSWORD', ''),
+			'HOST': os.getenv('DB_HOST', '127.0.0.1'),
+			'PORT': os.getenv('DB_PORT', '6432' if pooled else '5432'),
+			'DISABLE_SERVER_SIDE_CURSORS': pooled, # named cursors don't survive transaction pooling
+			**persistent,
+		}
+
+	busy_timeout = int(os.getenv('DB_BUSY_TIMEOUT', 5000)) # milliseconds a writer waits for the file lock
+	database = {
+		'ENGINE': 'django.db.backends.sqlite3',
+		'NAME': os.getenv('DB_NAME') or base_dir / 'db.sqlite3',
+		'OPTIONS': {'timeout': busy_timeout / 1000},
+		**persistent,
+	}
+
+	if profile == 'sqlite-wal':
+		database['SQLITE_PRAGMAS'] = {
+			'journal_mode': 'WAL',
+			'synchronous': 'NORMAL', # safe with WAL, fsync at checkpoints only
+			'busy_timeout': busy_timeout,
+		}
+
+	return database
+
+
+def replica_settings(primary):
+	"""
+	Return the settings of the read replica, a copy of the primary settings
+	pointing at DB_REPLICA_NAME or DB_REPLICA_HOST, or None
+
+	"""
+	name = os.getenv('DB_REPLICA_NAME')
+	host = os.getenv('DB_REPLICA_HOST')
+
+	if not (name or host):
+		return None
+
+	replica = {**primary, 'TEST': {**primary.get('TEST', {})}}
+	if name:
+		replica['NAME'] = name
+	if host:
+		replica['HOST'] = host
+		replica['PORT'] = os.getenv('DB_REPLICA_PORT', primary.get('PORT', ''))
+
+	return replica
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+	"""
+	connection_created receiver running the SQLITE_PRAGMAS of the database
+
+	"""
+	pragmas = connection.settings_dict.get('SQLITE_PRAGMAS')
+	if connection.vendor != 'sqlite' or not pragmas:
+		return
+
+	for name, value in pragmas.items():
+		connection.connection.execute(f"PRAGMA {name} = {value}")
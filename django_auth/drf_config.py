@@ -18,22 +18,21 @@ SECRET_KEY = os.getenv('SECRET_KEY')
 # rest framework authentication and permission configuration 
 REST_FRAMEWORK = {
 	"DEFAULT_AUTHENTICATION_CLASSES": (
-		"rest_framework_simplejwt.authentication.JWTAuthentication",
-	)
+		"authentication.authentication.CachedJWTAuthentication", # simplejwt authentication with a user cache
+	),
+	"DEFAULT_PAGINATION_CLASS": "authentication.pagination.TimeCursorPagination",
+	"PAGE_SIZE": 50, # default page size of the profile and user lists
 }
 
+STREAM_CHUNK_SIZE = 2000 # rows fetched per query when lists are streamed with ?stream=1
+
 # django authentication backends 
 AUTHENTICATION_BACKENDS = [
-    "authentication.custom_auth.CustomAuthenticationBackend", # custom auth backend(login with either username or email
-    'django.contrib.auth.backends.ModelBackend', 
+    # custom auth backend(login with either username or email), it extends ModelBackend so a second
+    # ModelBackend entry would only repeat the lookup and password hashing on every failed sign in
+    "authentication.custom_auth.CustomAuthenticationBackend",
 ]
 
-# rest framework simple jwt configuration 
-JWT_AUTH = {
-    # handler to include username in jwt payload 
-    "JWT_PAYLOAD_HANDLER": "authentication.utils.custom_jwt_payload_handler"
-}
-
 SIMPLE_JWT = {
 	"ACCESS_TOKEN_LIFETIME": timedelta(days=int(os.getenv('ACCESS_TOKEN_LIFETIME'))),
 	"REFRESH_TOKEN_LIFETIME": timedelta(days=int(os.getenv('REFRESH_TOKEN_LIFETIME'))),
@@ -55,7 +54,8 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'USER_AUTHENTICATION_RULE': 'rest_framework_simplejwt.authentication.default_user_authentication_rule',
 
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'AUTH_TOKEN_CLASSES': ('authentication.tokens.AccessToken',), # tokens with pre parsed keys
+    'TOKEN_REFRESH_SERIALIZER': 'authentication.serializers.TokenRefreshSerializer',
     'TOKEN_TYPE_CLAIM': 'token_type',
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
 
@@ -68,5 +68,12 @@ SIMPLE_JWT = {
 }
 
 
+# build the request user from token claims on GET requests to read only views.
+# Claims are read from the database when a token is issued or refreshed, a
+# demoted or deactivated user keeps the old staff flags until their current
+# access token expires (ACCESS_TOKEN_LIFETIME), not the refresh token lifetime
+JWT_STATELESS_READS = os.getenv('JWT_STATELESS_READS', 'False') == 'True'
+
+
 # corsheaders configuration
 CORS_ALLOW_ALL_ORIGIN = True 	# allow all requests 
\ No newline at end of file
@@ -0,0 +1,46 @@
+from importlib.util import find_spec
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+"""
+This file builds PASSWORD_HASHERS from the PASSWORD_HASH_ALGORITHM
+environment variable.
+
+pbkdf2   PBKDF2-SHA256, no extra dependency (default)
+scrypt   scrypt from hashlib, memory hard, no extra dependency
+argon2   argon2id, memory hard, needs argon2-cffi
+bcrypt   bcrypt over a SHA256 pre-hash so passwords longer than bcrypt's
+         72 bytes aren't truncated, needs bcrypt
+
+The chosen algorithm hashes new passwords, the others stay listed so
+existing hashes still verify. Their costs come from the PASSWORD_*
+settings (see authentication/hashers.py and the calibrate_hashers
+command). A user whose hash was made by another algorithm or with other
+costs is rehashed on their next successful sign in.
+
+"""
+
+HASHERS = {
+	'pbkdf2': ('authentication.hashers.TunedPBKDF2PasswordHasher', None),
+	'scrypt': ('authentication.hashers.TunedScryptPasswordHasher', None),
+	'argon2': ('authentication.hashers.TunedArgon2PasswordHasher', 'argon2'),
+	'bcrypt': ('authentication.hashers.TunedBCryptSHA256PasswordHasher', 'bcrypt'),
+}
+
+
+def password_hashers(algorithm):
+	"""
+	Return PASSWORD_HASHERS with the hasher of algorithm first
+
+	"""
+	if algorithm not in HASHERS:
+		raise ImproperlyConfigured(f"Unknown PASSWORD_HASH_ALGORITHM {algorithm}, use one of {', '.join(HASHERS)}")
+
+	hasher, library = HASHERS[algorithm]
+	if library and find_spec(library) is None:
+		raise ImproperlyConfigured(f"PASSWORD_HASH_ALGORITHM {algorithm} needs the {library} package installed")
+
+	return [hasher] + [path for name, (path, _) in HASHERS.items() if name != algorithm] + [
+		'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher', # hashes of earlier django versions
+	]
@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+
+"""
+This file contains the read replica database router. Reads go to the
+replica database only inside read_from_replica(), which the read only
+views enter through ReplicaReadMixin, everything else keeps using the
+primary. A user who just wrote through one of those views reads from
+the primary for DB_REPLICA_STICKY_SECONDS, so they see their own change
+while the replica catches up.
+
+"""
+
+REPLICA = 'replica' # database alias of the replica, see database.py
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+	return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+	"""
+	Route reads inside the block to the replica, when one is configured
+
+	"""
+	token = _use_replica.set(enabled and replica_configured())
+	try:
+		yield
+	finally:
+		_use_replica.reset(token)
+
+
+def sticky_key(user_id):
+	return f"db_sticky:{user_id}"
+
+
+def mark_sticky(user_id):
+	"""
+	Send the user's reads to the primary for DB_REPLICA_STICKY_SECONDS
+
+	"""
+	cache.set(sticky_key(user_id), True, settings.DB_REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(user_id):
+	return cache.get(sticky_key(user_id)) is not None
+
+
+class ReplicaRouter:
+	"""
+	Route reads to the replica inside read_from_replica(), writes to the primary
+
+	"""
+
+	def db_for_read(self, model, **hints):
+		return REPLICA if _use_replica.get() else 'default'
+
+	def db_for_write(self, model, **hints):
+		return 'default'
+
+	def allow_relation(self, obj1, obj2, **hints):
+		return True # the replica is a copy of the primary, rows from either can be related
+
+
+class ReplicaReadMixin:
+	"""
+	APIView mixin reading safe requests from the replica. Requests that write
+	make the request user sticky to the primary
+
+	"""
+
+	def dispatch(self, request, *args, **kwargs):
+		safe = request.method in SAFE_METHODS
+
+		if not replica_configured():
+			return super().dispatch(request, *args, **kwargs)
+
+		with read_from_replica(safe): # token users missing from the user cache are still read from the primary
+			response = super().dispatch(request, *args, **kwargs)
+
+		user = getattr(request, 'user', None)
+		if not safe and user is not None and user.is_authenticated:
+			mark_sticky(user.pk)
+
+		return response
+
+	def initial(self, request, *args, **kwargs):
+		super().initial(request, *args, **kwargs) # authenticates the request
+
+		if _use_replica.get() and request.user.is_authenticated and is_sticky(request.user.pk):
+			_use_replica.set(False) # reset when dispatch leaves read_from_replica()
@@ -3,6 +3,8 @@ from pathlib import Path
 
 from dotenv import load_dotenv  
 from .drf_config import *
+from .database import database_settings, replica_settings
+from .passwords import password_hashers
 
 # load environment variables from .env file 
 load_dotenv()
@@ -40,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'authentication.middleware.MetricsMiddleware', # first, so sampled requests are timed end to end
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -74,13 +77,95 @@ WSGI_APPLICATION = 'django_auth.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+DB_PROFILE = os.getenv('DB_PROFILE', 'sqlite') # sqlite, sqlite-wal or postgres, see database.py
+
 DATABASES = {
+    'default': database_settings(DB_PROFILE, BASE_DIR),
+}
+
+DB_REPLICA = replica_settings(DATABASES['default']) # read replica from DB_REPLICA_NAME or DB_REPLICA_HOST
+if DB_REPLICA is not None:
+    DATABASES['replica'] = DB_REPLICA
+
+DATABASE_ROUTERS = ['django_auth.routers.ReplicaRouter'] # read only views and sign in lookups read from the replica
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 10)) # primary reads after a user's own write, above replication lag
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
+# sign in lockout, failed attempts are counted in the cache below
+LOGIN_ATTEMPTS_CACHE = 'default'
+LOGIN_LOCKOUT_PERIOD = 60 * 60 * 24 # seconds
+LOGIN_ATTEMPTS_FLUSH_INTERVAL = int(os.getenv('LOGIN_ATTEMPTS_FLUSH_INTERVAL', 0)) # seconds between audit writes to UserProfile, 0 disables
+
+
+# users resolved from access tokens, see authentication/authentication.py
+AUTH_USER_CACHE = 'default'
+AUTH_USER_CACHE_TTL = 300 # seconds in the shared cache
+AUTH_USER_LOCAL_TTL = 5 # seconds in the per process LRU
+AUTH_USER_LOCAL_SIZE = 1024 # users kept in the per process LRU
+
+# seconds between refreshes of the in process refresh token blacklist index
+TOKEN_BLACKLIST_SYNC_INTERVAL = 1
+
+# versions behind the ETag and Last-Modified headers of the detail views
+OBJECT_VERSION_CACHE = 'default' # cache alias, shared by all processes in production
+OBJECT_VERSION_TTL = 24 * 60 * 60 # seconds
+
+# serialized responses of the detail views, see detail_cache.py
+DETAIL_RESPONSE_CACHE = 'default' # cache alias, use a shared cache when serving from several processes
+DETAIL_RESPONSE_TTL = 60 * 60 # seconds
+DETAIL_REBUILD_LOCK_TIMEOUT = 5 # seconds a rebuilding request holds the lock at most
+DETAIL_REBUILD_WAIT = 0.5 # seconds other requests wait for the rebuilt entry
+
+# recently taken usernames and emails remembered by sign up validation
+SIGNUP_TAKEN_CACHE_TTL = 60 # seconds
+SIGNUP_TAKEN_CACHE_SIZE = 10000
+
+# bulk user provisioning and administration (bulk_import_users command, users/bulk/ and users/bulk/admin/ endpoints)
+BULK_PROVISION_WORKERS = int(os.getenv('BULK_PROVISION_WORKERS', os.cpu_count() or 2)) # hashing processes, 0 hashes inline
+BULK_PROVISION_MAX_RECORDS = 1000 # users accepted per request by users/bulk/
+BULK_ADMIN_CHUNK_SIZE = 500 # users updated or deleted per query by users/bulk/admin/
+BULK_ADMIN_MAX_USERS = 10000 # users a single users/bulk/admin/ request may act on
+
+# request metrics exposed on api/auth/metrics/, 0 disables sampling
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 0)) # fraction of requests recorded
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',') # addresses allowed to scrape metrics
+
+# sliding window rate limits of sign in, sign up and token refresh, see throttling.py
+# rates are "count/period" with period s, min, hour or day, an empty rate disables the limit
+RATE_LIMIT_CACHE = os.getenv('RATE_LIMIT_CACHE') or None # cache alias shared by all processes, None counts per process
+RATE_LIMIT_NUM_PROXIES = int(os.getenv('RATE_LIMIT_NUM_PROXIES', 0)) # trusted proxies appending to X-Forwarded-For, 0 keys on REMOTE_ADDR
+RATE_LIMITS = {
+    'signin_ip': os.getenv('RATE_LIMIT_SIGNIN_IP', '60/min'), # sign ins from one address, across all accounts
+    'signin_account': os.getenv('RATE_LIMIT_SIGNIN_ACCOUNT', '10/min'), # sign ins to one account, from all addresses
+    'signup_ip': os.getenv('RATE_LIMIT_SIGNUP_IP', '20/hour'),
+    'refresh_ip': os.getenv('RATE_LIMIT_REFRESH_IP', '120/min'),
+}
+
+# password hashing pool used by the async sign in and sign up views
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 32)) # waiting hashes before requests get a 503
+
+
+# password hashing policy, see passwords.py, python manage.py calibrate_hashers suggests costs for this host
+PASSWORD_HASH_ALGORITHM = os.getenv('PASSWORD_HASH_ALGORITHM', 'pbkdf2') # pbkdf2, scrypt, argon2 or bcrypt
+PASSWORD_HASHERS = password_hashers(PASSWORD_HASH_ALGORITHM)
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 720000))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', 2 ** 14)) # a power of 2, memory is 1KB times this
+PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', 102400)) # KiB
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv('PASSWORD_ARGON2_PARALLELISM', 8))
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv('PASSWORD_BCRYPT_ROUNDS', 12)) # log2 of the iterations
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -121,6 +206,12 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# profile picture thumbnail pipeline, set PROFILE_IMAGE_WORKERS to 0 to process pictures inline
+PROFILE_IMAGE_WORKERS = int(os.getenv('PROFILE_IMAGE_WORKERS', 2))
+PROFILE_IMAGE_QUEUE_FACTOR = 4 # pending pictures allowed per worker, thumbnails beyond that are skipped until cleanup_pictures --recount
+PROFILE_THUMBNAIL_SIZES = (48, 96, 200) # square bounding boxes in pixels, generated once per unique picture
+PROFILE_PICTURE_GRACE_PERIOD = 60 * 60 # seconds an unreferenced picture is kept before cleanup_pictures deletes it
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 